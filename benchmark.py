@@ -0,0 +1,29 @@
+import sys
+from functions.benchmark import run_benchmarks, write_results, compare_results, format_results, environment
+
+# Benchmarks of trajectory generation, loading, playback and swarm scaling (see functions/benchmark.py)
+#
+#   python benchmark.py                           # write benchmarks/<commit>.json
+#   python benchmark.py benchmarks/<base>.json    # and list the results that regressed against <base>
+quick = False  # fewer repeats, a 60 s maneuver and swarms of at most 100 drones
+swarm_sizes = [1, 10, 50, 100, 200, 500]
+tolerance = 0.2  # relative change beyond which a result counts as a regression
+baseline_file = sys.argv[1] if len(sys.argv) > 1 else None
+
+commit = environment()["commit"]
+output_file = f"benchmarks/{commit[:12] if commit else 'results'}.json"
+
+results = run_benchmarks(quick=quick, swarm_sizes=swarm_sizes)
+print(format_results(results))
+
+# Compare before saving, the baseline may be the results file of this same commit
+regressions = compare_results(baseline_file, results, tolerance=tolerance) if baseline_file is not None else []
+write_results(output_file, results)
+print(f"Benchmark results saved to {output_file}")
+
+if baseline_file is not None:
+    if regressions:
+        print(f"{len(regressions)} results regressed by more than {tolerance:.0%} against {baseline_file}:")
+        print("\n".join(regressions))
+        sys.exit(1)
+    print(f"No regressions against {baseline_file}")
@@ -7,6 +7,7 @@ import pandas as pd
 from functions.export_and_plot_shape import export_and_plot_shape
 from functions.trajectories import *
 from functions.create_active_csv import create_active_csv
+from functions.trajectory_cache import TrajectoryCache
 
 # Example usage
 shape_name="heart_shape"
@@ -21,8 +22,12 @@ move_speed = 2.0  # m/s
 hold_time = 4.0 #s
 step_time = 0.1 #s
 output_file = "shapes/active.csv"
+binary_output_file = "shapes/active.trj"
 
-create_active_csv(
+# Trajectories already generated with the same parameters are copied from the cache instead of
+# being generated again (use create_active_csv(...) directly to bypass the cache)
+cache = TrajectoryCache("shapes/cache")
+cache.create_active_csv(
     shape_name=shape_name,
     diameter=diameter,
     direction=direction,
@@ -35,6 +40,7 @@ create_active_csv(
     hold_time = hold_time,
     step_time = step_time,
     output_file = output_file,
+    binary_output_file = binary_output_file,
 )
 
 output_file = "shapes/active.csv"
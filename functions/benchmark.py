@@ -0,0 +1,283 @@
+"""
+Reproducible performance benchmarks of the trajectory and flight code hot paths.
+
+Every benchmark returns a list of results, one per measured value:
+
+    {"name": "generation/circle/vectorized", "value": 2.1e7, "unit": "rows/s", "higher_is_better": true, "details": {...}}
+
+- generation: rows per second of every shape in map_shape_to_code, per-step and vectorized
+- create_active_csv: end-to-end time of create_active_csv (CSV plus binary output)
+- load: time to load the same trajectory from CSV, from the binary file (copied) and memory mapped
+- playback: cost of one TrajectoryPlayer.setpoint_at call per interpolation, and the lateness
+  (jitter) of real-time TickScheduler ticks
+- swarm: wall time per tick of a SwarmTicker streaming setpoints to 1 to 500 simulated drones
+  (functions/sim_drone.py), run on a virtual clock so only the CPU cost is measured
+
+`write_results` saves the results together with the git commit, Python, NumPy and platform, and
+`compare_results` lists the results that got worse than a baseline file by more than a tolerance,
+so benchmark files of different commits can be compared.
+
+Timings are the best of several repeats, measured with time.perf_counter.
+
+Usage:
+------
+results = run_benchmarks(quick=True)
+write_results("benchmarks/results.json", results)
+print(format_results(results))
+print("\n".join(compare_results("benchmarks/baseline.json", results)))
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from mavsdk.offboard import PositionNedYaw
+
+from functions.clock import run
+from functions.create_active_csv import create_active_csv
+from functions.playback import TrajectoryPlayer, STEP, LINEAR, HERMITE
+from functions.scheduler import TickScheduler
+from functions.sim_drone import SimWorld
+from functions.swarm_ticker import SwarmTicker, send_position_velocity_acceleration
+from functions.trajectories import map_shape_to_code
+from functions.trajectory_io import read_trajectory_csv, read_trajectory_binary
+
+RESULTS_VERSION = 1
+
+SHAPES = ["eight_shape", "circle", "square", "helix", "heart_shape", "infinity_shape", "spiral_square", "star_shape", "zigzag", "sine_wave"]
+
+SWARM_SIZES = [1, 10, 50, 100, 200, 500]
+
+# Mission used by the create_active_csv, load, playback and swarm benchmarks
+MISSION = {
+    "shape_name": "circle",
+    "diameter": 20.0,
+    "direction": 1,
+    "maneuver_time": 600.0,
+    "start_x": 0.0,
+    "start_y": 0.0,
+    "initial_altitude": 10.0,
+    "climb_rate": 2.0,
+    "move_speed": 2.0,
+    "hold_time": 2.0,
+    "step_time": 0.1,
+}
+
+
+def result(name, value, unit, higher_is_better=False, **details):
+    return {"name": name, "value": float(value), "unit": unit, "higher_is_better": higher_is_better, "details": details}
+
+
+def measure(function, repeat=5, number=1):
+    """Seconds per call of function() for each of repeat runs of number calls."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - started) / number)
+    return times
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress output of the generators while they are being timed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_generation(shapes=SHAPES, maneuver_time=600.0, step_time=0.1, repeat=5):
+    """Rows per second of every shape function, called per step and vectorized over all steps."""
+    results = []
+    steps = int(maneuver_time / step_time)
+    step_indices = np.arange(steps)
+    for shape_name in shapes:
+        _, shape_fcn, shape_args = map_shape_to_code(shape_name)
+        _, shape_fcn_vec, _ = map_shape_to_code(shape_name, vectorized=True)
+        arguments = (maneuver_time, 20.0, 1, 10.0, step_time) + tuple(shape_args)
+
+        per_step = min(measure(lambda: [shape_fcn(i, *arguments) for i in range(steps)], repeat=max(1, repeat // 2)))
+        vectorized = min(measure(lambda: shape_fcn_vec(step_indices, *arguments), repeat=repeat))
+        results.append(result(f"generation/{shape_name}/per_step", steps / per_step, "rows/s", True, rows=steps))
+        results.append(result(f"generation/{shape_name}/vectorized", steps / vectorized, "rows/s", True, rows=steps))
+    return results
+
+
+def bench_create_active_csv(directory, mission=MISSION, repeat=3):
+    """End-to-end create_active_csv time, writing the CSV and the binary file."""
+    output_file = os.path.join(directory, "active.csv")
+    binary_output_file = os.path.join(directory, "active.trj")
+    with quiet():
+        times = measure(lambda: create_active_csv(**mission, output_file=output_file, binary_output_file=binary_output_file), repeat=repeat)
+    rows = len(read_trajectory_binary(binary_output_file))
+    return [
+        result("create_active_csv/time", min(times), "s", rows=rows),
+        result("create_active_csv/throughput", rows / min(times), "rows/s", True, rows=rows),
+    ]
+
+
+def bench_load(directory, repeat=5):
+    """Load time of the trajectory written by bench_create_active_csv, from each format."""
+    csv_path = os.path.join(directory, "active.csv")
+    binary_path = os.path.join(directory, "active.trj")
+    rows = len(read_trajectory_binary(binary_path))
+
+    def load_mmap():
+        # Touch every column, so the mapped pages are actually read
+        trajectory = read_trajectory_binary(binary_path, mmap=True)
+        return [float(np.sum(column)) for column in trajectory.columns.values()]
+
+    loaders = {
+        "csv": lambda: read_trajectory_csv(csv_path),
+        "binary": lambda: read_trajectory_binary(binary_path, mmap=False),
+        "binary_mmap": load_mmap,
+    }
+    return [result(f"load/{name}", min(measure(loader, repeat=repeat)), "s", rows=rows,
+                   bytes=os.path.getsize(csv_path if name == "csv" else binary_path))
+            for name, loader in loaders.items()]
+
+
+def bench_playback(directory, calls=20000, ticks=100, period=0.02):
+    """Cost of one setpoint lookup per interpolation, and the lateness of real-time scheduler ticks."""
+    trajectory = read_trajectory_binary(os.path.join(directory, "active.trj"))
+    results = []
+    for interpolation in (STEP, LINEAR, HERMITE):
+        player = TrajectoryPlayer(trajectory)
+        times = np.linspace(0.0, trajectory.duration, calls)
+
+        def play():
+            for t in times:
+                player.setpoint_at(t, interpolation)
+
+        seconds = min(measure(play, repeat=3)) / calls
+        results.append(result(f"playback/setpoint_at/{interpolation}", seconds * 1e6, "us", calls=calls))
+
+    lateness = run(_tick_lateness(ticks, period))
+    results.append(result("playback/tick_jitter/p50", np.percentile(lateness, 50) * 1e3, "ms", ticks=ticks, period=period))
+    results.append(result("playback/tick_jitter/p99", np.percentile(lateness, 99) * 1e3, "ms", ticks=ticks, period=period))
+    results.append(result("playback/tick_jitter/max", np.max(lateness) * 1e3, "ms", ticks=ticks, period=period))
+    return results
+
+
+async def _tick_lateness(ticks, period):
+    scheduler = TickScheduler(period=period)
+    lateness = []
+    for _ in range(ticks):
+        tick = await scheduler.next_tick()
+        lateness.append(scheduler.clock() - scheduler.deadline(tick))
+    return np.array(lateness)
+
+
+def bench_swarm(directory, sizes=SWARM_SIZES, duration=10.0, period=0.05):
+    """Wall time per tick of streaming duration seconds of setpoints to swarms of simulated drones."""
+    trajectory = read_trajectory_binary(os.path.join(directory, "active.trj"))
+    results = []
+    for size in sizes:
+        started = time.perf_counter()
+        ticks, steps = run(_fly_swarm(trajectory, size, duration, period), virtual_time=True)
+        seconds = time.perf_counter() - started
+        details = {"drones": size, "ticks": ticks, "physics_steps": steps, "duration": duration, "period": period}
+        results.append(result(f"swarm/{size}/tick_time", seconds / ticks * 1e3, "ms", **details))
+        results.append(result(f"swarm/{size}/realtime_factor", duration / seconds, "x", True, **details))
+    return results
+
+
+async def _fly_swarm(trajectory, size, duration, period):
+    world = SimWorld()
+    ticker = SwarmTicker(period=period, command=send_position_velocity_acceleration)
+    for drone_id in range(size):
+        drone = world.add_drone(home=(0.0, 3.0 * drone_id, 0.0))
+        await drone.connect()
+        await drone.action.arm()
+        await drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, 0.0, 0.0))
+        await drone.offboard.start()
+        ticker.add(drone_id, drone, TrajectoryPlayer(trajectory))
+
+    # Only the first duration seconds of the trajectory are flown
+    task = asyncio.ensure_future(ticker.run())
+    await asyncio.sleep(duration)
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    return ticker.scheduler.tick + 1, world.steps
+
+
+def run_benchmarks(quick=False, swarm_sizes=SWARM_SIZES):
+    """Run every benchmark; quick runs fewer repeats, a shorter mission and smaller swarms."""
+    mission = dict(MISSION, maneuver_time=60.0) if quick else MISSION
+    repeat = 2 if quick else 5
+    sizes = [size for size in swarm_sizes if size <= 100] if quick else swarm_sizes
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        results += bench_generation(maneuver_time=mission["maneuver_time"], step_time=mission["step_time"], repeat=repeat)
+        results += bench_create_active_csv(directory, mission, repeat=repeat)
+        results += bench_load(directory, repeat=repeat)
+        results += bench_playback(directory, calls=2000 if quick else 20000, ticks=50 if quick else 100)
+        results += bench_swarm(directory, sizes, duration=5.0 if quick else 10.0)
+    return results
+
+
+def environment():
+    """Where the results were measured: git commit, Python, NumPy, platform and time."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write_results(path, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"version": RESULTS_VERSION, "environment": environment(), "results": results}, file, indent=2)
+    return path
+
+
+def read_results(path):
+    with open(path) as file:
+        return json.load(file)["results"]
+
+
+def compare_results(baseline, results, tolerance=0.2):
+    """
+    Lines describing every result that is worse than in baseline (a results file or list) by more
+    than tolerance, relative to the baseline value. Results missing from either side are ignored.
+    """
+    if isinstance(baseline, (str, os.PathLike)):
+        baseline = read_results(baseline)
+    previous = {entry["name"]: entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry["name"])
+        if before is None or before["value"] == 0 or not math.isfinite(before["value"]):
+            continue
+        change = (entry["value"] - before["value"]) / abs(before["value"])
+        worse = -change if entry["higher_is_better"] else change
+        if worse > tolerance:
+            regressions.append(f"{entry['name']}: {before['value']:.4g} -> {entry['value']:.4g} {entry['unit']} ({change:+.0%})")
+    return regressions
+
+
+def format_results(results):
+    width = max((len(entry["name"]) for entry in results), default=0)
+    return "\n".join(f"{entry['name']:<{width}}  {entry['value']:>12.4g} {entry['unit']}" for entry in results)
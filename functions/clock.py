@@ -0,0 +1,122 @@
+"""
+Clocks for the flight code: real time or a virtual time that runs as fast as the CPU allows.
+
+Every component that schedules or timestamps something (TickScheduler, SwarmTicker,
+TelemetryHub, FlightRecorder, TrackingMetrics, SimWorld) takes a `clock` callable, which
+defaults to `loop_time`: the time of the running asyncio event loop. On a normal event loop this
+is time.monotonic().
+
+`VirtualTimeLoop` is an event loop whose time only advances when every task is waiting. Instead
+of blocking until the next timer, it jumps its clock straight to that timer, so asyncio.sleep,
+asyncio.wait_for timeouts and TickScheduler deadlines all follow virtual time without any change
+to the code that uses them. Timers fire in deadline order, so the tick order of a mission is
+deterministic. Real I/O (sockets, subprocesses) is still polled on every iteration, and work run
+in worker threads (asyncio.to_thread, run_in_executor) is waited for before the clock moves on, so
+it takes no virtual time.
+
+Together with the simulated drones of functions/sim_drone.py, a 120 s mission runs in the time
+the CPU needs to compute it.
+
+Usage:
+------
+run(main(), virtual_time=True)
+"""
+
+import asyncio
+import selectors
+import time
+
+
+def loop_time():
+    """Time of the running event loop (virtual time on a VirtualTimeLoop), time.monotonic() outside of a loop."""
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+
+class VirtualTimeSelector:
+    """Selector that polls real I/O without blocking and advances the loop's clock instead of sleeping."""
+
+    def __init__(self, loop):
+        self._selector = selectors.DefaultSelector()
+        self._loop = loop
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_key(self, fileobj):
+        return self._selector.get_key(fileobj)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None or self._loop.executor_jobs:
+            # Nothing scheduled, or a worker thread is still running: wait for real I/O, so that
+            # work handed to threads takes no virtual time and the run stays deterministic
+            return self._selector.select(None)
+        self._loop.advance(timeout)
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self, start=0.0):
+        self._virtual_time = start
+        self.executor_jobs = 0
+        super().__init__(selector=VirtualTimeSelector(self))
+
+    def time(self):
+        return self._virtual_time
+
+    def advance(self, seconds):
+        """Move the clock forward by seconds, landing exactly on the next timer if that is when it fires."""
+        target = self._virtual_time + seconds
+        if self._scheduled:
+            # Jump to the timer's own deadline so float rounding never depends on the path taken
+            target = max(self._virtual_time, min(target, self._scheduled[0].when()))
+        self._virtual_time = target
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, future):
+        self.executor_jobs -= 1
+
+
+def run(main, virtual_time=False):
+    """Run a coroutine like asyncio.run, on a VirtualTimeLoop if virtual_time is set."""
+    if not virtual_time:
+        return asyncio.run(main)
+    loop = VirtualTimeLoop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            # Cancel whatever is left running, as asyncio.run does
+            remaining = asyncio.all_tasks(loop)
+            for task in remaining:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*remaining, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -59,225 +59,269 @@ Flight Modes and Codes:
 Each flight mode is represented by an integer code. These codes are used to indicate the different phases of the flight in the CSV file.
 
 To create a valid CSV file for offboard control, make sure to adhere to the structure described above. Each row should represent a specific time step with the corresponding position, velocity, acceleration, and LED color values.
+
+Binary Output:
+--------------
+Pass `binary_output_file` (for example "shapes/active.trj") to also write the trajectory in the columnar binary format described in `functions/trajectory_io.py`. The flight scripts load it with a single memory map and fall back to the CSV file when it is missing or older than the CSV.
+
+Phase Segments and Sinks:
+-------------------------
+The trajectory is planned as a list of phase segments (climb, hold, transit, maneuver, hold, return), each knowing its mode, first row, start time and number of rows before any value is computed. `MissionPlan.blocks()` then produces the rows lazily as (n, 13) arrays of [idx, t, px, py, pz, vx, vy, vz, ax, ay, az, yaw, mode], at most chunk_size rows at a time, and `write_mission` streams them to any number of sinks in one pass:
+- `CsvSink`: the CSV file described above
+- `BinarySink`: the binary trajectory file, written column block by column block
+- `MemorySink`: an in-memory `Trajectory`
+Memory use therefore does not grow with the length or resolution of the mission.
+
+plan = plan_mission("circle", 5.0, 1, 60.0, 0.0, 0.0, 10.0, 2.0, 2.5, 2.0, 0.1)
+memory = MemorySink()
+write_mission(plan, [CsvSink("shapes/active.csv"), memory])
+trajectory = memory.trajectory
 """
 
 import csv
 import math
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 import numpy as np
-import pandas as pd
 from functions.trajectories import *
+from functions.trajectory_io import TRAJECTORY_COLUMNS, Trajectory, TrajectoryBinaryWriter
+
+# Bump whenever a change to the generator changes the trajectories it produces (invalidates cached trajectories)
+GENERATOR_VERSION = 2
+
+CSV_HEADER = ["idx", "t", "px", "py", "pz", "vx", "vy", "vz", "ax", "ay", "az", "yaw", "mode", "ledr", "ledg", "ledb"]
+
+# Columns of the blocks produced by MissionPlan.blocks
+BLOCK_COLUMNS = ["idx"] + TRAJECTORY_COLUMNS
+
+
+class Segment:
+    """
+    One flight phase: length rows with the given mode, starting at row first_row and time t0, one
+    step_time apart. states(i) returns the (n, 9) px..az values of the steps i within the phase.
+    """
+
+    def __init__(self, mode, first_row, t0, length, step_time, states):
+        self.mode = mode
+        self.first_row = first_row
+        self.t0 = t0
+        self.length = length
+        self.step_time = step_time
+        self.states = states
+
+    @property
+    def t_end(self):
+        return self.t0 + (self.length - 1) * self.step_time
+
+    def blocks(self, chunk_size):
+        for start in range(0, self.length, chunk_size):
+            i = np.arange(start, min(start + chunk_size, self.length))
+            block = np.zeros((len(i), len(BLOCK_COLUMNS)))
+            block[:, 0] = self.first_row + i
+            block[:, 1] = self.t0 + i * self.step_time
+            block[:, 2:11] = self.states(i)
+            block[:, 12] = self.mode
+            yield block
+
+
+class MissionPlan:
+
+    def __init__(self, segments, step_time):
+        self.segments = [segment for segment in segments if segment.length > 0]
+        self.step_time = step_time
+
+    @property
+    def rows(self):
+        return sum(segment.length for segment in self.segments)
+
+    @property
+    def duration(self):
+        return self.segments[-1].t_end if self.segments else 0.0
+
+    def mode_segments(self):
+        """[mode, first_row, end_row, t_start, t_end] of every phase, as in trajectory_io.mode_segments."""
+        return [[segment.mode, segment.first_row, segment.first_row + segment.length, segment.t0, segment.t_end] for segment in self.segments]
 
-def create_active_csv(shape_name,diameter, direction, maneuver_time, start_x, start_y, initial_altitude, climb_rate, move_speed, hold_time, step_time, output_file="active.csv"):
+    def blocks(self, chunk_size=4096):
+        for segment in self.segments:
+            yield from segment.blocks(chunk_size)
 
-    map_shape_to_code(shape_name)
+
+def _hold(x, y, z):
+    return lambda i: np.tile([x, y, z, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0], (len(i), 1))
+
+
+def _states(i, x, y, z, vx, vy, vz):
+    states = np.zeros((len(i), 9))
+    for column, value in enumerate((x, y, z, vx, vy, vz)):
+        states[:, column] = value
+    return states
+
+
+def plan_mission(shape_name, diameter, direction, maneuver_time, start_x, start_y, initial_altitude, climb_rate, move_speed, hold_time, step_time):
+    """Plan the flight phases of a trajectory; no rows are computed until the plan's blocks are consumed."""
     shape_code, shape_fcn, shape_args = map_shape_to_code(shape_name)
+    _, shape_fcn_vec, _ = map_shape_to_code(shape_name, vectorized=True)
 
     print(f"Shape Code: {shape_code}")
     print(f"Shape Function: {shape_fcn}")
     print(f"Shape Arguments: {shape_args}")
 
-    header = ["idx", "t", "px", "py", "pz", "vx", "vy", "vz", "ax", "ay", "az", "yaw", "mode", "ledr", "ledg", "ledb"]
-
-    with open(output_file, mode="w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(header)
-
-        climb_time = initial_altitude / climb_rate
-        climb_steps = int(climb_time / step_time)
-
-        for i in range(climb_steps):
-            t = i * step_time
-            x = 0
-            y = 0
-            z = (climb_rate * t) * -1
-            vx = 0.0
-            vy = 0.0
-            vz = -climb_rate
-            ax = 0
-            ay = 0
-            az = 0
-            yaw = 0
-            mode =10
-            row = [i, t, x, y, z, vx, vy, vz, ax, ay, az, yaw,mode, "nan", "nan", "nan"]
-            writer.writerow(row)
-
-        hold_steps = int(hold_time / step_time)
-
-        for i in range(hold_steps):
-            t = climb_time + i * step_time
-            x = 0
-            y = 0
-            z = -1 * initial_altitude
-            vx = 0.0
-            vy = 0.0
-            vz = 0.0
-            ax = 0
-            ay = 0
-            az = 0
-            yaw = 0
-            mode = 20
-            row = [climb_steps + i, t, x, y, z, vx, vy, vz, 0,0,0, yaw,mode, "nan", "nan", "nan"]
-            writer.writerow(row)  
-
-        move_start_distance = math.sqrt(start_x**2 + start_y**2)
-        move_start_time = move_start_distance / move_speed
-        move_start_steps = int(move_start_time / step_time)
-
-        for i in range(move_start_steps):
-            t = climb_time + hold_time+ i * step_time
-            ratio = i / move_start_steps
-            x = start_x * ratio
-            y = start_y * ratio
-            z = -1 * initial_altitude
-            vx = move_speed * (start_x / move_start_distance)
-            vy = move_speed * (start_y / move_start_distance)
-            vz = 0.0
-            ax = 0
-            ay = 0
-            az = 0
-            yaw = 0
-            mode = 30
-            row = [climb_steps + hold_steps + i, t, x, y, z, vx, vy, vz, 0 , 0 ,0, yaw,mode, "nan", "nan", "nan"]
-            writer.writerow(row)
-
-        hold_steps = int(hold_time / step_time)
-
-        for i in range(hold_steps):
-            t = climb_time + hold_time +move_start_time + i * step_time
-            x = start_x
-            y = start_y
-            z = -1 * initial_altitude
-            vx = 0.0
-            vy = 0.0
-            vz = 0.0
-            ax = 0
-            ay = 0
-            az = 0
-            yaw = 0
-            mode = 40
-            row = [climb_steps + hold_steps + move_start_steps + i, t, x, y, z, vx, vy, vz, 0, 0, 0, yaw,mode, "nan", "nan", "nan"]
-            writer.writerow(row)    
-
-        if 0 != shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[0] or 0 != shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[1]:
-            print("different Start and Manuever")
-            maneuver_start_x = shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[0];
-            maneuver_start_y = shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[1];
-            
-            print(f"Origin Start: {start_x} , {start_y}")
-            print(f"Manuever Start: {maneuver_start_x} , {maneuver_start_y}")
-
-            # Calculate distance and time required to move to first setpoint of maneuver
-            move_distance = math.sqrt(( maneuver_start_x)**2 + ( maneuver_start_y)**2)
-            move_time = move_distance / 2.0
-            move_steps = int(move_time / step_time)
-
-            # Move drone to first setpoint of maneuver at 2 m/s
-            for i in range(move_steps):
-                t = climb_time + move_start_time + hold_time + hold_time + i * step_time
-                ratio = i / move_steps
-                x = start_x + (maneuver_start_x  ) * ratio
-                y = start_y + (maneuver_start_y ) * ratio
-                z = -1 * initial_altitude
-                vx = move_speed * (maneuver_start_x ) / move_distance
-                vy = move_speed * (maneuver_start_y ) / move_distance
-                vz = 0.0
-                ax = 0
-                ay = 0
-                az = 0
-                yaw = 0
-                
-                mode = 50
-                row = [climb_steps + hold_steps + move_start_steps + hold_steps  + i, t, x, y, z, vx, vy, vz,0,0,0, yaw,mode, "nan", "nan", "nan"]
-                writer.writerow(row)
-
-            # Hold drone at first setpoint for 2 seconds
-            for i in range(hold_steps):
-                t = climb_time + hold_time + move_start_time + move_time + hold_time + i * step_time
-                x =  start_x + shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[0]
-                y = start_y + shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[1]
-                z = -1 * initial_altitude
-                vx = 0.0
-                vy = 0.0
-                vz = 0.0
-                ax = 0
-                ay = 0
-                az = 0
-                yaw = 0
-                mode = 60
-                row = [climb_steps + hold_steps + move_steps + move_start_steps + hold_steps  + i, t, x, y, z, vx, vy, vz, 0 ,0,0, yaw,mode, "nan", "nan", "nan"]
-                writer.writerow(row)
-
-            # Calculate the start time after maneuver start
-            start_time = climb_time + hold_time + move_start_time + move_time + hold_time  + hold_time
-        else:
-            # Calculate the start time after maneuver start
-            start_time = climb_time + hold_time + move_start_time + hold_time
-            move_distance=0
-            move_steps =0
-            move_time=0
-
-        # Calculate the total duration of the trajectory after maneuver start
-        total_duration = maneuver_time + start_time
-        total_steps = int(total_duration / step_time)
-        maneuver_steps = int(maneuver_time / step_time)
-
-    
-
-        # Fly the shape trajectory
-        last_x, last_y, last_z = 0, 0, 0  # Initialize variables to store the last position
-
-        for step in range(maneuver_steps):
-            x, y, z, vx, vy, vz, ax, ay, az = shape_fcn(step, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)
-            x += start_x
-            y += start_y
-            yaw = 0
-            missionTime = start_time + step * step_time
-            mode = 70
-            row = [climb_steps + hold_steps + move_steps + hold_steps + move_steps + hold_steps + step, missionTime, x, y, z, vx, vy, vz, ax, ay, az, yaw, mode, "nan", "nan", "nan"]
-            writer.writerow(row)
-            last_x, last_y, last_z = x, y, z  # Update the last position
-
-           
-        # Hold drone at last maneuver setpoint for hold_time
-        for i in range(hold_steps):
-            t = start_time + maneuver_time + i * step_time
-            x, y, z = last_x, last_y, last_z  # Use the last position
-            vx = 0.0
-            vy = 0.0
-            vz = 0.0
-            ax = 0
-            ay = 0
-            az = 0
-            yaw = 0
-            mode = 80
-            row = [climb_steps + hold_steps + move_steps + hold_steps + move_steps + hold_steps + step + i, t, x, y, z, vx, vy, vz, ax, ay, az, yaw, mode, "nan", "nan", "nan"]
-            writer.writerow(row)
-
-        # Return to origin (0, 0, -initial_altitude)
-        return_distance = math.sqrt(last_x**2 + last_y**2 + ((-1 * initial_altitude) - last_z)**2)  # Use the last position
-        return_time = return_distance / move_speed
-        return_steps = int(return_time / step_time)
-
-        for i in range(return_steps):
-            t = start_time + maneuver_time + hold_time + i * step_time
-            ratio = i / return_steps
-            x_home = last_x * (1 - ratio)  # Use the last position
-            y_home = last_y * (1 - ratio)  # Use the last position
-            z_home = last_z + ((-1 * initial_altitude) - last_z) * ratio  # Use the last position
-            vx = - move_speed * last_x / return_distance  # Use the last position
-            vy = - move_speed * last_y / return_distance  # Use the last position
-            vz = ((-1 * initial_altitude) - last_z) / return_time  # Use the last position
-            ax = 0
-            ay = 0
-            az = 0
-            yaw = 0
-            mode = 90
-            row = [climb_steps + hold_steps + move_steps + hold_steps + move_steps + hold_steps + step + i + return_steps, t, x_home, y_home, z_home, vx, vy, vz, ax , ay , az, yaw,mode, "nan", "nan", "nan"]
-            writer.writerow(row)
-            
-            
-        print(f"Created {output_file} with the {shape_name}.")
+    segments = []
+    row = 0
+
+    def add(mode, t0, length, states):
+        nonlocal row
+        segments.append(Segment(mode, row, t0, length, step_time, states))
+        row += length
+
+    altitude = -1 * initial_altitude
+
+    # Climb to the initial altitude
+    climb_time = initial_altitude / climb_rate
+    climb_steps = int(climb_time / step_time)
+    add(10, 0.0, climb_steps, lambda i: _states(i, 0, 0, (climb_rate * (i * step_time)) * -1, 0.0, 0.0, -climb_rate))
+
+    hold_steps = int(hold_time / step_time)
+    add(20, climb_time, hold_steps, _hold(0, 0, altitude))
+
+    # Transit to the start point
+    move_start_distance = math.sqrt(start_x**2 + start_y**2)
+    move_start_time = move_start_distance / move_speed
+    move_start_steps = int(move_start_time / step_time)
+    add(30, climb_time + hold_time, move_start_steps, lambda i: _states(
+        i, start_x * (i / move_start_steps), start_y * (i / move_start_steps), altitude,
+        move_speed * (start_x / move_start_distance), move_speed * (start_y / move_start_distance), 0.0))
+
+    add(40, climb_time + hold_time + move_start_time, hold_steps, _hold(start_x, start_y, altitude))
+
+    # The first maneuver setpoint, relative to the start point
+    maneuver_start_x, maneuver_start_y = shape_fcn(0, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)[:2]
+    if 0 != maneuver_start_x or 0 != maneuver_start_y:
+        print("different Start and Manuever")
+        print(f"Origin Start: {start_x} , {start_y}")
+        print(f"Manuever Start: {maneuver_start_x} , {maneuver_start_y}")
+
+        # Move to the first setpoint of the maneuver, then hold there
+        move_distance = math.sqrt((maneuver_start_x)**2 + (maneuver_start_y)**2)
+        move_time = move_distance / 2.0
+        move_steps = int(move_time / step_time)
+        add(50, climb_time + move_start_time + hold_time + hold_time, move_steps, lambda i: _states(
+            i, start_x + maneuver_start_x * (i / move_steps), start_y + maneuver_start_y * (i / move_steps), altitude,
+            move_speed * maneuver_start_x / move_distance, move_speed * maneuver_start_y / move_distance, 0.0))
+
+        add(60, climb_time + hold_time + move_start_time + move_time + hold_time, hold_steps,
+            _hold(start_x + maneuver_start_x, start_y + maneuver_start_y, altitude))
+
+        start_time = climb_time + hold_time + move_start_time + move_time + hold_time + hold_time
+    else:
+        start_time = climb_time + hold_time + move_start_time + hold_time
+
+    # Fly the shape, evaluating whole chunks of maneuver steps in one vectorized call
+    maneuver_steps = int(maneuver_time / step_time)
+
+    def maneuver(i):
+        states = shape_fcn_vec(i, maneuver_time, diameter, direction, initial_altitude, step_time, *shape_args)
+        states[:, 0] += start_x
+        states[:, 1] += start_y
+        return states
+
+    add(70, start_time, maneuver_steps, maneuver)
+
+    if maneuver_steps > 0:
+        last_x, last_y, last_z = maneuver(np.array([maneuver_steps - 1]))[0, :3].tolist()
+    else:
+        last_x, last_y, last_z = start_x + maneuver_start_x, start_y + maneuver_start_y, altitude
+
+    # Hold at the last maneuver setpoint, then return to the home coordinate at the initial altitude
+    add(80, start_time + maneuver_time, hold_steps, _hold(last_x, last_y, last_z))
+
+    return_distance = math.sqrt(last_x**2 + last_y**2 + (altitude - last_z)**2)
+    return_time = return_distance / move_speed
+    return_steps = int(return_time / step_time)
+    add(90, start_time + maneuver_time + hold_time, return_steps, lambda i: _states(
+        i, last_x * (1 - i / return_steps), last_y * (1 - i / return_steps), last_z + (altitude - last_z) * (i / return_steps),
+        - move_speed * last_x / return_distance, - move_speed * last_y / return_distance, (altitude - last_z) / return_time))
+
+    return MissionPlan(segments, step_time)
+
+
+class CsvSink:
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.writer = None
+
+    def open(self, plan):
+        self.file = open(self.path, mode="w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(CSV_HEADER)
+
+    def write(self, block):
+        columns = [block[:, c].tolist() for c in range(1, 12)]
+        leds = ["nan"] * len(block)
+        self.writer.writerows(zip(block[:, 0].astype(int).tolist(), *columns, block[:, 12].astype(int).tolist(), leds, leds, leds))
+
+    def close(self):
+        self.file.close()
+
+
+class BinarySink:
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def open(self, plan):
+        self.writer = TrajectoryBinaryWriter(self.path, plan.rows, plan.step_time, plan.duration, plan.mode_segments())
+
+    def write(self, block):
+        self.writer.write(block[:, 1:])
+
+    def close(self):
+        self.writer.close()
+
+
+class MemorySink:
+
+    def __init__(self):
+        self.blocks = []
+        self.trajectory = None
+
+    def open(self, plan):
+        self.blocks = []
+        self.step_time = plan.step_time
+
+    def write(self, block):
+        self.blocks.append(block[:, 1:])
+
+    def close(self):
+        data = np.concatenate(self.blocks) if self.blocks else np.zeros((0, len(TRAJECTORY_COLUMNS)))
+        self.trajectory = Trajectory.from_array(data, step_time=self.step_time)
+        self.blocks = []
+
+
+def write_mission(plan, sinks, chunk_size=4096):
+    """Stream the rows of a plan to every sink, chunk_size rows at a time."""
+    for sink in sinks:
+        sink.open(plan)
+    try:
+        for block in plan.blocks(chunk_size):
+            for sink in sinks:
+                sink.write(block)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def create_active_csv(shape_name,diameter, direction, maneuver_time, start_x, start_y, initial_altitude, climb_rate, move_speed, hold_time, step_time, output_file="active.csv", binary_output_file=None):
+
+    plan = plan_mission(shape_name, diameter, direction, maneuver_time, start_x, start_y, initial_altitude, climb_rate, move_speed, hold_time, step_time)
 
+    sinks = [CsvSink(output_file)]
+    if binary_output_file is not None:
+        sinks.append(BinarySink(binary_output_file))
+    write_mission(plan, sinks)
 
+    print(f"Created {output_file} with the {shape_name}.")
+    if binary_output_file is not None:
+        print(f"Created {binary_output_file} with the {shape_name}.")
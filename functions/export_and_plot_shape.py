@@ -1,44 +1,156 @@
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-import pandas as pd
+"""
+3D plots of generated trajectories.
+
+`export_and_plot_shape` plots one trajectory file coloured by flight mode and saves it, showing
+the plot interactively unless show=False. The rendering itself never needs a display:
+`render_trajectories` draws one or many trajectories (for example every drone of a swarm) into a
+single figure without pyplot, and `render_plots` renders many such plots in parallel worker
+processes, each to its own output path.
+
+Long trajectories are decimated before drawing: every flight phase keeps its first and last
+point and at most max_points points are drawn per trajectory.
+
+Usage:
+------
+export_and_plot_shape("shapes/active.csv", plot_file="shapes/trajectory_plot.png", show=False)
+render_trajectories(["shapes/swarm/drone_0.csv", "shapes/swarm/drone_1.csv"], "shapes/swarm_plot.png")
+render_trajectories("shapes/swarm.swm", "shapes/swarm_plot.png", home_positions=[(0, 3*i, 0) for i in range(6)])
+render_plots([(f"shapes/swarm/drone_{i}.csv", f"shapes/swarm/drone_{i}.png") for i in range(6)])
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
 import numpy as np
 
-def export_and_plot_shape(output_file):
-    # Load the data from the active.csv file
-    data = pd.read_csv(output_file)
+from functions.trajectory_io import load_trajectory
+from functions.swarm_generator import SWARM_EXTENSION, read_swarm_container
 
-    # Extract the position coordinates and flight modes
-    x = data['px']
-    y = data['py']
-    z = -1*data['pz']
-    modes = data['mode']
+# Set colormap (you can change these colors to anything you like)
+colors = {0: 'grey', 10: 'orange', 20: 'yellow', 30: 'green', 40: 'blue', 50: 'purple', 60: 'brown', 70: 'red', 80: 'pink', 90: 'cyan', 100: 'black'}
 
-    # Create a 3D plot
-    fig = plt.figure()
-    ax = fig.add_subplot(111, projection='3d')
+# Define flight mode names
+mode_names = {0: 'On the ground', 10: 'Initial climbing', 20: 'Initial holding after climb', 30: 'Moving to start point', 40: 'Holding at start point', 50: 'Moving to maneuver start point', 60: 'Holding at maneuver start point', 70: 'Maneuvering (trajectory)', 80: 'Holding at end of trajectory', 90: 'Returning to home', 100: 'Landing'}
+
+
+def export_and_plot_shape(output_file, plot_file='shapes/trajectory_plot.png', show=True, max_points=None):
+    # Load the data from the trajectory file (binary file next to the CSV if it is up to date)
+    trajectory = load_trajectory(output_file)
+
+    if show:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+    else:
+        from matplotlib.figure import Figure
+        fig = Figure()
+
+    draw_trajectories(fig, [trajectory], max_points=max_points, color_by="mode", title='Drone Trajectory')
+
+    # Save the figure before showing it
+    fig.savefig(plot_file)
+
+    # Then show the plot
+    if show:
+        plt.show()
 
-    # Set colormap (you can change these colors to anything you like)
-    colors = {0: 'grey', 10: 'orange', 20: 'yellow', 30: 'green', 40: 'blue', 50: 'purple', 60: 'brown', 70: 'red', 80: 'pink', 90: 'cyan', 100: 'black'}
 
-    # Define flight mode names
-    mode_names = {0: 'On the ground', 10: 'Initial climbing', 20: 'Initial holding after climb', 30: 'Moving to start point', 40: 'Holding at start point', 50: 'Moving to maneuver start point', 60: 'Holding at maneuver start point', 70: 'Maneuvering (trajectory)', 80: 'Holding at end of trajectory', 90: 'Returning to home', 100: 'Landing'}
+def decimate(segments, max_points):
+    """Row indices to draw: every phase keeps its first and last row, at most about max_points rows in total."""
+    rows = segments[-1][2] if segments else 0
+    stride = max(1, int(np.ceil(rows / max_points))) if max_points else 1
+    indices = [np.unique(np.append(np.arange(first, end, stride), end - 1)) for _, first, end, _, _ in segments]
+    return indices
 
-    # Plot each segment with the corresponding color
-    for mode in np.unique(modes):
-        ix = np.where(modes == mode)
-        ax.plot(x.iloc[ix], y.iloc[ix], z.iloc[ix], color=colors[mode], label=mode_names[mode])
+
+def draw_trajectories(fig, trajectories, labels=None, home_positions=None, max_points=2000, color_by=None, title='Drone Trajectories'):
+    """
+    Draw trajectories into fig. color_by="mode" colours every flight phase (the default for a
+    single trajectory), color_by="drone" gives every trajectory its own colour. home_positions
+    translate each trajectory from its drone's local frame into a common frame.
+    """
+    if color_by is None:
+        color_by = "mode" if len(trajectories) == 1 else "drone"
+    ax = fig.add_subplot(111, projection='3d')
+    cycle = [entry['color'] for entry in matplotlib.rcParams['axes.prop_cycle']]
+
+    labelled = set()
+    for index, trajectory in enumerate(trajectories):
+        home = home_positions[index] if home_positions is not None else (0.0, 0.0, 0.0)
+        x = trajectory.column('px') + home[0]
+        y = trajectory.column('py') + home[1]
+        z = -1 * (trajectory.column('pz') + home[2])
+        label = labels[index] if labels is not None else f"Drone {index}"
+
+        # Plot each flight phase, with the corresponding color
+        for (mode, _, _, _, _), rows in zip(trajectory.segments, decimate(trajectory.segments, max_points)):
+            if color_by == "mode":
+                color, name = colors.get(mode, 'black'), mode_names.get(mode, str(mode))
+            else:
+                color, name = cycle[index % len(cycle)], label
+            ax.plot(x[rows], y[rows], z[rows], color=color, label=name if name not in labelled else None)
+            labelled.add(name)
 
     # Set labels and title
     ax.set_xlabel('X')
     ax.set_ylabel('Y')
     ax.set_zlabel('Z')
-    ax.set_title('Drone Trajectory')
+    ax.set_title(title)
 
     # Create legend
-    ax.legend(loc='best')
+    if len(labelled) <= 20:
+        ax.legend(loc='best')
+    return ax
 
-    # Save the figure before showing it
-    plt.savefig('shapes/trajectory_plot.png')
 
-    # Then show the plot
-    plt.show()
+def render_trajectories(sources, plot_file, labels=None, home_positions=None, max_points=2000, color_by=None, title=None, figsize=(8, 6)):
+    """
+    Render one or many trajectories into a single figure and save it to plot_file, without a
+    display. sources is a trajectory file, a swarm container (every drone is drawn), a trajectory
+    object or a list of those.
+    """
+    from matplotlib.figure import Figure
+
+    trajectories = _load(sources)
+    fig = Figure(figsize=figsize)
+    draw_trajectories(fig, trajectories, labels=labels, home_positions=home_positions, max_points=max_points,
+                      color_by=color_by, title=title or ('Drone Trajectory' if len(trajectories) == 1 else 'Drone Trajectories'))
+    directory = os.path.dirname(plot_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fig.savefig(plot_file)
+    return plot_file
+
+
+def render_plots(jobs, processes=None):
+    """
+    Render many plots in parallel worker processes. Every job is (sources, plot_file) or
+    (sources, plot_file, options), with options passed on to render_trajectories. Sources should
+    be file paths, so that only the paths are sent to the workers. Returns the plot files.
+    """
+    jobs = [job if len(job) == 3 else (job[0], job[1], {}) for job in jobs]
+    if processes == 1 or len(jobs) <= 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_render_job, jobs))
+
+
+def _render_job(job):
+    sources, plot_file, options = job
+    return render_trajectories(sources, plot_file, **options)
+
+
+def _load(sources):
+    if isinstance(sources, (str, os.PathLike)) or not isinstance(sources, (list, tuple)):
+        sources = [sources]
+    trajectories = []
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            source = os.fspath(source)
+            if source.endswith(SWARM_EXTENSION):
+                swarm = read_swarm_container(source)
+                trajectories.extend(swarm.drone(i) for i in range(len(swarm)))
+            else:
+                trajectories.append(load_trajectory(source))
+        else:
+            trajectories.append(source)
+    return trajectories
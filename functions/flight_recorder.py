@@ -0,0 +1,179 @@
+"""
+Asynchronous flight recorder for commanded vs. actual state.
+
+`FlightRecorder.record` is called from the control loop with every setpoint sent to a drone and
+the latest matching telemetry sample. It only appends a tuple to an in-memory batch; a
+background task periodically hands the batch to a worker thread that appends it to the log
+file, so disk I/O never blocks the control loop.
+
+Log File Structure:
+-------------------
+- 8 bytes magic: b"SWFLOG01"
+- 4 bytes little-endian uint32: length of the JSON header in bytes
+- JSON header (utf-8) with the record fields and their dtypes
+- Fixed-size little-endian records (RECORD_DTYPE), appended in batches
+
+Every record holds:
+- drone_id, mode: drone and flight mode code of the setpoint
+- t: trajectory time of the setpoint, time: monotonic clock when it was recorded
+- sp_px..sp_vz: commanded position and velocity (NED)
+- north_m..down_m_s: latest local position and velocity telemetry (NED), telemetry_time: its timestamp
+  (NaN while no telemetry has been received)
+
+Usage:
+------
+recorder = FlightRecorder("logs/offboard_log.bin")
+recorder.start()
+recorder.record(drone_id, t, setpoint, telemetry.latest("position_velocity_ned"))
+await recorder.close()
+export_flight_log_csv("logs/offboard_log.bin", "logs/offboard_log.csv")
+plot_flight_log("logs/offboard_log.bin", "logs/flight_path.png")
+"""
+
+import asyncio
+import csv
+import json
+import math
+import os
+import struct
+import numpy as np
+from functions.clock import loop_time
+
+LOG_MAGIC = b"SWFLOG01"
+
+RECORD_DTYPE = np.dtype([
+    ("drone_id", "<i4"),
+    ("mode", "<i4"),
+    ("t", "<f8"),
+    ("time", "<f8"),
+    ("sp_px", "<f8"), ("sp_py", "<f8"), ("sp_pz", "<f8"),
+    ("sp_vx", "<f8"), ("sp_vy", "<f8"), ("sp_vz", "<f8"),
+    ("north_m", "<f8"), ("east_m", "<f8"), ("down_m", "<f8"),
+    ("north_m_s", "<f8"), ("east_m_s", "<f8"), ("down_m_s", "<f8"),
+    ("telemetry_time", "<f8"),
+])
+
+NO_TELEMETRY = (math.nan,) * 7
+
+
+class FlightRecorder:
+
+    def __init__(self, path, append=False, flush_interval=1.0, batch_size=4096, clock=loop_time):
+        self.path = path
+        self.append = append
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.clock = clock
+        self.records_written = 0
+        self._batch = []
+        self._wakeup = None
+        self._writer = None
+        self._stopping = False
+        # Batches are written one at a time and in order, by the writer task or by flush()/close()
+        self._flushing = asyncio.Lock()
+
+    def start(self):
+        """Create the log file (with its header) and start the background writer. With append=True
+        an existing log is kept and the new records are appended to it."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not self.append or not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            header = json.dumps({"version": 1, "fields": [[name, RECORD_DTYPE[name].str] for name in RECORD_DTYPE.names]}).encode("utf-8")
+            with open(self.path, "wb") as file:
+                file.write(LOG_MAGIC)
+                file.write(struct.pack("<I", len(header)))
+                file.write(header)
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def record(self, drone_id, t, setpoint, actual=None):
+        """
+        Queue one record. setpoint is (position, velocity, acceleration, yaw, mode_code) as returned
+        by TrajectoryPlayer.setpoint_at; actual is a position_velocity_ned telemetry row
+        [timestamp, north_m, east_m, down_m, north_m_s, east_m_s, down_m_s] or None.
+        """
+        position, velocity, acceleration, yaw, mode_code = setpoint
+        if actual is None:
+            telemetry = NO_TELEMETRY
+        else:
+            telemetry = (*actual[1:7], actual[0])
+        self._batch.append((drone_id, mode_code, t, self.clock(), *position, *velocity, *telemetry))
+        if len(self._batch) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _write_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Hand the current batch to a worker thread and wait until it is on disk."""
+        async with self._flushing:
+            if not self._batch:
+                return
+            batch, self._batch = self._batch, []
+            await asyncio.to_thread(self._append, batch)
+
+    def _append(self, batch):
+        data = np.array(batch, dtype=RECORD_DTYPE)
+        with open(self.path, "ab") as file:
+            file.write(data.tobytes())
+        self.records_written += len(batch)
+
+    async def close(self):
+        """Stop the background writer and flush everything still in memory.
+
+        The writer is not cancelled: a batch being written by the worker thread would be lost from
+        records_written or interleave with the final flush. It is asked to stop and finishes its
+        current flush first.
+        """
+        if self._writer is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+        await self.flush()
+
+
+def read_flight_log(path):
+    """Return all records of a flight log as a numpy structured array (RECORD_DTYPE)."""
+    with open(path, "rb") as file:
+        if file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"Not a flight log: {path}")
+        (header_length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(header_length).decode("utf-8"))
+        dtype = np.dtype([(name, dtype) for name, dtype in header["fields"]])
+        return np.fromfile(file, dtype=dtype)
+
+
+def export_flight_log_csv(log_path, csv_path):
+    records = read_flight_log(log_path)
+    with open(csv_path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(records.dtype.names)
+        writer.writerows(records.tolist())
+
+
+def plot_flight_log(log_path, png_path):
+    """Save a 3D plot of commanded (dashed) and actual (solid) paths of every drone, without a display."""
+    from matplotlib.figure import Figure
+
+    records = read_flight_log(log_path)
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot(111, projection="3d")
+    for drone_id in np.unique(records["drone_id"]):
+        drone_records = records[records["drone_id"] == drone_id]
+        line, = ax.plot(drone_records["sp_px"], drone_records["sp_py"], -drone_records["sp_pz"], linestyle="--", label=f"Drone {drone_id} commanded")
+        ax.plot(drone_records["north_m"], drone_records["east_m"], -drone_records["down_m"], color=line.get_color(), label=f"Drone {drone_id} actual")
+
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_zlabel('Z')
+    ax.set_title('Flight Path')
+    ax.legend(loc='best')
+    fig.savefig(png_path)
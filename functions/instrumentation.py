@@ -0,0 +1,193 @@
+"""
+Latency and jitter instrumentation of the offboard setpoint loop.
+
+`TickInstrumentation` keeps fixed-bucket histograms per drone (and one for the swarm tick as a
+whole) of:
+- SETPOINT_LATENCY: how long each offboard setpoint call took to complete
+- LATENESS: how late the tick loop woke up after the tick's deadline
+- ITERATION: how long one loop iteration took, from waking up to the last setpoint sent
+
+A histogram only stores a count per bucket, plus the count, sum, min and max, so recording is a
+binary search over a few bucket bounds and memory does not grow with the length of the flight.
+Percentiles are read from the buckets and are accurate to the bucket width.
+
+Every summary_interval seconds `tick()` prints one summary line over all drones; `report()` gives
+one line per drone and histogram, and `dump(path)` writes every histogram to a JSON file, at any
+time and, after dump_on_signal(path), whenever the process receives SIGUSR1
+(`kill -USR1 <pid>`).
+
+Instrumentation is switched off by passing None instead of a TickInstrumentation; the loops then
+only pay for one `is not None` check per tick and per setpoint call.
+
+Usage:
+------
+instrumentation = TickInstrumentation(summary_interval=10.0)
+instrumentation.dump_on_signal("logs/latency.json")
+ticker = SwarmTicker(period=0.05, instrumentation=instrumentation)
+await ticker.run()
+print(instrumentation.report())
+instrumentation.dump("logs/latency.json")
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import signal
+from functions.clock import loop_time
+
+SETPOINT_LATENCY = "setpoint_latency"
+LATENESS = "lateness"
+ITERATION = "iteration"
+METRICS = [SETPOINT_LATENCY, LATENESS, ITERATION]
+
+# Key of the histograms that belong to the swarm tick rather than to a single drone
+SWARM = "swarm"
+
+# Upper bounds (seconds) of the histogram buckets; one more bucket counts everything above the last
+LATENCY_BUCKETS = [0.0, 50e-6, 100e-6, 200e-6, 500e-6, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same bounds."""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (the max for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return (f"p50={self.percentile(50) * 1000:.2f}ms p99={self.percentile(99) * 1000:.2f}ms "
+                f"max={(self.max or 0.0) * 1000:.2f}ms")
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.total, "min": self.min, "max": self.max, "counts": self.counts}
+
+
+class TickInstrumentation:
+
+    def __init__(self, summary_interval=10.0, bounds=LATENCY_BUCKETS, clock=loop_time, output=print):
+        self.summary_interval = summary_interval
+        self.bounds = bounds
+        self.clock = clock
+        self.output = output
+        self.drones = {}
+        self.next_summary = None
+
+    def histogram(self, drone_id, metric):
+        histograms = self.drones.get(drone_id)
+        if histograms is None:
+            histograms = self.drones[drone_id] = {name: Histogram(self.bounds) for name in METRICS}
+        return histograms[metric]
+
+    def record(self, drone_id, metric, seconds):
+        self.histogram(drone_id, metric).add(seconds)
+
+    def tick(self):
+        """Call once per loop iteration; prints the summary line every summary_interval seconds."""
+        if self.summary_interval is None:
+            return
+        now = self.clock()
+        if self.next_summary is None:
+            self.next_summary = now + self.summary_interval
+        elif now >= self.next_summary:
+            self.next_summary = now + self.summary_interval
+            self.output(self.summary())
+
+    def totals(self, metric):
+        """One histogram of metric over every drone."""
+        total = Histogram(self.bounds)
+        for histograms in self.drones.values():
+            total.merge(histograms[metric])
+        return total
+
+    def summary(self):
+        """One line with the percentiles of every metric over all drones."""
+        parts = []
+        for metric in METRICS:
+            total = self.totals(metric)
+            if total.count:
+                parts.append(f"{metric} {total.summary()}")
+        return "Latency: " + (" | ".join(parts) if parts else "no samples")
+
+    def report(self):
+        """One line per drone and metric it has samples of."""
+        lines = []
+        for drone_id, histograms in self.drones.items():
+            for metric in METRICS:
+                histogram = histograms[metric]
+                if histogram.count:
+                    label = "Swarm" if drone_id == SWARM else f"Drone id: {drone_id}:"
+                    lines.append(f"{label} {metric} n={histogram.count} mean={histogram.mean * 1000:.2f}ms {histogram.summary()}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "bounds": self.bounds,
+            "drones": {str(drone_id): {metric: histogram.to_dict() for metric, histogram in histograms.items()}
+                       for drone_id, histograms in self.drones.items()},
+        }
+
+    def dump(self, path):
+        """Write every histogram to a JSON file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        return path
+
+    def dump_on_signal(self, path, signum=None):
+        """Dump to path whenever the process receives signum (SIGUSR1); False where signals are not supported."""
+        signum = signum if signum is not None else getattr(signal, "SIGUSR1", None)
+        if signum is None:
+            return False
+        try:
+            asyncio.get_running_loop().add_signal_handler(signum, self._dump_requested, path)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
+    def _dump_requested(self, path):
+        self.dump(path)
+        self.output(f"Latency histograms saved to {path}")
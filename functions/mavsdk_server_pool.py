@@ -0,0 +1,160 @@
+"""
+Managed pool of mavsdk_server processes, one per drone.
+
+The flight scripts talk to every drone through its own mavsdk_server, which bridges a MAVLink
+connection (for example "udp://:14540") to a local gRPC port. `MavsdkServerPool`:
+
+- allocates a free local gRPC port for every server instead of hard-coding 50040 + i,
+- starts all servers concurrently,
+- waits until each gRPC endpoint accepts TCP connections before handing it out,
+- restarts a server on the same port if it crashes (up to max_restarts times),
+- terminates every server on stop(), escalating to SIGKILL if one does not exit in time.
+
+The MAVLink side is not allocated dynamically: PX4 SITL instance i always sends to UDP port
+14540 + i, so the system addresses are passed in by the caller.
+
+Usage:
+------
+async with MavsdkServerPool() as pool:
+    servers = await pool.start(["udp://:14540", "udp://:14541"])
+    drone = System(mavsdk_server_address=pool.host, port=servers[0].grpc_port)
+
+The server binary and its arguments are configurable, so the pool can be exercised against
+any stand-in program that listens on the TCP port given after "-p".
+"""
+
+import asyncio
+import socket
+
+
+class MavsdkServerError(Exception):
+    pass
+
+
+class MavsdkServer:
+    """One managed mavsdk_server process."""
+
+    def __init__(self, index, grpc_port, system_address):
+        self.index = index
+        self.grpc_port = grpc_port
+        self.system_address = system_address
+        self.process = None
+        self.restarts = 0
+        self.supervisor = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+
+class MavsdkServerPool:
+
+    def __init__(self, server_binary="./mavsdk_server", host="127.0.0.1", ready_timeout=10.0,
+                 max_restarts=3, poll_interval=0.05, stop_timeout=5.0):
+        self.server_binary = server_binary
+        self.host = host
+        self.ready_timeout = ready_timeout
+        self.max_restarts = max_restarts
+        self.poll_interval = poll_interval
+        self.stop_timeout = stop_timeout
+        self.servers = []
+        self._allocated_ports = set()
+        self._stopping = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def server_command(self, server):
+        return [self.server_binary, "-p", str(server.grpc_port), server.system_address]
+
+    def allocate_port(self):
+        """Ask the OS for a free TCP port on host that this pool has not handed out yet."""
+        while True:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.bind((self.host, 0))
+                port = sock.getsockname()[1]
+            if port not in self._allocated_ports:
+                self._allocated_ports.add(port)
+                return port
+
+    async def start(self, system_addresses):
+        """Start one server per system address concurrently and wait until all of them are ready."""
+        servers = [MavsdkServer(len(self.servers) + i, self.allocate_port(), address) for i, address in enumerate(system_addresses)]
+        self.servers.extend(servers)
+        results = await asyncio.gather(*(self._launch(server) for server in servers), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # Only this batch is torn down; servers of earlier start() calls are still in use
+            await asyncio.gather(*(self._terminate(server) for server in servers))
+            for server in servers:
+                self.servers.remove(server)
+                self._allocated_ports.discard(server.grpc_port)
+            raise errors[0]
+        for server in servers:
+            server.supervisor = asyncio.create_task(self._supervise(server))
+        return servers
+
+    async def _launch(self, server):
+        server.process = await asyncio.create_subprocess_exec(*self.server_command(server))
+        await self.wait_ready(server)
+
+    async def wait_ready(self, server):
+        """Wait until the server's gRPC port accepts a TCP connection."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.ready_timeout
+        while True:
+            if server.process.returncode is not None:
+                raise MavsdkServerError(f"mavsdk_server {server.index} exited with code {server.process.returncode} before becoming ready")
+            try:
+                _, writer = await asyncio.open_connection(self.host, server.grpc_port)
+            except OSError:
+                if loop.time() >= deadline:
+                    raise MavsdkServerError(f"mavsdk_server {server.index} not listening on port {server.grpc_port} after {self.ready_timeout}s")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            writer.close()
+            await writer.wait_closed()
+            return
+
+    async def _supervise(self, server):
+        while True:
+            return_code = await server.process.wait()
+            if self._stopping:
+                return
+            if server.restarts >= self.max_restarts:
+                print(f"mavsdk_server {server.index} exited with code {return_code}, giving up after {server.restarts} restarts")
+                return
+            server.restarts += 1
+            print(f"mavsdk_server {server.index} exited with code {return_code}, restarting ({server.restarts}/{self.max_restarts})")
+            try:
+                await self._launch(server)
+            except (OSError, MavsdkServerError) as error:
+                print(f"Restarting mavsdk_server {server.index} failed: {error}")
+                return
+
+    async def stop(self):
+        """Terminate every server, killing the ones that do not exit within stop_timeout."""
+        self._stopping = True
+        for server in self.servers:
+            if server.supervisor is not None:
+                server.supervisor.cancel()
+        await asyncio.gather(*(self._terminate(server) for server in self.servers))
+        self.servers = []
+        self._allocated_ports.clear()
+        self._stopping = False
+
+    async def _terminate(self, server):
+        if not server.running:
+            return
+        try:
+            server.process.terminate()
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(server.process.wait(), self.stop_timeout)
+        except asyncio.TimeoutError:
+            server.process.kill()
+            await server.process.wait()
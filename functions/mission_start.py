@@ -0,0 +1,110 @@
+"""
+Synchronized mission start for a swarm.
+
+Every drone comes up at its own pace: connection, health, arming and offboard start depend on
+the link and on PX4. If each drone started its trajectory clock when its own bring-up finished,
+the formation would be off by the differences. `MissionStart` is a barrier instead: every drone
+reports `ready()` once it is in offboard mode (or `fail()` if it cannot get there), and when all
+expected drones have reported, a single mission epoch on the monotonic loop clock is broadcast to
+all of them:
+
+    epoch = time the last drone became ready + lead_time
+
+Playback is then indexed against the epoch (TickScheduler.start(epoch), SwarmTicker.run(epoch)),
+plus the intentional time shift of each drone, so the whole swarm flies in lockstep whatever the
+bring-up delays were. lead_time leaves room for the broadcast to reach every drone task before
+tick 0 is due.
+
+PX4 leaves offboard mode when setpoints stop arriving, so a drone waiting at the barrier keeps
+sending its hold setpoint through `keep_alive` every keep_alive_period seconds until the epoch.
+An exception raised by keep_alive (for instance because PX4 disarmed the drone) ends the wait of
+that drone and is raised by `ready()`; the caller reports it with `fail()`.
+
+The drones at the barrier are armed, and PX4 disarms a drone that stays on the ground armed for
+too long (COM_DISARM_PRFLT, 10 s by default). With a timeout, the first drone to report ready
+waits at most timeout seconds: the epoch is then broadcast without the drones that have not
+reported yet, and those are counted as failed (`ready()` raises for a drone arriving after the
+broadcast).
+
+Usage:
+------
+mission_start = MissionStart(expected=range(num_drones), timeout=8.0)
+# in every drone's bring-up task, after offboard.start():
+epoch = await mission_start.ready(drone_id, keep_alive=lambda: drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, 0.0, 0.0)))
+# in the mission task:
+epoch = await mission_start.epoch()
+await ticker.run(epoch=epoch)
+"""
+
+import asyncio
+from functions.clock import loop_time
+
+
+class MissionStart:
+
+    def __init__(self, expected, lead_time=0.5, keep_alive_period=0.1, timeout=None, clock=loop_time):
+        self.expected = set(expected)
+        self.lead_time = lead_time
+        self.keep_alive_period = keep_alive_period
+        self.timeout = timeout
+        self.clock = clock
+        self.ready_ids = []
+        self.failed_ids = []
+        self._epoch = None
+        self._deadline = None
+
+    @property
+    def broadcast(self):
+        if self._epoch is None:
+            self._epoch = asyncio.get_running_loop().create_future()
+        return self._epoch
+
+    def _arrived(self):
+        if self.broadcast.done() or self.expected - set(self.ready_ids) - set(self.failed_ids):
+            return
+        epoch = self.clock() + self.lead_time
+        print(f"-- Drones {self.ready_ids} ready in offboard, mission epoch in {self.lead_time:.2f} s"
+              + (f" (without {self.failed_ids})" if self.failed_ids else ""))
+        self.broadcast.set_result(epoch)
+
+    def _expire(self):
+        if self.broadcast.done() or self._deadline is None or self.clock() < self._deadline:
+            return
+        missing = sorted(self.expected - set(self.ready_ids) - set(self.failed_ids))
+        print(f"-- Drones {missing} not ready within {self.timeout:.2f} s, starting without them")
+        self.failed_ids.extend(missing)
+        self._arrived()
+
+    async def ready(self, drone_id, keep_alive=None):
+        """Report a drone ready in offboard and wait for the epoch, sending keep_alive() meanwhile; returns the epoch."""
+        if self.broadcast.done():
+            raise RuntimeError(f"Drone {drone_id} ready after the mission epoch was broadcast")
+        self.ready_ids.append(drone_id)
+        if self.timeout is not None and self._deadline is None:
+            self._deadline = self.clock() + self.timeout
+        self._arrived()
+        broadcast = self.broadcast
+        while not broadcast.done() or (keep_alive is not None and self.clock() + self.keep_alive_period < broadcast.result()):
+            if keep_alive is not None:
+                await keep_alive()
+                await asyncio.sleep(self.keep_alive_period)
+            else:
+                await asyncio.wait([broadcast], timeout=None if self._deadline is None else max(0.0, self._deadline - self.clock()))
+            self._expire()
+        epoch = broadcast.result()
+        delay = epoch - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return epoch
+
+    def fail(self, drone_id):
+        """Report a drone that will not make it to offboard (or dropped out at the barrier), so the others do not wait for it."""
+        if drone_id in self.ready_ids:
+            self.ready_ids.remove(drone_id)
+        if drone_id not in self.failed_ids:
+            self.failed_ids.append(drone_id)
+        self._arrived()
+
+    async def epoch(self):
+        """Wait for the broadcast and return the mission epoch."""
+        return await self.broadcast
@@ -0,0 +1,121 @@
+"""
+Constant-time waypoint lookup for offboard trajectory playback.
+
+The flight scripts ask, once per tick, for the first waypoint whose time is not earlier than
+the current playback time. `TrajectoryPlayer` answers that without scanning the trajectory:
+
+- When the timestamps are evenly spaced by `step_time`, the index is computed directly.
+- Otherwise a cursor remembers the last answer and only moves forward a few rows per tick,
+  which is the common case for monotonic playback.
+- Large jumps or going back in time fall back to a binary search.
+
+`setpoint_at` additionally interpolates between the stored rows, so setpoints can be streamed
+at a higher rate than the trajectory was sampled at (for example 20-50 Hz from a 10 Hz file):
+
+- STEP: the waypoint returned by `index_at`, unchanged (the original playback behaviour).
+- LINEAR: linear interpolation of every column between the two rows around t.
+- HERMITE: cubic Hermite interpolation of the position using the stored px..pz and vx..vz
+  columns, with the velocity taken from the Hermite derivative. Across a change of flight mode
+  the rows are not assumed to be continuous, so linear interpolation is used there instead.
+"""
+
+import math
+import numpy as np
+
+# Tolerance used when comparing playback time with waypoint timestamps
+TIME_EPSILON = 1e-9
+
+# Rows the cursor may walk forward before switching to binary search
+MAX_CURSOR_WALK = 8
+
+STEP = "step"
+LINEAR = "linear"
+HERMITE = "hermite"
+
+
+class TrajectoryPlayer:
+
+    def __init__(self, trajectory):
+        self.trajectory = trajectory
+        self.times = np.asarray(trajectory.t, dtype=float)
+        self.cursor = 0
+        self.last_time = -math.inf
+        self.start_time = float(self.times[0]) if len(self.times) else 0.0
+        self.step_time = trajectory.step_time
+        self.uniform = is_uniform(self.times, self.step_time)
+
+    def index_at(self, t):
+        """Return the index of the first waypoint with t <= waypoint time, or None past the end."""
+        count = len(self.times)
+        if count == 0 or t - TIME_EPSILON > self.times[-1]:
+            return None
+
+        if self.uniform:
+            index = max(0, math.ceil((t - self.start_time) / self.step_time - TIME_EPSILON))
+            return index if index < count else None
+
+        target = t - TIME_EPSILON
+        if t < self.last_time:
+            self.cursor = int(np.searchsorted(self.times, target, side="left"))
+        else:
+            cursor = self.cursor
+            limit = min(cursor + MAX_CURSOR_WALK, count)
+            while cursor < limit and self.times[cursor] < target:
+                cursor += 1
+            if cursor == limit and cursor < count and self.times[cursor] < target:
+                cursor += int(np.searchsorted(self.times[cursor:], target, side="left"))
+            self.cursor = cursor
+        self.last_time = t
+        return self.cursor if self.cursor < count else None
+
+    def waypoint_at(self, t):
+        """Return the waypoint row for time t, or None past the end of the trajectory."""
+        index = self.index_at(t)
+        return None if index is None else self.trajectory.row(index)
+
+    def setpoint_at(self, t, interpolation=HERMITE):
+        """Return (position, velocity, acceleration, yaw, mode_code) at time t, or None past the end."""
+        if interpolation not in (STEP, LINEAR, HERMITE):
+            raise ValueError(f"Invalid interpolation: {interpolation}")
+
+        index = self.index_at(t)
+        if index is None:
+            return None
+
+        if interpolation == STEP or index == 0:
+            return _split_row(self.trajectory.row(index))
+
+        # The two rows around t, converted to floats in one go
+        previous, row = self.trajectory.block(index - 1, index + 1).tolist()
+        t0, t1 = previous[0], row[0]
+        if t >= t1:
+            return _split_row(self.trajectory.row(index))
+
+        s = (t - t0) / (t1 - t0)
+        blended = [a + (b - a) * s for a, b in zip(previous, row)]
+        position = blended[1:4]
+        velocity = blended[4:7]
+
+        if interpolation == HERMITE and previous[-1] == row[-1]:
+            h = t1 - t0
+            s2 = s * s
+            s3 = s2 * s
+            h00, h10, h01, h11 = 2 * s3 - 3 * s2 + 1, (s3 - 2 * s2 + s) * h, -2 * s3 + 3 * s2, (s3 - s2) * h
+            d00, d10, d01, d11 = (6 * s2 - 6 * s) / h, 3 * s2 - 4 * s + 1, (-6 * s2 + 6 * s) / h, 3 * s2 - 2 * s
+            # previous[i] and row[i] are positions, previous[i + 3] and row[i + 3] velocities
+            position = [h00 * previous[i] + h10 * previous[i + 3] + h01 * row[i] + h11 * row[i + 3] for i in (1, 2, 3)]
+            velocity = [d00 * previous[i] + d10 * previous[i + 3] + d01 * row[i] + d11 * row[i + 3] for i in (1, 2, 3)]
+
+        return tuple(position), tuple(velocity), tuple(blended[7:10]), blended[10], int(row[-1])
+
+
+def _split_row(row):
+    return row[1:4], row[4:7], row[7:10], row[10], row[-1]
+
+
+def is_uniform(times, step_time, tolerance=1e-6):
+    """True when times[i] == times[0] + i * step_time for every row (within tolerance)."""
+    if not step_time or len(times) < 2:
+        return False
+    expected = times[0] + np.arange(len(times)) * step_time
+    return bool(np.all(np.abs(times - expected) <= tolerance))
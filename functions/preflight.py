@@ -0,0 +1,185 @@
+"""
+Concurrent, bounded pre-flight bring-up of a swarm.
+
+Every drone goes through the same stages before it can fly offboard:
+
+    connection_state -> health -> arm -> set_position_ned -> offboard.start
+
+`PreflightPipeline` runs these stages for all drones at the same time, each drone moving on as
+soon as its own previous stage is done, so a swarm is ready in about the time of its slowest
+drone rather than the sum of all of them. Every stage has its own timeout and number of retries,
+and at most `concurrency` command stages (arm, set_position_ned, offboard.start) run at once, so a
+large swarm does not flood mavsdk_server and PX4 with commands. Stages that only wait on a
+telemetry stream (connection_state, health) are not bounded: they send nothing, and a drone
+slow to get a GPS fix would otherwise hold a slot for its whole timeout and stall the commands
+of drones that are already healthy. A drone that fails a stage (after its retries) is dropped
+from the bring-up, `on_failure(drone_id, drone, stage)` is called to clean it up, and the others
+carry on: one unhealthy drone no longer holds up the swarm.
+
+Stages are `PreflightStage(name, action, timeout, retries, bounded)`, with action(drone_id, drone)
+a coroutine function and bounded telling whether the stage takes one of the `concurrency` slots.
+The outcome of every drone (stage reached, attempts, time per stage, error) is collected into a
+`PreflightReport`.
+
+Usage:
+------
+stages = [
+    PreflightStage(CONNECTION_STATE, wait_for_connection, timeout=30.0, bounded=False),
+    PreflightStage(HEALTH, wait_for_health, timeout=60.0, bounded=False),
+    PreflightStage(ARM, arm_drone, timeout=5.0, retries=2),
+    ...
+]
+pipeline = PreflightPipeline(stages, concurrency=16)
+report = await pipeline.run({drone_id: drone for drone_id, drone in enumerate(drones)})
+print(report.summary())
+ready = report.ready_ids
+"""
+
+import asyncio
+
+from functions.clock import loop_time
+
+CONNECTION_STATE = "connection_state"
+HEALTH = "health"
+ARM = "arm"
+SET_POSITION_NED = "set_position_ned"
+OFFBOARD_START = "offboard.start"
+
+# Stages that send a command to the drone; the others only wait on a telemetry stream
+COMMAND_STAGES = (ARM, SET_POSITION_NED, OFFBOARD_START)
+
+
+class PreflightStage:
+
+    def __init__(self, name, action, timeout=10.0, retries=0, bounded=True):
+        self.name = name
+        self.action = action
+        self.timeout = timeout
+        self.retries = retries
+        self.bounded = bounded
+
+
+class DroneReadiness:
+    """Bring-up outcome of one drone."""
+
+    def __init__(self, drone_id):
+        self.drone_id = drone_id
+        self.ready = False
+        self.stage = None
+        self.failed_stage = None
+        self.error = None
+        self.attempts = {}
+        self.durations = {}
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        return self.finished - self.started if self.finished is not None else None
+
+    def summary(self):
+        if self.ready:
+            slowest = max(self.durations, key=self.durations.get) if self.durations else None
+            retried = {name: count - 1 for name, count in self.attempts.items() if count > 1}
+            return (f"Drone id: {self.drone_id}: ready in {self.duration:.2f}s"
+                    + (f", slowest stage {slowest} {self.durations[slowest]:.2f}s" if slowest else "")
+                    + (f", retries {retried}" if retried else ""))
+        return (f"Drone id: {self.drone_id}: FAILED at {self.failed_stage} after {self.attempts.get(self.failed_stage, 0)} attempts"
+                f" ({self.error})")
+
+
+class PreflightReport:
+
+    def __init__(self, drones):
+        self.drones = drones
+
+    @property
+    def ready_ids(self):
+        return [readiness.drone_id for readiness in self.drones if readiness.ready]
+
+    @property
+    def failed_ids(self):
+        return [readiness.drone_id for readiness in self.drones if not readiness.ready]
+
+    @property
+    def duration(self):
+        """From the first drone starting its bring-up to the last one finishing it."""
+        finished = [readiness for readiness in self.drones if readiness.finished is not None]
+        if not finished:
+            return 0.0
+        return max(readiness.finished for readiness in finished) - min(readiness.started for readiness in finished)
+
+    def summary(self):
+        """One line per drone and a total line."""
+        lines = [readiness.summary() for readiness in self.drones]
+        lines.append(f"Pre-flight: {len(self.ready_ids)}/{len(self.drones)} drones ready in {self.duration:.2f}s"
+                     + (f", failed: {self.failed_ids}" if self.failed_ids else ""))
+        return "\n".join(lines)
+
+
+class PreflightPipeline:
+
+    def __init__(self, stages, concurrency=16, retry_delay=0.5, on_failure=None, clock=loop_time):
+        self.stages = stages
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        self.on_failure = on_failure
+        self.clock = clock
+        self.results = {}
+        self._slots = None
+
+    async def run_drone(self, drone_id, drone):
+        """Run every stage for one drone; returns its DroneReadiness."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        readiness = self.results[drone_id] = DroneReadiness(drone_id)
+        readiness.started = self.clock()
+
+        for stage in self.stages:
+            readiness.stage = stage.name
+            started = self.clock()
+            error = None
+            for attempt in range(stage.retries + 1):
+                readiness.attempts[stage.name] = attempt + 1
+                try:
+                    if stage.bounded:
+                        async with self._slots:
+                            await asyncio.wait_for(stage.action(drone_id, drone), stage.timeout)
+                    else:
+                        await asyncio.wait_for(stage.action(drone_id, drone), stage.timeout)
+                except asyncio.TimeoutError:
+                    error = f"timed out after {stage.timeout}s"
+                except Exception as exception:
+                    error = str(exception) or type(exception).__name__
+                else:
+                    error = None
+                    break
+                print(f"Drone id: {drone_id}: {stage.name} attempt {attempt + 1}/{stage.retries + 1} failed: {error}")
+                if attempt < stage.retries:
+                    await asyncio.sleep(self.retry_delay)
+            readiness.durations[stage.name] = self.clock() - started
+
+            if error is not None:
+                readiness.failed_stage = stage.name
+                readiness.error = error
+                readiness.finished = self.clock()
+                if self.on_failure is not None:
+                    try:
+                        await self.on_failure(drone_id, drone, stage.name)
+                    except Exception as exception:
+                        print(f"Drone id: {drone_id}: clean-up after failed {stage.name} failed: {exception}")
+                return readiness
+
+        readiness.ready = True
+        readiness.finished = self.clock()
+        return readiness
+
+    async def run(self, drones):
+        """Bring up every drone of a {drone_id: drone} dict concurrently; returns the PreflightReport."""
+        await asyncio.gather(*(self.run_drone(drone_id, drone) for drone_id, drone in drones.items()))
+        return self.report(drones)
+
+    def report(self, drone_ids=None):
+        """PreflightReport of the given drones (default: every drone run so far)."""
+        drone_ids = self.results if drone_ids is None else drone_ids
+        return PreflightReport([self.results[drone_id] for drone_id in drone_ids if drone_id in self.results])
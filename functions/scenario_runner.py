@@ -0,0 +1,212 @@
+"""
+Mission regression testing: fly every shape over a grid of parameters against simulated drones.
+
+A scenario is a dict of create_active_csv arguments plus the number of drones. `run_scenario`
+generates the trajectory with create_active_csv, then flies it with the same code the flight
+scripts use (TrajectoryPlayer and SwarmTicker) against SimWorld drones (functions/sim_drone.py)
+on a virtual clock (functions/clock.py): arm, start offboard, stream setpoints, land and disarm.
+A mission of a few minutes takes a few seconds of CPU and the result does not depend on the load
+of the machine.
+
+Every setpoint is scored against the simulated drone state with TrackingMetrics. A scenario
+passes when every drone completed its trajectory, landed and disarmed, and the position error
+stayed within max_position_rms (RMS) and max_position_error (worst sample). The commanded peak
+speed and acceleration are reported too: shapes flown too fast for their diameter ask for more
+than the simulated vehicle's max_speed and max_acceleration and fail on tracking error.
+
+`run_scenarios` fans the scenarios out over a process pool, one scenario per task, and returns
+one result dict per scenario (pass/fail, failures, tracking errors, flight and wall time).
+
+Usage:
+------
+scenarios = scenario_grid(shapes=None, diameters=[10.0, 30.0], directions=[1, -1], maneuver_times=[30.0, 60.0], swarm_sizes=[1, 4])
+results = run_scenarios(scenarios)
+print(summarize(results))
+write_scenario_results("logs/scenarios.json", results)
+"""
+
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from mavsdk.offboard import PositionNedYaw
+from mavsdk.telemetry import LandedState
+
+from functions.clock import run
+from functions.create_active_csv import create_active_csv
+from functions.playback import TrajectoryPlayer, HERMITE
+from functions.sim_drone import SimWorld
+from functions.swarm_ticker import SwarmTicker, send_position_velocity_acceleration
+from functions.tracking_metrics import TrackingMetrics
+from functions.trajectories import map_shape_to_code
+from functions.trajectory_io import read_trajectory_binary
+
+SHAPES = ["eight_shape", "circle", "square", "helix", "heart_shape", "infinity_shape", "spiral_square", "star_shape", "zigzag", "sine_wave"]
+
+# Mission settings shared by every scenario of a grid
+DEFAULT_MISSION = {
+    "start_x": 0.0,
+    "start_y": 0.0,
+    "initial_altitude": 10.0,
+    "climb_rate": 2.0,
+    "move_speed": 2.0,
+    "hold_time": 2.0,
+    "step_time": 0.1,
+}
+
+
+def scenario_grid(shapes=None, diameters=(10.0, 30.0), directions=(1, -1), maneuver_times=(30.0, 60.0), swarm_sizes=(1, 4), **mission):
+    """Every combination of the given values, for every shape of map_shape_to_code by default."""
+    for shape_name in shapes or SHAPES:
+        map_shape_to_code(shape_name)  # raises ValueError for unknown shapes before anything runs
+    settings = dict(DEFAULT_MISSION, **mission)
+    scenarios = []
+    for shape_name, diameter, direction, maneuver_time, drones in itertools.product(shapes or SHAPES, diameters, directions, maneuver_times, swarm_sizes):
+        scenario = dict(settings, shape_name=shape_name, diameter=float(diameter), direction=direction,
+                        maneuver_time=float(maneuver_time), drones=drones)
+        scenario["name"] = f"{shape_name}_d{diameter:g}_dir{direction:+d}_t{maneuver_time:g}_n{drones}"
+        scenarios.append(scenario)
+    return scenarios
+
+
+def run_scenario(scenario, setpoint_rate=20.0, time_offset=1.0, max_position_rms=1.0, max_position_error=3.0, landing_timeout=120.0):
+    """Generate and fly one scenario; returns its result dict. Errors fail the scenario rather than raise."""
+    started = time.perf_counter()
+    result = {"name": scenario.get("name", scenario["shape_name"]), "scenario": scenario, "passed": False, "failures": []}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            arguments = {name: value for name, value in scenario.items() if name not in ("name", "drones")}
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_active_csv(**arguments, output_file=os.path.join(directory, "active.csv"),
+                                  binary_output_file=os.path.join(directory, "active.trj"))
+            trajectory = read_trajectory_binary(os.path.join(directory, "active.trj"), mmap=False)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            flight = run(_fly(trajectory, scenario.get("drones", 1), setpoint_rate, time_offset, landing_timeout), virtual_time=True)
+    except Exception as error:
+        result["failures"].append(f"{type(error).__name__}: {error}")
+        result["duration"] = time.perf_counter() - started
+        return result
+
+    tracking = flight["tracking"]
+    drones = [tracking.stats(drone_id) for drone_id in range(flight["drones"])]
+    speed = np.sqrt(trajectory.column("vx") ** 2 + trajectory.column("vy") ** 2 + trajectory.column("vz") ** 2)
+    acceleration = np.sqrt(trajectory.column("ax") ** 2 + trajectory.column("ay") ** 2 + trajectory.column("az") ** 2)
+    result.update({
+        "rows": len(trajectory),
+        # Commanded peaks, to tell tracking problems from missions beyond the vehicle's limits
+        "max_speed": float(speed.max()),
+        "max_acceleration": float(acceleration.max()),
+        "flight_time": flight["flight_time"],
+        "position_rms": max(stats.position_rms for stats in drones),
+        "position_max": max(stats.position_max for stats in drones),
+        "velocity_rms": max(stats.velocity_rms for stats in drones),
+        "velocity_max": max(stats.velocity_max for stats in drones),
+    })
+    failures = result["failures"]
+    failures.extend(flight["failures"])
+    if result["position_rms"] > max_position_rms:
+        failures.append(f"position error rms {result['position_rms']:.2f} m > {max_position_rms} m")
+    if result["position_max"] > max_position_error:
+        failures.append(f"position error max {result['position_max']:.2f} m > {max_position_error} m")
+    result["passed"] = not failures
+    result["duration"] = time.perf_counter() - started
+    return result
+
+
+async def _fly(trajectory, count, setpoint_rate, time_offset, landing_timeout):
+    loop = asyncio.get_running_loop()
+    world = SimWorld()
+    tracking = TrackingMetrics()
+    failures = []
+
+    drones = []
+    for drone_id in range(count):
+        drone = world.add_drone(home=(0.0, 3.0 * drone_id, 0.0))
+        await drone.connect()
+        await drone.action.arm()
+        await drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, 0.0, 0.0))
+        await drone.offboard.start()
+        drones.append(drone)
+
+    async def land(drone_id, drone):
+        try:
+            await drone.action.land()
+            async for state in drone.telemetry.landed_state():
+                if state == LandedState.ON_GROUND:
+                    break
+            await drone.offboard.stop()
+            await drone.action.disarm()
+        except Exception as error:
+            failures.append(f"drone {drone_id}: landing failed: {error}")
+
+    landings = {}
+    def start_landing(drone_id, drone):
+        landings[drone_id] = asyncio.ensure_future(asyncio.wait_for(land(drone_id, drone), landing_timeout))
+
+    def score(drone_id, t, setpoint):
+        # The simulated state is exact, so every setpoint is scored against the state at its tick
+        world.update()
+        index = drones[drone_id].index
+        actual = (world.time, *world.position[index].tolist(), *world.velocity[index].tolist())
+        tracking.update(drone_id, setpoint, actual)
+
+    started = loop.time()
+    ticker = SwarmTicker(period=1 / setpoint_rate, interpolation=HERMITE, command=send_position_velocity_acceleration,
+                         on_complete=start_landing, on_setpoint=score)
+    for drone_id, drone in enumerate(drones):
+        ticker.add(drone_id, drone, TrajectoryPlayer(trajectory), time_offset=drone_id * time_offset)
+    await ticker.run()
+
+    for drone_id, landing in landings.items():
+        try:
+            await landing
+        except asyncio.TimeoutError:
+            failures.append(f"drone {drone_id}: not landed within {landing_timeout} s")
+    for member in ticker.members:
+        if not member.done:
+            failures.append(f"drone {member.drone_id}: trajectory not completed")
+        if member.timeouts or member.errors:
+            failures.append(f"drone {member.drone_id}: {member.timeouts} setpoint timeouts, {member.errors} errors")
+
+    return {"drones": count, "tracking": tracking, "failures": failures, "flight_time": loop.time() - started}
+
+
+def run_scenarios(scenarios, processes=None, **options):
+    """Run scenarios in a process pool (all cores by default); options are passed to run_scenario."""
+    if processes == 1:
+        return [run_scenario(scenario, **options) for scenario in scenarios]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_scenario, scenario, **options) for scenario in scenarios]
+        return [future.result() for future in futures]
+
+
+def summarize(results):
+    """One line per failed scenario and a total line."""
+    lines = []
+    for result in results:
+        if not result["passed"]:
+            lines.append(f"FAILED {result['name']}: {'; '.join(result['failures'])}")
+    passed = sum(result["passed"] for result in results)
+    worst = max((result.get("position_max", 0.0) for result in results), default=0.0)
+    cpu = sum(result["duration"] for result in results)
+    flown = sum(result.get("flight_time", 0.0) for result in results)
+    lines.append(f"{passed}/{len(results)} scenarios passed, worst position error {worst:.2f} m, "
+                 f"{flown / 60:.1f} min flown in {cpu:.1f} s of scenario time")
+    return "\n".join(lines)
+
+
+def write_scenario_results(path, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+    return path
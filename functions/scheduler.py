@@ -0,0 +1,83 @@
+"""
+Drift-free tick scheduler for streaming offboard setpoints.
+
+`await asyncio.sleep(0.1); t += 0.1` lets the setpoint call latency and the sleep overshoot
+pile up over a mission, and the float time slowly drifts away from the trajectory timestamps.
+`TickScheduler` instead computes every tick from an absolute deadline on a monotonic clock:
+
+    deadline(tick) = epoch + tick * period
+
+and hands out integer tick indices, so the commanded time is always `tick * period`.
+
+When the loop falls behind by more than a period, the policy decides what happens:
+- SKIP: jump straight to the most recent tick whose deadline has passed (default).
+- CATCH_UP: run the missed ticks back to back without sleeping, optionally limited to
+  `max_catch_up` ticks, beyond which the remaining backlog is skipped.
+
+Usage:
+------
+scheduler = TickScheduler(period=0.1)
+async for tick in scheduler.ticks():
+    t = tick * scheduler.period
+    ...
+"""
+
+import asyncio
+from functions.clock import loop_time
+
+SKIP = "skip"
+CATCH_UP = "catch_up"
+
+
+class TickScheduler:
+
+    def __init__(self, period=0.1, policy=SKIP, max_catch_up=None, clock=loop_time):
+        if policy not in (SKIP, CATCH_UP):
+            raise ValueError(f"Invalid scheduler policy: {policy}")
+        self.period = period
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.epoch = None
+        self.tick = -1
+        self.late_ticks = 0
+        self.skipped_ticks = 0
+
+    def start(self, epoch=None):
+        """Start counting ticks from epoch (defaults to now). Tick 0 is due at the epoch."""
+        self.epoch = self.clock() if epoch is None else epoch
+        self.tick = -1
+
+    def deadline(self, tick):
+        return self.epoch + tick * self.period
+
+    async def next_tick(self):
+        """Wait for the next tick's deadline and return its index."""
+        if self.epoch is None:
+            self.start()
+
+        tick = self.tick + 1
+        now = self.clock()
+        delay = self.deadline(tick) - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # Most recent tick whose deadline has already passed
+            current = int((now - self.epoch) // self.period)
+            if current > tick:
+                self.late_ticks += 1
+                if self.policy == SKIP:
+                    target = current
+                elif self.max_catch_up is not None and current - tick > self.max_catch_up:
+                    target = current - self.max_catch_up
+                else:
+                    target = tick
+                self.skipped_ticks += target - tick
+                tick = target
+
+        self.tick = tick
+        return tick
+
+    async def ticks(self):
+        while True:
+            yield await self.next_tick()
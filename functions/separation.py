@@ -0,0 +1,166 @@
+"""
+Pre-flight separation check for a whole swarm.
+
+`check_separation` takes the positions of N drones at T time slices in a common frame and finds
+every pair of drones closer than min_separation, plus the minimum pairwise separation of every
+time slice. Instead of comparing all N² pairs at every slice, the points are hashed into a
+uniform grid with cells of search_radius (the time slice is part of the cell key), so only drones
+in the same or a neighbouring cell of the same slice are compared. All slices are processed in
+one pass of array operations.
+
+The minimum separation of a slice is exact when it is below search_radius; slices in which no
+two drones come within search_radius report inf.
+
+Flight scripts fly every drone in its own local frame, so the positions have to be translated by
+each drone's home position first: `swarm_positions` samples shared or per-drone trajectories
+(with their time offsets) on a common time grid and adds the home positions.
+
+Usage:
+------
+times, positions = swarm_positions(trajectories, home_positions, time_offsets, step_time=0.1)
+report = check_separation(times, positions, min_separation=1.5)
+print(report.summary())
+"""
+
+import itertools
+import numpy as np
+
+from functions.trajectory_io import TRAJECTORY_COLUMNS
+
+# Neighbouring cells of a cell, without the mirrored half: every pair of cells is visited once
+HALF_NEIGHBOURHOOD = [offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)]
+
+VIOLATION_DTYPE = np.dtype([("time", "<f8"), ("drone_a", "<i4"), ("drone_b", "<i4"), ("distance", "<f8")])
+
+
+class SeparationReport:
+
+    def __init__(self, times, min_separation, threshold, violations, drone_ids=None):
+        self.times = times
+        self.min_separation = min_separation
+        self.threshold = threshold
+        self.violations = violations
+        self.drone_ids = drone_ids
+
+    @property
+    def ok(self):
+        return len(self.violations) == 0
+
+    @property
+    def closest(self):
+        """(time, separation) of the closest approach over the whole flight."""
+        index = int(np.argmin(self.min_separation))
+        return float(self.times[index]), float(self.min_separation[index])
+
+    def pairs(self):
+        """Per offending pair: (drone_a, drone_b, first time, last time, minimum distance, time of minimum)."""
+        summaries = []
+        violations = np.sort(self.violations, order=["drone_a", "drone_b", "time"])
+        keys = np.stack([violations["drone_a"], violations["drone_b"]], axis=1)
+        if len(keys) == 0:
+            return summaries
+        boundaries = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+        for group in np.split(violations, boundaries):
+            closest = int(np.argmin(group["distance"]))
+            summaries.append((int(group["drone_a"][0]), int(group["drone_b"][0]), float(group["time"][0]),
+                              float(group["time"][-1]), float(group["distance"][closest]), float(group["time"][closest])))
+        return summaries
+
+    def summary(self):
+        time, separation = self.closest
+        lines = [f"Minimum separation {separation:.2f} m at t={time:.1f} s (required {self.threshold:.2f} m)"]
+        for drone_a, drone_b, first, last, distance, at in self.pairs():
+            if self.drone_ids is not None:
+                drone_a, drone_b = self.drone_ids[drone_a], self.drone_ids[drone_b]
+            lines.append(f"Drones {drone_a} and {drone_b} closer than {self.threshold:.2f} m from t={first:.1f} s to t={last:.1f} s, closest {distance:.2f} m at t={at:.1f} s")
+        return "\n".join(lines)
+
+
+def check_separation(times, positions, min_separation=1.0, search_radius=None, drone_ids=None):
+    """
+    positions is a (T, N, 3) array of drone positions in a common frame (NaN where a drone is not
+    flying), times the (T,) times of the slices. search_radius (2 * min_separation by default) is
+    the grid cell size and the distance up to which the per-slice minimum is exact.
+    """
+    times = np.asarray(times, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    search_radius = 2 * min_separation if search_radius is None else max(search_radius, min_separation)
+    slices, drones = positions.shape[:2]
+
+    points = positions.reshape(-1, 3)
+    valid = np.flatnonzero(~np.isnan(points).any(axis=1))
+    slice_index = valid // drones
+    cells = np.floor(points[valid] / search_radius).astype(np.int64)
+
+    # One integer key per (slice, cell); a margin of one cell keeps the neighbour keys in range
+    low = cells.min(axis=0) - 1 if len(valid) else np.zeros(3, dtype=np.int64)
+    cells -= low
+    size = cells.max(axis=0) + 2 if len(valid) else np.ones(3, dtype=np.int64)
+    keys = ((slice_index * size[0] + cells[:, 0]) * size[1] + cells[:, 1]) * size[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first_points = []
+    second_points = []
+    for offset in [(0, 0, 0)] + HALF_NEIGHBOURHOOD:
+        neighbour_keys = keys + (offset[0] * size[1] + offset[1]) * size[2] + offset[2]
+        lo = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        hi = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+        counts = hi - lo
+        first = np.repeat(np.arange(len(valid)), counts)
+        starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        second = order[starts + np.arange(counts.sum())]
+        if offset == (0, 0, 0):
+            keep = second > first
+            first, second = first[keep], second[keep]
+        first_points.append(first)
+        second_points.append(second)
+    first = valid[np.concatenate(first_points)]
+    second = valid[np.concatenate(second_points)]
+
+    distance = np.linalg.norm(points[first] - points[second], axis=1)
+    near = distance < search_radius
+    first, second, distance = first[near], second[near], distance[near]
+    pair_slice = first // drones
+
+    slice_minimum = np.full(slices, np.inf)
+    np.minimum.at(slice_minimum, pair_slice, distance)
+
+    close = distance < min_separation
+    drone_a = first[close] % drones
+    drone_b = second[close] % drones
+    violations = np.empty(int(close.sum()), dtype=VIOLATION_DTYPE)
+    violations["time"] = times[pair_slice[close]]
+    violations["drone_a"] = np.minimum(drone_a, drone_b)
+    violations["drone_b"] = np.maximum(drone_a, drone_b)
+    violations["distance"] = distance[close]
+    return SeparationReport(times, slice_minimum, min_separation, np.sort(violations, order=["time", "drone_a", "drone_b"]), drone_ids)
+
+
+def swarm_positions(trajectories, home_positions, time_offsets=None, step_time=0.1):
+    """
+    Sample the trajectories of a swarm on a common time grid. trajectories is one trajectory per
+    drone (Trajectory, OffsetTrajectory or a drone of a SwarmTrajectory); home_positions are the
+    (north, east, down) positions of the drones' local origins in the common frame, time_offsets
+    the per-drone playback delays. Before its time offset a drone is at its first setpoint, which
+    SwarmTicker keeps sending until the offset has passed. After its trajectory a drone is taken to
+    stay at its last setpoint; SwarmTicker sends nothing more and the flight scripts land it from
+    there, so the descent itself is not checked. Returns (times, (T, N, 3) positions).
+    """
+    time_offsets = np.zeros(len(trajectories)) if time_offsets is None else np.asarray(time_offsets, dtype=float)
+    end = max(trajectory.duration + offset for trajectory, offset in zip(trajectories, time_offsets))
+    times = np.arange(int(np.floor(end / step_time + 1e-9)) + 1) * step_time
+
+    positions = np.empty((len(times), len(trajectories), 3))
+    for drone, (trajectory, offset, home) in enumerate(zip(trajectories, time_offsets, home_positions)):
+        t = trajectory.column("t")
+        for axis, name in enumerate(("px", "py", "pz")):
+            positions[:, drone, axis] = np.interp(times - offset, t, trajectory.column(name)) + home[axis]
+    return times, positions
+
+
+def swarm_tensor_positions(swarm, home_positions):
+    """(times, (T, N, 3) positions) of a SwarmTrajectory, translated by the drones' home positions."""
+    position = slice(TRAJECTORY_COLUMNS.index("px"), TRAJECTORY_COLUMNS.index("pz") + 1)
+    positions = np.transpose(swarm.data[:, :, position], (1, 0, 2)) + np.asarray(home_positions, dtype=float)[None, :, :]
+    return swarm.data[0, :, TRAJECTORY_COLUMNS.index("t")], positions
@@ -0,0 +1,388 @@
+"""
+In-process simulated drones for running the flight scripts without PX4 SITL and Gazebo.
+
+`SimDrone` implements the part of the MAVSDK `System` API the flight scripts use:
+- core.connection_state()
+- telemetry.health(), position(), position_velocity_ned(), attitude_euler(), battery(),
+  landed_state(), in_air(), armed() and the matching set_rate_*() calls
+- action.arm(), disarm(), land()
+- offboard.start(), stop(), is_active(), set_position_ned(), set_velocity_ned(),
+  set_position_velocity_ned(), set_position_velocity_acceleration_ned()
+and returns the same mavsdk types, so code written against a real drone runs unchanged.
+
+All drones of a `SimWorld` share one point-mass model: the state of every drone lives in (N, 3)
+arrays and is integrated with a fixed physics_step in one vectorized update, which runs lazily
+whenever a drone is read or commanded. In offboard mode the commanded acceleration is
+    a = position_gain * (p_sp - p) + velocity_gain * (v_sp - v) + a_sp
+limited to max_acceleration, with the speed limited to max_speed. Without offboard an armed
+drone holds its position, land() descends at land_speed, and the ground stops every drone at
+down = 0. Hundreds of drones can be flown from one process for load and latency testing.
+
+Every drone flies in its own local NED frame with the origin at its home position, like PX4;
+home positions are given relative to the world origin, which sets the global coordinates.
+
+Usage:
+------
+world = SimWorld()
+drone = world.add_drone(home=(0.0, 3.0, 0.0))
+await drone.connect()
+await drone.action.arm()
+await drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, 0.0, 0.0))
+await drone.offboard.start()
+"""
+
+import asyncio
+import math
+import numpy as np
+
+from mavsdk.core import ConnectionState
+from mavsdk.telemetry import Health, Position, PositionVelocityNed, PositionNed, VelocityNed, EulerAngle, Battery, LandedState
+from mavsdk.action import ActionError, ActionResult
+from mavsdk.offboard import OffboardError, OffboardResult
+from functions.clock import loop_time
+
+EARTH_RADIUS = 6371000.0
+GRAVITY = 9.81
+
+# Flight modes of a simulated drone
+DISARMED = 0
+HOLD = 1
+OFFBOARD = 2
+LAND = 3
+
+# Default telemetry rates (Hz) of the simulated streams
+DEFAULT_RATES = {
+    "connection_state": 1.0,
+    "health": 1.0,
+    "position": 10.0,
+    "position_velocity_ned": 10.0,
+    "attitude_euler": 10.0,
+    "battery": 1.0,
+    "landed_state": 5.0,
+    "in_air": 5.0,
+    "armed": 5.0,
+}
+
+# MAVSDK set_rate_* call -> simulated streams whose rate it sets
+RATE_CALLS = {
+    "set_rate_position": ("position",),
+    "set_rate_position_velocity_ned": ("position_velocity_ned",),
+    "set_rate_attitude": ("attitude_euler",),
+    "set_rate_battery": ("battery",),
+    "set_rate_landed_state": ("landed_state",),
+    "set_rate_in_air": ("in_air",),
+}
+
+
+class SimWorld:
+
+    def __init__(self, origin=(47.397742, 8.545594, 488.0), physics_step=0.01, position_gain=4.0, velocity_gain=4.0,
+                 max_acceleration=8.0, max_speed=12.0, land_speed=0.7, command_latency=0.0, battery_drain=1.0 / 1200.0,
+                 clock=loop_time, sleep=asyncio.sleep):
+        self.origin = origin
+        self.physics_step = physics_step
+        self.position_gain = position_gain
+        self.velocity_gain = velocity_gain
+        self.max_acceleration = max_acceleration
+        self.max_speed = max_speed
+        self.land_speed = land_speed
+        self.command_latency = command_latency
+        self.battery_drain = battery_drain
+        self.clock = clock
+        self.sleep = sleep
+        self.time = clock()
+        self.steps = 0
+
+        self.drones = []
+        self.home = np.zeros((0, 3))
+        self.position = np.zeros((0, 3))
+        self.velocity = np.zeros((0, 3))
+        self.acceleration = np.zeros((0, 3))
+        self.hold_position = np.zeros((0, 3))
+        self.setpoint_position = np.zeros((0, 3))
+        self.setpoint_velocity = np.zeros((0, 3))
+        self.setpoint_acceleration = np.zeros((0, 3))
+        self.yaw = np.zeros(0)
+        self.mode = np.zeros(0, dtype=int)
+        self.battery = np.zeros(0)
+
+    def __len__(self):
+        return len(self.drones)
+
+    def add_drone(self, home=(0.0, 0.0, 0.0)):
+        """Add a drone standing disarmed at home (north, east, down relative to the world origin)."""
+        self.update()
+        drone = SimDrone(self, len(self.drones))
+        self.drones.append(drone)
+        zeros = np.zeros((1, 3))
+        self.home = np.vstack([self.home, np.asarray(home, dtype=float)[None, :]])
+        self.position = np.vstack([self.position, zeros])
+        self.velocity = np.vstack([self.velocity, zeros])
+        self.acceleration = np.vstack([self.acceleration, zeros])
+        self.hold_position = np.vstack([self.hold_position, zeros])
+        self.setpoint_position = np.vstack([self.setpoint_position, np.full((1, 3), np.nan)])
+        self.setpoint_velocity = np.vstack([self.setpoint_velocity, np.full((1, 3), np.nan)])
+        self.setpoint_acceleration = np.vstack([self.setpoint_acceleration, zeros])
+        self.yaw = np.append(self.yaw, 0.0)
+        self.mode = np.append(self.mode, DISARMED)
+        self.battery = np.append(self.battery, 1.0)
+        return drone
+
+    def update(self):
+        """Advance every drone to the current clock time in fixed physics steps."""
+        steps = int((self.clock() - self.time) / self.physics_step)
+        for _ in range(steps):
+            self._step(self.physics_step)
+        self.time += steps * self.physics_step
+        self.steps += steps
+
+    def _step(self, dt):
+        p, v = self.position, self.velocity
+        mode = self.mode
+        a = np.zeros_like(p)
+
+        offboard = mode == OFFBOARD
+        if offboard.any():
+            position_error = np.nan_to_num(self.setpoint_position[offboard] - p[offboard])
+            velocity_error = np.nan_to_num(self.setpoint_velocity[offboard], nan=0.0) - v[offboard]
+            a[offboard] = self.position_gain * position_error + self.velocity_gain * velocity_error + self.setpoint_acceleration[offboard]
+
+        hold = mode == HOLD
+        a[hold] = self.position_gain * (self.hold_position[hold] - p[hold]) - self.velocity_gain * v[hold]
+
+        land = mode == LAND
+        if land.any():
+            target = np.zeros((int(land.sum()), 3))
+            target[:, 2] = self.land_speed
+            a[land] = self.velocity_gain * (target - v[land])
+            a[land, :2] += self.position_gain * (self.hold_position[land, :2] - p[land, :2])
+
+        # Limit the acceleration of the controlled drones; disarmed drones fall
+        norm = np.linalg.norm(a, axis=1, keepdims=True)
+        a *= np.minimum(1.0, self.max_acceleration / np.maximum(norm, 1e-12))
+        disarmed = mode == DISARMED
+        a[disarmed] = (0.0, 0.0, GRAVITY)
+
+        v += a * dt
+        speed = np.linalg.norm(v, axis=1, keepdims=True)
+        v *= np.minimum(1.0, self.max_speed / np.maximum(speed, 1e-12))
+        p += v * dt
+
+        # The ground (down = 0 in the drone's local frame) stops a drone that is not climbing
+        grounded = (p[:, 2] >= 0.0) & (v[:, 2] >= 0.0)
+        p[grounded, 2] = 0.0
+        v[grounded] = 0.0
+
+        self.acceleration = a
+        self.battery -= np.where(disarmed, 0.0, self.battery_drain * dt)
+        np.clip(self.battery, 0.0, 1.0, out=self.battery)
+
+    def on_ground(self, index):
+        return self.position[index, 2] > -0.05 and abs(self.velocity[index, 2]) < 0.1
+
+
+class SimDrone:
+    """One simulated drone, with the core, telemetry, action and offboard plugins of a mavsdk System."""
+
+    def __init__(self, world, index):
+        self.world = world
+        self.index = index
+        self.connected = False
+        self.core = SimCore(self)
+        self.telemetry = SimTelemetry(self)
+        self.action = SimAction(self)
+        self.offboard = SimOffboard(self)
+
+    async def connect(self, system_address=None):
+        self.connected = True
+
+    async def command(self):
+        """Simulated round trip of a command through mavsdk_server."""
+        await self.world.sleep(self.world.command_latency)
+        self.world.update()
+
+
+class SimCore:
+
+    def __init__(self, drone):
+        self.drone = drone
+
+    async def connection_state(self):
+        world = self.drone.world
+        while True:
+            yield ConnectionState(self.drone.connected)
+            await world.sleep(1.0 / DEFAULT_RATES["connection_state"])
+
+
+class SimTelemetry:
+
+    def __init__(self, drone):
+        self.drone = drone
+        self.rates = dict(DEFAULT_RATES)
+        for call, streams in RATE_CALLS.items():
+            setattr(self, call, self._rate_setter(streams))
+
+    def _rate_setter(self, streams):
+        async def set_rate(rate_hz):
+            await self.drone.command()
+            for stream in streams:
+                self.rates[stream] = rate_hz
+        return set_rate
+
+    async def _stream(self, stream, sample):
+        world = self.drone.world
+        while True:
+            world.update()
+            yield sample()
+            await world.sleep(1.0 / self.rates[stream])
+
+    def health(self):
+        return self._stream("health", lambda: Health(True, True, True, True, True, True, self.drone.connected))
+
+    def position(self):
+        world, index = self.drone.world, self.drone.index
+        latitude_origin, longitude_origin, altitude_origin = world.origin
+
+        def sample():
+            north, east, down = world.home[index] + world.position[index]
+            latitude = latitude_origin + math.degrees(north / EARTH_RADIUS)
+            longitude = longitude_origin + math.degrees(east / (EARTH_RADIUS * math.cos(math.radians(latitude_origin))))
+            return Position(latitude, longitude, altitude_origin - down, -float(world.position[index, 2]))
+        return self._stream("position", sample)
+
+    def position_velocity_ned(self):
+        world, index = self.drone.world, self.drone.index
+
+        def sample():
+            north, east, down = world.position[index].tolist()
+            north_m_s, east_m_s, down_m_s = world.velocity[index].tolist()
+            return PositionVelocityNed(PositionNed(north, east, down), VelocityNed(north_m_s, east_m_s, down_m_s))
+        return self._stream("position_velocity_ned", sample)
+
+    def attitude_euler(self):
+        world, index = self.drone.world, self.drone.index
+
+        def sample():
+            # Tilt needed for the horizontal acceleration, in the body frame of the current yaw
+            a_north, a_east, _ = world.acceleration[index].tolist()
+            yaw = math.radians(world.yaw[index])
+            forward = a_north * math.cos(yaw) + a_east * math.sin(yaw)
+            right = -a_north * math.sin(yaw) + a_east * math.cos(yaw)
+            roll = math.degrees(math.atan2(right, GRAVITY))
+            pitch = -math.degrees(math.atan2(forward, GRAVITY))
+            return EulerAngle(roll, pitch, float(world.yaw[index]), int(world.time * 1e6))
+        return self._stream("attitude_euler", sample)
+
+    def battery(self):
+        world, index = self.drone.world, self.drone.index
+        return self._stream("battery", lambda: Battery(0, 14.8 + 2.0 * float(world.battery[index]), float(world.battery[index])))
+
+    def landed_state(self):
+        world, index = self.drone.world, self.drone.index
+
+        def sample():
+            if world.on_ground(index):
+                return LandedState.ON_GROUND
+            if world.mode[index] == LAND:
+                return LandedState.LANDING
+            return LandedState.IN_AIR
+        return self._stream("landed_state", sample)
+
+    def in_air(self):
+        world, index = self.drone.world, self.drone.index
+        return self._stream("in_air", lambda: not world.on_ground(index))
+
+    def armed(self):
+        world, index = self.drone.world, self.drone.index
+        return self._stream("armed", lambda: bool(world.mode[index] != DISARMED))
+
+
+class SimAction:
+
+    def __init__(self, drone):
+        self.drone = drone
+
+    async def arm(self):
+        drone = self.drone
+        await drone.command()
+        if not drone.connected:
+            raise ActionError(ActionResult(ActionResult.Result.NO_SYSTEM, "No system"), "arm()")
+        world = drone.world
+        if world.mode[drone.index] == DISARMED:
+            world.mode[drone.index] = HOLD
+            world.hold_position[drone.index] = world.position[drone.index]
+
+    async def disarm(self):
+        drone = self.drone
+        await drone.command()
+        world = drone.world
+        if not world.on_ground(drone.index):
+            raise ActionError(ActionResult(ActionResult.Result.COMMAND_DENIED_NOT_LANDED, "Command denied, not landed"), "disarm()")
+        world.mode[drone.index] = DISARMED
+
+    async def land(self):
+        drone = self.drone
+        await drone.command()
+        world = drone.world
+        if world.mode[drone.index] == DISARMED:
+            raise ActionError(ActionResult(ActionResult.Result.COMMAND_DENIED, "Command denied"), "land()")
+        world.mode[drone.index] = LAND
+        world.hold_position[drone.index] = world.position[drone.index]
+
+
+class SimOffboard:
+
+    def __init__(self, drone):
+        self.drone = drone
+        self.has_setpoint = False
+        self.setpoints = 0
+
+    async def start(self):
+        drone = self.drone
+        await drone.command()
+        world = drone.world
+        if not self.has_setpoint:
+            raise OffboardError(OffboardResult(OffboardResult.Result.NO_SETPOINT_SET, "No setpoint set"), "start()")
+        if world.mode[drone.index] == DISARMED:
+            raise OffboardError(OffboardResult(OffboardResult.Result.COMMAND_DENIED, "Command denied"), "start()")
+        world.mode[drone.index] = OFFBOARD
+
+    async def stop(self):
+        drone = self.drone
+        await drone.command()
+        world = drone.world
+        if world.mode[drone.index] == OFFBOARD:
+            world.mode[drone.index] = HOLD
+            world.hold_position[drone.index] = world.position[drone.index]
+
+    async def is_active(self):
+        await self.drone.command()
+        return bool(self.drone.world.mode[self.drone.index] == OFFBOARD)
+
+    async def _set(self, position, velocity, acceleration, yaw):
+        drone = self.drone
+        await drone.command()
+        world = drone.world
+        world.setpoint_position[drone.index] = position
+        world.setpoint_velocity[drone.index] = velocity
+        world.setpoint_acceleration[drone.index] = acceleration
+        world.yaw[drone.index] = yaw
+        self.has_setpoint = True
+        self.setpoints += 1
+
+    async def set_position_ned(self, position_ned_yaw):
+        p = position_ned_yaw
+        await self._set((p.north_m, p.east_m, p.down_m), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0), p.yaw_deg)
+
+    async def set_velocity_ned(self, velocity_ned_yaw):
+        v = velocity_ned_yaw
+        await self._set((np.nan, np.nan, np.nan), (v.north_m_s, v.east_m_s, v.down_m_s), (0.0, 0.0, 0.0), v.yaw_deg)
+
+    async def set_position_velocity_ned(self, position_ned_yaw, velocity_ned_yaw):
+        p, v = position_ned_yaw, velocity_ned_yaw
+        await self._set((p.north_m, p.east_m, p.down_m), (v.north_m_s, v.east_m_s, v.down_m_s), (0.0, 0.0, 0.0), p.yaw_deg)
+
+    async def set_position_velocity_acceleration_ned(self, position_ned_yaw, velocity_ned_yaw, acceleration_ned):
+        p, v, a = position_ned_yaw, velocity_ned_yaw, acceleration_ned
+        await self._set((p.north_m, p.east_m, p.down_m), (v.north_m_s, v.east_m_s, v.down_m_s),
+                        (a.north_m_s2, a.east_m_s2, a.down_m_s2), p.yaw_deg)
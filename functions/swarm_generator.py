@@ -0,0 +1,293 @@
+"""
+Batched trajectory generation for a whole swarm with per-drone parameters.
+
+`create_active_csv` builds one trajectory for one set of parameters. `generate_swarm` builds the
+missions of N drones at once, each with its own shape, diameter, direction, phase, start offset,
+altitude and time shift, and returns them as one (N, T, channels) tensor on a common time grid.
+The channels are TRAJECTORY_COLUMNS (t, px, py, pz, vx, vy, vz, ax, ay, az, yaw, mode), so
+`swarm.data[:, k]` is the state of every drone at time k * step_time.
+
+Every drone flies the same flight phases as create_active_csv (climb, hold, move to start, hold,
+move to maneuver start, hold, maneuver, hold, return), with the same number of rows per phase
+(the move to the maneuver start lasts its distance / MANEUVER_APPROACH_SPEED, as in
+create_active_csv) and the same states, in its own local frame. Only the t column differs: it is
+the common grid here, where create_active_csv starts every phase at its unrounded start time.
+Per drone:
+- phase: fraction of the maneuver (0..1) at which the drone enters the shape, so drones can be
+  spread along one closed shape
+- time_shift: the drone holds on the ground (mode 0) for time_shift seconds before it climbs
+Drones that finish before the end of the grid hold at their home coordinate (mode 90);
+`swarm.lengths[i]` is the number of rows that belong to drone i's own mission.
+
+Each shape is evaluated once for all drones that fly it with the same direction, on an
+(N, steps) grid, and the flight phases are assembled with array operations only.
+
+Swarm Container Structure:
+--------------------------
+- 8 bytes magic: b"SWSWM001"
+- 4 bytes little-endian uint32: length of the JSON header in bytes
+- JSON header (utf-8): version, drones, rows, step_time, channels, lengths and the per-drone
+  parameters, padded with spaces so the data starts on an 8-byte boundary
+- (drones, rows, channels) little-endian float64 tensor in C order
+
+Usage:
+------
+swarm = generate_swarm(shape_name="circle", diameter=20.0, phase=np.arange(10) / 10, start_x=0.0,
+                       start_y=0.0, initial_altitude=np.linspace(10, 15, 10), time_shift=0.0,
+                       direction=1, maneuver_time=60.0, climb_rate=2.0, move_speed=2.0,
+                       hold_time=2.0, step_time=0.1)
+write_swarm_container("shapes/swarm.swm", swarm)
+write_swarm_files("shapes/swarm", swarm)
+trajectory = read_swarm_container("shapes/swarm.swm").drone(3)
+"""
+
+import csv
+import json
+import os
+import struct
+import numpy as np
+
+from functions.trajectories import map_shape_to_code
+from functions.trajectory_io import TRAJECTORY_COLUMNS, Trajectory, write_trajectory_binary
+
+SWARM_MAGIC = b"SWSWM001"
+SWARM_EXTENSION = ".swm"
+
+# Speed (m/s) that sets the duration of the move to the maneuver start (mode 50); create_active_csv
+# uses it whatever move_speed is, and only its velocity column follows move_speed
+MANEUVER_APPROACH_SPEED = 2.0
+
+CSV_HEADER = ["idx", "t", "px", "py", "pz", "vx", "vy", "vz", "ax", "ay", "az", "yaw", "mode", "ledr", "ledg", "ledb"]
+
+
+class SwarmTrajectory:
+
+    def __init__(self, data, lengths, step_time, parameters=None):
+        self.data = data
+        self.lengths = np.asarray(lengths, dtype=int)
+        self.step_time = step_time
+        self.parameters = parameters or {}
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def rows(self):
+        return self.data.shape[1]
+
+    def channel(self, name):
+        """(N, T) view of one channel for every drone."""
+        return self.data[:, :, TRAJECTORY_COLUMNS.index(name)]
+
+    def drone(self, index):
+        """Trajectory of one drone, trimmed to its own mission."""
+        return Trajectory.from_array(self.data[index, :self.lengths[index]], step_time=self.step_time)
+
+
+def generate_swarm(shape_name, diameter, phase, start_x, start_y, initial_altitude, time_shift, direction,
+                   maneuver_time, climb_rate, move_speed, hold_time, step_time):
+    """
+    Generate the missions of a swarm. Every per-drone parameter (shape_name, diameter, phase,
+    start_x, start_y, initial_altitude, time_shift, direction) is a scalar or a sequence with one
+    value per drone; the swarm size is the length of the sequences. maneuver_time, climb_rate,
+    move_speed, hold_time and step_time are shared by the whole swarm.
+    """
+    shape_name, diameter, direction, phase, start_x, start_y, initial_altitude, time_shift = _per_drone(
+        shape_name, diameter, direction, phase, start_x, start_y, initial_altitude, time_shift)
+    drones = len(diameter)
+    maneuver_steps = int(maneuver_time / step_time)
+    hold_steps = int(hold_time / step_time)
+
+    # Maneuver of every drone, (N, maneuver_steps, 9), one evaluation per shape and direction
+    maneuver = np.empty((drones, maneuver_steps, 9))
+    phase_steps = np.round(phase * maneuver_steps).astype(int)
+    steps = (np.arange(maneuver_steps) + phase_steps[:, None]) % max(maneuver_steps, 1)
+    for name, sign in sorted(set(zip(shape_name.tolist(), direction.tolist()))):
+        group = (shape_name == name) & (direction == sign)
+        _, shape_fcn, shape_args = map_shape_to_code(name, vectorized=True)
+        maneuver[group] = shape_fcn(steps[group], maneuver_time, diameter[group, None], sign,
+                                    initial_altitude[group, None], step_time, *shape_args)
+    maneuver[:, :, 0] += start_x[:, None]
+    maneuver[:, :, 1] += start_y[:, None]
+
+    start = np.column_stack([start_x, start_y])
+    if maneuver_steps > 0:
+        first = maneuver[:, 0, :2] - start
+        last = maneuver[:, -1, :3]
+    else:
+        first = np.zeros((drones, 2))
+        last = np.column_stack([start_x, start_y, -initial_altitude])
+    start_distance = np.hypot(start_x, start_y)
+    first_distance = np.hypot(first[:, 0], first[:, 1])
+    home = np.column_stack([np.zeros(drones), np.zeros(drones), -initial_altitude])
+    return_distance = np.linalg.norm(last - home, axis=1)
+    has_first_move = first_distance > 0
+
+    climb_steps = (initial_altitude / climb_rate / step_time).astype(int)
+    move_start_steps = (start_distance / move_speed / step_time).astype(int)
+    move_steps = np.where(has_first_move, (first_distance / MANEUVER_APPROACH_SPEED / step_time).astype(int), 0)
+    second_hold_steps = np.where(has_first_move, hold_steps, 0)
+    return_steps = (return_distance / move_speed / step_time).astype(int)
+
+    # Flight phases of every drone: (mode, steps); the phase boundaries are per drone
+    modes = np.array([10, 20, 30, 40, 50, 60, 70, 80, 90])
+    phase_lengths = np.column_stack([
+        climb_steps, np.full(drones, hold_steps), move_start_steps, np.full(drones, hold_steps),
+        move_steps, second_hold_steps, np.full(drones, maneuver_steps), np.full(drones, hold_steps), return_steps,
+    ])
+    phase_starts = np.cumsum(phase_lengths, axis=1) - phase_lengths
+    shift_steps = np.round(time_shift / step_time).astype(int)
+    lengths = shift_steps + phase_lengths.sum(axis=1)
+    rows = int(lengths.max())
+
+    # Row k of drone i is step k - shift_steps[i] of its mission
+    mission_step = np.arange(rows)[None, :] - shift_steps[:, None]
+    phase_index = (mission_step[:, :, None] >= phase_starts[:, None, :]).sum(axis=2) - 1
+    phase_index = np.maximum(phase_index, 0)
+    j = mission_step - np.take_along_axis(phase_starts, phase_index, axis=1)
+    length = np.take_along_axis(phase_lengths, phase_index, axis=1)
+    ratio = j / np.maximum(length, 1)
+    on_ground = mission_step < 0
+    finished = mission_step >= (lengths - shift_steps)[:, None]
+
+    data = np.zeros((drones, rows, len(TRAJECTORY_COLUMNS)))
+    position = data[:, :, 1:4]
+    velocity = data[:, :, 4:7]
+    acceleration = data[:, :, 7:10]
+    altitude = -initial_altitude[:, None]
+
+    def phase_mask(mode):
+        return (phase_index == np.flatnonzero(modes == mode)[0]) & ~on_ground & ~finished
+
+    mask = phase_mask(10)
+    position[mask, 2] = (-climb_rate * j * step_time)[mask]
+    velocity[mask, 2] = -climb_rate
+
+    mask = phase_mask(20)
+    position[mask, 2] = np.broadcast_to(altitude, mask.shape)[mask]
+
+    mask = phase_mask(30)
+    direction_to_start = np.divide(start, start_distance[:, None], out=np.zeros_like(start), where=start_distance[:, None] > 0)
+    for axis in range(2):
+        position[mask, axis] = (start[:, axis, None] * ratio)[mask]
+        velocity[mask, axis] = np.broadcast_to(move_speed * direction_to_start[:, axis, None], mask.shape)[mask]
+    position[mask, 2] = np.broadcast_to(altitude, mask.shape)[mask]
+
+    for mode in (40, 60):
+        mask = phase_mask(mode)
+        target = start if mode == 40 else start + first
+        for axis in range(2):
+            position[mask, axis] = np.broadcast_to(target[:, axis, None], mask.shape)[mask]
+        position[mask, 2] = np.broadcast_to(altitude, mask.shape)[mask]
+
+    mask = phase_mask(50)
+    direction_to_first = np.divide(first, first_distance[:, None], out=np.zeros_like(first), where=has_first_move[:, None])
+    for axis in range(2):
+        position[mask, axis] = (start[:, axis, None] + first[:, axis, None] * ratio)[mask]
+        velocity[mask, axis] = np.broadcast_to(move_speed * direction_to_first[:, axis, None], mask.shape)[mask]
+    position[mask, 2] = np.broadcast_to(altitude, mask.shape)[mask]
+
+    mask = phase_mask(70)
+    if maneuver_steps > 0:
+        maneuver_rows = np.take_along_axis(maneuver, np.clip(j, 0, maneuver_steps - 1)[:, :, None], axis=1)
+        data[:, :, 1:10][mask] = maneuver_rows[mask]
+
+    mask = phase_mask(80)
+    for axis in range(3):
+        position[mask, axis] = np.broadcast_to(last[:, axis, None], mask.shape)[mask]
+
+    mask = phase_mask(90)
+    return_time = np.where(return_distance > 0, return_distance / move_speed, 1.0)
+    for axis in range(2):
+        position[mask, axis] = (last[:, axis, None] * (1 - ratio))[mask]
+        velocity[mask, axis] = np.broadcast_to(-move_speed * np.divide(last[:, axis], return_distance, out=np.zeros(drones), where=return_distance > 0)[:, None], mask.shape)[mask]
+    position[mask, 2] = (last[:, 2, None] + (altitude - last[:, 2, None]) * ratio)[mask]
+    velocity[mask, 2] = np.broadcast_to(((altitude[:, 0] - last[:, 2]) / return_time)[:, None], mask.shape)[mask]
+
+    # After its own mission a drone holds at its home coordinate
+    position[finished] = np.broadcast_to(home[:, None, :], finished.shape + (3,))[finished]
+    velocity[finished] = 0.0
+    acceleration[finished] = 0.0
+
+    mode = np.where(on_ground, 0, modes[phase_index])
+    mode[finished] = 90
+    data[:, :, TRAJECTORY_COLUMNS.index("t")] = np.arange(rows) * step_time
+    data[:, :, TRAJECTORY_COLUMNS.index("mode")] = mode
+
+    parameters = {
+        "shape_name": shape_name.tolist(), "diameter": diameter.tolist(), "direction": direction.tolist(),
+        "phase": phase.tolist(), "start_x": start_x.tolist(), "start_y": start_y.tolist(),
+        "initial_altitude": initial_altitude.tolist(), "time_shift": time_shift.tolist(),
+    }
+    return SwarmTrajectory(data, lengths, step_time, parameters)
+
+
+def _per_drone(shape_name, *values):
+    """Broadcast the per-drone parameters to one value per drone."""
+    shape_name = np.atleast_1d(np.asarray(shape_name))
+    values = [np.atleast_1d(np.asarray(value, dtype=float)) for value in values]
+    drones = max(len(shape_name), *(len(value) for value in values))
+    shape_name = np.broadcast_to(shape_name, (drones,))
+    values = [np.broadcast_to(value, (drones,)).copy() for value in values]
+    diameter, direction, *rest = values
+    return (shape_name, diameter, direction.astype(int), *rest)
+
+
+def write_swarm_container(path, swarm):
+    """Write the whole swarm tensor to a single file (see Swarm Container Structure)."""
+    data = np.ascontiguousarray(swarm.data, dtype="<f8")
+    header = {
+        "version": 1,
+        "drones": data.shape[0],
+        "rows": data.shape[1],
+        "step_time": swarm.step_time,
+        "channels": TRAJECTORY_COLUMNS,
+        "lengths": swarm.lengths.tolist(),
+        "parameters": swarm.parameters,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix_length = len(SWARM_MAGIC) + 4
+    header_bytes += b" " * (-(prefix_length + len(header_bytes)) % 8)
+
+    with open(path, "wb") as file:
+        file.write(SWARM_MAGIC)
+        file.write(struct.pack("<I", len(header_bytes)))
+        file.write(header_bytes)
+        file.write(data.tobytes())
+
+
+def read_swarm_container(path, mmap=True):
+    """Load a swarm container; with mmap the tensor is mapped read-only instead of read."""
+    with open(path, "rb") as file:
+        if file.read(len(SWARM_MAGIC)) != SWARM_MAGIC:
+            raise ValueError(f"Not a swarm container: {path}")
+        (header_length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(header_length).decode("utf-8"))
+    if header["channels"] != TRAJECTORY_COLUMNS:
+        raise ValueError(f"Unexpected channels in {path}: {header['channels']}")
+
+    data_offset = len(SWARM_MAGIC) + 4 + header_length
+    shape = (header["drones"], header["rows"], len(header["channels"]))
+    if mmap:
+        data = np.memmap(path, dtype="<f8", mode="r", offset=data_offset, shape=shape)
+    else:
+        data = np.fromfile(path, dtype="<f8", offset=data_offset).reshape(shape)
+    return SwarmTrajectory(data, header["lengths"], header["step_time"], header["parameters"])
+
+
+def write_swarm_files(directory, swarm, binary=True):
+    """Write one CSV file per drone (drone_<i>.csv, same columns as create_active_csv), plus its binary file."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(len(swarm)):
+        path = os.path.join(directory, f"drone_{index}.csv")
+        trajectory = swarm.drone(index)
+        rows = swarm.data[index, :swarm.lengths[index]].tolist()
+        with open(path, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+            writer.writerows([idx, *row[:-1], int(row[-1]), "nan", "nan", "nan"] for idx, row in enumerate(rows))
+        if binary:
+            write_trajectory_binary(os.path.splitext(path)[0] + ".trj", trajectory, swarm.step_time)
+        paths.append(path)
+    return paths
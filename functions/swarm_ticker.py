@@ -0,0 +1,223 @@
+"""
+Single-task tick engine for streaming setpoints to a whole swarm.
+
+Instead of one `while` loop with its own timer per drone, `SwarmTicker` wakes up once per tick
+(through a shared TickScheduler), computes every drone's setpoint for that tick and issues all
+setpoint calls concurrently with asyncio.gather. This keeps the swarm phase-aligned and the
+event loop wakes up once per period regardless of the number of drones.
+
+Slow drones are isolated rather than allowed to hold up the tick:
+- every call is bounded by call_timeout (one period by default);
+- after max_strikes consecutive timeouts a drone is isolated. Its setpoints are then sent in the
+  background, at most one in flight (ticks are dropped while the previous call is pending), and
+  it rejoins the gathered calls once a call completes within call_timeout again.
+
+`on_mode_change(drone_id, mode_code)` is called when a drone enters a new flight mode and
+`on_complete(drone_id, drone)` as soon as a drone has passed the end of its trajectory.
+`on_setpoint(drone_id, t, setpoint)` is called with every setpoint before it is sent, for example
+to feed a FlightRecorder.
+
+The time from the tick deadline to the completion of all gathered calls is recorded as the
+fan-out latency of that tick (see `fan_out_latency`). With a TickInstrumentation, the latency of
+every setpoint call is also recorded per drone, and the tick lateness and iteration time of the
+swarm loop are recorded under SWARM (see functions/instrumentation.py).
+
+Usage:
+------
+ticker = SwarmTicker(period=0.05, on_mode_change=print_mode)
+ticker.add(drone_id, drone, TrajectoryPlayer(drone_trajectory), time_offset=drone_id * 1.0)
+await ticker.run()
+"""
+
+import asyncio
+
+from mavsdk.offboard import PositionNedYaw, VelocityNedYaw, AccelerationNed
+
+from functions.playback import HERMITE
+from functions.scheduler import TickScheduler, SKIP
+from functions.instrumentation import SWARM, SETPOINT_LATENCY, LATENESS, ITERATION
+
+
+async def send_position_velocity(drone, setpoint):
+    position, velocity, acceleration, yaw, mode_code = setpoint
+    await drone.offboard.set_position_velocity_ned(
+        PositionNedYaw(*position, yaw),
+        VelocityNedYaw(*velocity, yaw)
+    )
+
+
+async def send_position_velocity_acceleration(drone, setpoint):
+    position, velocity, acceleration, yaw, mode_code = setpoint
+    await drone.offboard.set_position_velocity_acceleration_ned(
+        PositionNedYaw(*position, yaw),
+        VelocityNedYaw(*velocity, yaw),
+        AccelerationNed(*acceleration)
+    )
+
+
+class LatencyStats:
+    """Running count, mean, last and max of a latency in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return f"n={self.count} mean={self.mean * 1000:.1f}ms max={self.max * 1000:.1f}ms last={self.last * 1000:.1f}ms"
+
+
+class SwarmMember:
+
+    def __init__(self, drone_id, drone, player, time_offset=0.0):
+        self.drone_id = drone_id
+        self.drone = drone
+        self.player = player
+        self.time_offset = time_offset
+        self.last_mode = 0
+        self.done = False
+        self.strikes = 0
+        self.isolated = False
+        self.pending = None
+        self.timeouts = 0
+        self.errors = 0
+        self.dropped = 0
+
+
+class SwarmTicker:
+
+    def __init__(self, period=0.1, interpolation=HERMITE, command=send_position_velocity, call_timeout=None,
+                 max_strikes=3, policy=SKIP, on_mode_change=None, on_complete=None, on_setpoint=None, instrumentation=None):
+        self.scheduler = TickScheduler(period=period, policy=policy)
+        self.interpolation = interpolation
+        self.command = command
+        self.call_timeout = call_timeout if call_timeout is not None else period
+        self.max_strikes = max_strikes
+        self.on_mode_change = on_mode_change
+        self.on_complete = on_complete
+        self.on_setpoint = on_setpoint
+        self.instrumentation = instrumentation
+        self.members = []
+        self.fan_out_latency = LatencyStats()
+
+    def add(self, drone_id, drone, player, time_offset=0.0):
+        """Add a drone that plays back player, shifted later by time_offset seconds."""
+        member = SwarmMember(drone_id, drone, player, time_offset)
+        self.members.append(member)
+        return member
+
+    async def run(self, epoch=None):
+        """
+        Stream setpoints until every drone has reached the end of its trajectory. Tick 0 (t = 0)
+        is due at epoch on the scheduler clock, by default as soon as run() starts.
+        """
+        scheduler = self.scheduler
+        if epoch is not None:
+            scheduler.start(epoch)
+        instrumentation = self.instrumentation
+        while True:
+            tick = await scheduler.next_tick()
+            t = tick * scheduler.period
+            if instrumentation is not None:
+                woke = scheduler.clock()
+                instrumentation.record(SWARM, LATENESS, woke - scheduler.deadline(tick))
+
+            calls = []
+            active = 0
+            for member in self.members:
+                if member.done:
+                    continue
+                # Before its time offset a drone holds the first setpoint of its trajectory
+                drone_time = max(t - member.time_offset, 0.0)
+                setpoint = member.player.setpoint_at(drone_time, self.interpolation)
+                if setpoint is None:
+                    member.done = True
+                    if self.on_complete is not None:
+                        self.on_complete(member.drone_id, member.drone)
+                    continue
+                active += 1
+
+                mode_code = setpoint[-1]
+                if member.last_mode != mode_code:
+                    member.last_mode = mode_code
+                    if self.on_mode_change is not None:
+                        self.on_mode_change(member.drone_id, mode_code)
+
+                if self.on_setpoint is not None:
+                    self.on_setpoint(member.drone_id, drone_time, setpoint)
+
+                if member.isolated:
+                    self._send_detached(member, setpoint)
+                else:
+                    calls.append(self._send(member, setpoint))
+
+            if active == 0:
+                break
+
+            await asyncio.gather(*calls)
+            self.fan_out_latency.add(scheduler.clock() - scheduler.deadline(tick))
+            if instrumentation is not None:
+                instrumentation.record(SWARM, ITERATION, scheduler.clock() - woke)
+                instrumentation.tick()
+
+        pending = [member.pending for member in self.members if member.pending is not None]
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _send(self, member, setpoint):
+        instrumentation = self.instrumentation
+        started = self.scheduler.clock() if instrumentation is not None else None
+        try:
+            await asyncio.wait_for(self.command(member.drone, setpoint), self.call_timeout)
+        except asyncio.TimeoutError:
+            member.timeouts += 1
+            member.strikes += 1
+            if member.strikes >= self.max_strikes:
+                member.isolated = True
+                print(f"Drone id: {member.drone_id}: {member.strikes} setpoint timeouts in a row, isolating it from the swarm tick")
+        except Exception as error:
+            member.errors += 1
+            print(f"Drone id: {member.drone_id}: setpoint failed with error: {error}")
+        else:
+            member.strikes = 0
+        finally:
+            if started is not None:
+                instrumentation.record(member.drone_id, SETPOINT_LATENCY, self.scheduler.clock() - started)
+
+    def _send_detached(self, member, setpoint):
+        if member.pending is not None and not member.pending.done():
+            member.dropped += 1
+            return
+        member.pending = asyncio.create_task(self._send_isolated(member, setpoint))
+
+    async def _send_isolated(self, member, setpoint):
+        started = self.scheduler.clock()
+        try:
+            await self.command(member.drone, setpoint)
+        except Exception as error:
+            member.errors += 1
+            print(f"Drone id: {member.drone_id}: setpoint failed with error: {error}")
+            return
+        if self.instrumentation is not None:
+            self.instrumentation.record(member.drone_id, SETPOINT_LATENCY, self.scheduler.clock() - started)
+        if self.scheduler.clock() - started <= self.call_timeout:
+            member.isolated = False
+            member.strikes = 0
+            print(f"Drone id: {member.drone_id}: responsive again, rejoining the swarm tick")
+
+    def report(self):
+        """One line per drone with its timeout, error and dropped setpoint counts, plus the fan-out latency."""
+        lines = [f"Swarm fan-out latency: {self.fan_out_latency.summary()}"]
+        for member in self.members:
+            lines.append(f"Drone id: {member.drone_id}: timeouts={member.timeouts} errors={member.errors} dropped={member.dropped} isolated={member.isolated}")
+        return "\n".join(lines)
@@ -0,0 +1,145 @@
+"""
+Continuous per-drone telemetry kept in fixed-size ring buffers.
+
+`DroneTelemetry` keeps the position, local position/velocity, attitude and battery streams of
+one drone running in the background and writes every sample into an array-backed
+`RingBuffer`. Flight code, monitors and recorders read the latest state from the buffers instead
+of opening their own telemetry streams. The samples are received through the drone's
+`TelemetryHub`, so the buffers share the streams with every other consumer of that hub.
+
+Streams and their fields:
+- position: latitude_deg, longitude_deg, absolute_altitude_m, relative_altitude_m
+- position_velocity_ned: north_m, east_m, down_m, north_m_s, east_m_s, down_m_s
+- attitude: roll_deg, pitch_deg, yaw_deg
+- battery: voltage_v, remaining_percent
+- armed: armed (1.0 armed, 0.0 disarmed)
+
+Every row of a buffer is [timestamp, field values...], where the timestamp is taken from the
+hub's monotonic clock when the sample arrives.
+
+Usage:
+------
+telemetry = DroneTelemetry(drone, hub=TelemetryHub(drone, rates={"position_velocity_ned": 20.0}))
+telemetry.start()
+await telemetry.wait_for("position")
+timestamp, north_m, east_m, down_m, vn, ve, vd = telemetry.latest("position_velocity_ned")
+last_second = telemetry.buffers["attitude"].window(50)
+await telemetry.stop()
+"""
+
+import asyncio
+import numpy as np
+
+from functions.telemetry_hub import TelemetryHub
+
+TELEMETRY_STREAMS = {
+    "position": (
+        "position",
+        ("latitude_deg", "longitude_deg", "absolute_altitude_m", "relative_altitude_m"),
+        lambda sample: (sample.latitude_deg, sample.longitude_deg, sample.absolute_altitude_m, sample.relative_altitude_m),
+    ),
+    "position_velocity_ned": (
+        "position_velocity_ned",
+        ("north_m", "east_m", "down_m", "north_m_s", "east_m_s", "down_m_s"),
+        lambda sample: (sample.position.north_m, sample.position.east_m, sample.position.down_m,
+                        sample.velocity.north_m_s, sample.velocity.east_m_s, sample.velocity.down_m_s),
+    ),
+    "attitude": (
+        "attitude_euler",
+        ("roll_deg", "pitch_deg", "yaw_deg"),
+        lambda sample: (sample.roll_deg, sample.pitch_deg, sample.yaw_deg),
+    ),
+    "battery": (
+        "battery",
+        ("voltage_v", "remaining_percent"),
+        lambda sample: (sample.voltage_v, sample.remaining_percent),
+    ),
+    "armed": (
+        "armed",
+        ("armed",),
+        lambda sample: (float(sample),),
+    ),
+}
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of the most recent samples, one row per sample: [timestamp, fields...].
+
+    Every sample is written twice, at head and head + capacity, so the last n samples are always
+    contiguous in memory and window(n) can return a view without copying. Views are overwritten
+    as new samples arrive; copy them if they have to outlive the next few samples.
+    """
+
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.count = 0
+        self._head = 0
+        self._data = np.full((2 * capacity, len(self.fields) + 1), np.nan)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, values):
+        row = (timestamp, *values)
+        self._data[self._head] = row
+        self._data[self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self.count += 1
+
+    def latest(self):
+        """Most recent row, or None if nothing was written yet."""
+        if self.count == 0:
+            return None
+        return self._data[self._head + self.capacity - 1]
+
+    def window(self, n=None):
+        """View of the last n rows (all buffered rows by default), oldest first."""
+        size = len(self)
+        n = size if n is None else min(n, size)
+        end = self._head + self.capacity
+        return self._data[end - n:end]
+
+    def column(self, field, n=None):
+        return self.window(n)[:, self.fields.index(field) + 1]
+
+
+class DroneTelemetry:
+
+    def __init__(self, drone, capacity=1024, streams=tuple(TELEMETRY_STREAMS), hub=None):
+        self.drone = drone
+        self.hub = hub if hub is not None else TelemetryHub(drone)
+        self.streams = tuple(streams)
+        self.buffers = {name: RingBuffer(capacity, TELEMETRY_STREAMS[name][1]) for name in self.streams}
+        self._received = {name: asyncio.Event() for name in self.streams}
+        self._tasks = []
+
+    def start(self):
+        """Start one background task per telemetry stream."""
+        self._tasks = [asyncio.create_task(self._consume(name, self.hub.subscribe(TELEMETRY_STREAMS[name][0]))) for name in self.streams]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _consume(self, name, subscription):
+        method, fields, extract = TELEMETRY_STREAMS[name]
+        buffer = self.buffers[name]
+        received = self._received[name]
+        try:
+            async for timestamp, sample in subscription:
+                buffer.append(timestamp, extract(sample))
+                received.set()
+        finally:
+            subscription.close()
+
+    async def wait_for(self, name, timeout=None):
+        """Wait until at least one sample of the stream has arrived and return it."""
+        await asyncio.wait_for(self._received[name].wait(), timeout)
+        return self.latest(name)
+
+    def latest(self, name):
+        return self.buffers[name].latest()
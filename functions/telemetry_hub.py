@@ -0,0 +1,200 @@
+"""
+Telemetry fan-out: one MAVSDK telemetry stream per drone, any number of in-process consumers.
+
+Every `drone.telemetry.<stream>()` iterator opened by a consumer is another stream through
+mavsdk_server, which adds up quickly for large swarms. `TelemetryHub` opens each stream of a
+drone at most once, while it has subscribers, and copies every sample into the bounded queue of
+each `Subscription`. A consumer that falls behind never blocks the stream or the other
+consumers: when its queue is full the oldest sample is dropped (and counted). This drop-oldest
+policy is the only backpressure there is; no subscription can slow the stream down or wait for
+room in its queue. A consumer that needs every sample has to keep up with the stream rate or
+subscribe with a maxsize that covers its longest stall, and should check `dropped`.
+
+The rate of each stream can be set through MAVSDK's `set_rate_*` calls (see RATE_SETTERS),
+and `message_rates()` reports the rate actually received per stream (since the previous call, or
+since the stream was opened on the first call), so the telemetry bandwidth can be traded against
+swarm size.
+
+Usage:
+------
+hub = TelemetryHub(drone, rates={"position_velocity_ned": 20.0, "battery": 1.0})
+await hub.apply_rates()
+subscription = hub.subscribe("position_velocity_ned")
+async for timestamp, sample in subscription:
+    ...
+subscription.close()
+health = await hub.first("health", lambda health: health.is_global_position_ok)
+await hub.stop()
+"""
+
+import asyncio
+from collections import deque
+from functions.clock import loop_time
+
+# Telemetry stream -> name of the MAVSDK call that sets its rate
+RATE_SETTERS = {
+    "position": "set_rate_position",
+    "position_velocity_ned": "set_rate_position_velocity_ned",
+    "velocity_ned": "set_rate_velocity_ned",
+    "attitude_euler": "set_rate_attitude",
+    "attitude_quaternion": "set_rate_attitude",
+    "battery": "set_rate_battery",
+    "gps_info": "set_rate_gps_info",
+    "home": "set_rate_home",
+    "in_air": "set_rate_in_air",
+    "landed_state": "set_rate_landed_state",
+    "odometry": "set_rate_odometry",
+    "imu": "set_rate_imu",
+}
+
+
+class Subscription:
+    """Bounded queue of (timestamp, sample) for one consumer; drops the oldest sample when full."""
+
+    def __init__(self, hub, stream, maxsize):
+        self.hub = hub
+        self.stream = stream
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+
+    def put(self, item):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(item)
+        self._ready.set()
+
+    async def get(self):
+        while not self._queue:
+            if self.closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        return self._queue.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def end(self):
+        """Mark the subscription as finished; buffered samples can still be read."""
+        self.closed = True
+        self._ready.set()
+
+    def close(self):
+        if not self.closed:
+            self.end()
+            self.hub.unsubscribe(self)
+
+
+class StreamStats:
+
+    def __init__(self, started):
+        self.count = 0
+        self.started = started
+        # The first message_rates() call measures from the start of the stream
+        self.last_count = 0
+        self.last_time = started
+
+
+class TelemetryHub:
+
+    def __init__(self, drone, rates=None, clock=loop_time):
+        self.drone = drone
+        self.rates = dict(rates or {})
+        self.clock = clock
+        self.stats = {}
+        self._subscribers = {}
+        self._pumps = {}
+
+    async def apply_rates(self):
+        """Set the rate of every stream in self.rates through MAVSDK."""
+        for stream, rate_hz in self.rates.items():
+            await self.set_rate(stream, rate_hz)
+
+    async def set_rate(self, stream, rate_hz):
+        if stream not in RATE_SETTERS:
+            raise ValueError(f"No rate setter for telemetry stream: {stream}")
+        await getattr(self.drone.telemetry, RATE_SETTERS[stream])(rate_hz)
+        self.rates[stream] = rate_hz
+
+    def subscribe(self, stream, maxsize=64):
+        """Subscribe to a stream, opening it on the drone if this is its first subscriber."""
+        subscription = Subscription(self, stream, maxsize)
+        self._subscribers.setdefault(stream, []).append(subscription)
+        if stream not in self._pumps:
+            if stream not in self.stats:
+                self.stats[stream] = StreamStats(self.clock())
+            self._pumps[stream] = asyncio.create_task(self._pump(stream))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription; the stream is closed once it has no subscribers left."""
+        subscribers = self._subscribers.get(subscription.stream, [])
+        if subscription in subscribers:
+            subscribers.remove(subscription)
+        if not subscribers and subscription.stream in self._pumps:
+            self._pumps.pop(subscription.stream).cancel()
+
+    async def first(self, stream, predicate=None, timeout=None):
+        """Return the first sample of stream (matching predicate, if given)."""
+        subscription = self.subscribe(stream, maxsize=1)
+        try:
+            async def wait():
+                async for timestamp, sample in subscription:
+                    if predicate is None or predicate(sample):
+                        return sample
+            return await asyncio.wait_for(wait(), timeout)
+        finally:
+            subscription.close()
+
+    async def _pump(self, stream):
+        stats = self.stats[stream]
+        try:
+            async for sample in getattr(self.drone.telemetry, stream)():
+                item = (self.clock(), sample)
+                stats.count += 1
+                for subscription in self._subscribers.get(stream, []):
+                    subscription.put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            print(f"Telemetry stream {stream} stopped with error: {error}")
+        for subscription in self._subscribers.get(stream, []):
+            subscription.end()
+        self._pumps.pop(stream, None)
+
+    def message_rates(self):
+        """Messages per second received on each stream since the previous call (since the stream was opened on the first call)."""
+        now = self.clock()
+        rates = {}
+        for stream, stats in self.stats.items():
+            if now > stats.last_time:
+                rates[stream] = (stats.count - stats.last_count) / (now - stats.last_time)
+            stats.last_count = stats.count
+            stats.last_time = now
+        return rates
+
+    def report(self):
+        rates = self.message_rates()
+        dropped = {}
+        for stream, subscribers in self._subscribers.items():
+            dropped[stream] = sum(subscription.dropped for subscription in subscribers)
+        return ", ".join(
+            f"{stream}: {rates.get(stream, 0.0):.1f} Hz ({stats.count} msgs, {dropped.get(stream, 0)} dropped)"
+            for stream, stats in self.stats.items()
+        )
+
+    async def stop(self):
+        pumps = list(self._pumps.values())
+        for pump in pumps:
+            pump.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+        self._pumps = {}
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.end()
+        self._subscribers = {}
@@ -0,0 +1,129 @@
+"""
+Online tracking-error metrics: how far each drone is from the setpoints it was sent.
+
+`TrackingMetrics` keeps a short history of the setpoints sent to every drone, stamped with the
+monotonic clock. Each new local position/velocity telemetry sample is paired with the setpoint
+that was in effect when the sample was taken (the last one sent at or before its timestamp), and
+the position and velocity errors are folded into running statistics per drone and per mode code
+(10-100, see create_active_csv). Only counts, sums of squares and maxima are stored, never the
+full error history, so the metrics can run for the whole flight.
+
+Usage:
+------
+tracking = TrackingMetrics()
+tracking.update(drone_id, setpoint, telemetry.latest("position_velocity_ned"))
+print(tracking.report())
+"""
+
+import bisect
+import math
+from collections import deque
+from functions.clock import loop_time
+
+
+class ErrorStats:
+    """Running count, RMS and max of position and velocity error norms."""
+
+    def __init__(self):
+        self.count = 0
+        self.position_square_sum = 0.0
+        self.velocity_square_sum = 0.0
+        self.position_max = 0.0
+        self.velocity_max = 0.0
+
+    def add(self, position_error, velocity_error):
+        self.count += 1
+        self.position_square_sum += position_error * position_error
+        self.velocity_square_sum += velocity_error * velocity_error
+        self.position_max = max(self.position_max, position_error)
+        self.velocity_max = max(self.velocity_max, velocity_error)
+
+    @property
+    def position_rms(self):
+        return math.sqrt(self.position_square_sum / self.count) if self.count else 0.0
+
+    @property
+    def velocity_rms(self):
+        return math.sqrt(self.velocity_square_sum / self.count) if self.count else 0.0
+
+    def summary(self):
+        return (f"n={self.count} pos rms={self.position_rms:.2f}m max={self.position_max:.2f}m "
+                f"vel rms={self.velocity_rms:.2f}m/s max={self.velocity_max:.2f}m/s")
+
+
+class DroneTracking:
+    """Recent setpoints and error statistics of one drone."""
+
+    def __init__(self, history):
+        self.times = deque(maxlen=history)
+        self.setpoints = deque(maxlen=history)
+        self.last_sample_time = None
+        self.total = ErrorStats()
+        self.modes = {}
+
+
+class TrackingMetrics:
+
+    def __init__(self, history=32, clock=loop_time):
+        self.history = history
+        self.clock = clock
+        self.drones = {}
+
+    def _drone(self, drone_id):
+        tracking = self.drones.get(drone_id)
+        if tracking is None:
+            tracking = self.drones[drone_id] = DroneTracking(self.history)
+        return tracking
+
+    def setpoint(self, drone_id, setpoint, timestamp=None):
+        """Remember a setpoint (as returned by TrajectoryPlayer.setpoint_at) sent at timestamp (now by default)."""
+        tracking = self._drone(drone_id)
+        tracking.times.append(self.clock() if timestamp is None else timestamp)
+        tracking.setpoints.append(setpoint)
+
+    def sample(self, drone_id, actual):
+        """
+        Pair a position_velocity_ned telemetry row [timestamp, north_m, east_m, down_m, north_m_s,
+        east_m_s, down_m_s] with the setpoint in effect at its timestamp. Samples already counted and
+        samples taken before the first remembered setpoint are ignored.
+        """
+        if actual is None:
+            return
+        tracking = self._drone(drone_id)
+        timestamp = actual[0]
+        if tracking.last_sample_time is not None and timestamp <= tracking.last_sample_time:
+            return
+        index = bisect.bisect_right(tracking.times, timestamp) - 1
+        if index < 0:
+            return
+        tracking.last_sample_time = timestamp
+
+        position, velocity, acceleration, yaw, mode_code = tracking.setpoints[index]
+        position_error = math.sqrt((actual[1] - position[0]) ** 2 + (actual[2] - position[1]) ** 2 + (actual[3] - position[2]) ** 2)
+        velocity_error = math.sqrt((actual[4] - velocity[0]) ** 2 + (actual[5] - velocity[1]) ** 2 + (actual[6] - velocity[2]) ** 2)
+        tracking.total.add(position_error, velocity_error)
+        stats = tracking.modes.get(mode_code)
+        if stats is None:
+            stats = tracking.modes[mode_code] = ErrorStats()
+        stats.add(position_error, velocity_error)
+
+    def update(self, drone_id, setpoint, actual):
+        """Remember the setpoint being sent now and score the latest telemetry row against its setpoint."""
+        self.setpoint(drone_id, setpoint)
+        self.sample(drone_id, actual)
+
+    def stats(self, drone_id, mode_code=None):
+        """ErrorStats of a drone, over the whole flight or for a single mode code."""
+        tracking = self._drone(drone_id)
+        if mode_code is None:
+            return tracking.total
+        return tracking.modes.get(mode_code, ErrorStats())
+
+    def report(self):
+        """One line per drone and one per mode code it flew, in mode order."""
+        lines = []
+        for drone_id, tracking in self.drones.items():
+            lines.append(f"Drone id: {drone_id}: tracking error {tracking.total.summary()}")
+            for mode_code in sorted(tracking.modes):
+                lines.append(f"    Mode {mode_code}: {tracking.modes[mode_code].summary()}")
+        return "\n".join(lines)
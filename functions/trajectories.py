@@ -1,7 +1,8 @@
 import time
 import math
+import numpy as np
 
-def map_shape_to_code(shape_name):
+def map_shape_to_code(shape_name, vectorized=False):
 
     shape_dict = {
         "eight_shape": (0, eight_shape_trajectory, ()),
@@ -16,8 +17,24 @@ def map_shape_to_code(shape_name):
         "sine_wave": (9, sine_wave_trajectory, (3,))
     }
     
+    # Array-native versions, same signature but taking a vector of steps
+    vectorized_dict = {
+        "eight_shape": eight_shape_trajectory_vec,
+        "circle": circle_trajectory_vec,
+        "square": square_trajectory_vec,
+        "helix": helix_trajectory_vec,
+        "heart_shape": heart_shape_trajectory_vec,
+        "infinity_shape": infinity_shape_trajectory_vec,
+        "spiral_square": spiral_square_trajectory_vec,
+        "star_shape": star_shape_trajectory_vec,
+        "zigzag": zigzag_trajectory_vec,
+        "sine_wave": sine_wave_trajectory_vec
+    }
+
     if shape_name in shape_dict:
         shape_code, shape_fcn, shape_args = shape_dict[shape_name]
+        if vectorized:
+            shape_fcn = vectorized_dict[shape_name]
     else:
         raise ValueError(f"Invalid shape name: {shape_name}")
     
@@ -232,3 +249,214 @@ def square_trajectory(step, maneuver_time, diameter, direction, initial_alt, ste
     az = 0
 
     return x, y, z, vx, vy, vz, ax, ay, az
+
+
+# Vectorized counterparts of the *_trajectory functions above. Each one takes an
+# array of steps instead of a single step and returns a (T, 9) array whose
+# columns are x, y, z, vx, vy, vz, ax, ay, az, matching the per-step results.
+# The steps may also be an (N, T) grid with diameter and initial_alt given as
+# (N, 1) arrays, which evaluates N drones at once into an (N, T, 9) array.
+
+def _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az):
+    shape = np.broadcast_shapes(*(np.shape(c) for c in (t, x, y, z, vx, vy, vz, ax, ay, az)))
+    columns = [np.broadcast_to(np.asarray(c, dtype=float), shape) for c in (x, y, z, vx, vy, vz, ax, ay, az)]
+    return np.stack(columns, axis=-1)
+
+def sine_wave_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time, turns):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time * turns
+
+    x = diameter * t / maneuver_time
+    y = diameter * np.sin(theta)
+    z = -1 * initial_alt
+
+    vx = diameter / maneuver_time
+    vy = diameter * np.cos(theta) * 2 * direction * np.pi * turns / maneuver_time
+    vz = 0
+
+    ax = -diameter * np.sin(theta) * 2 * direction * np.pi * turns / maneuver_time ** 2
+    ay = diameter * np.cos(theta) * 4 * direction * np.pi * turns ** 2 / maneuver_time ** 2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def infinity_shape_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time
+
+    x = (diameter / 2) * np.sin(theta)
+    y = direction * (diameter / 4) * np.sin(2 * theta)
+    z = -1 * initial_alt
+
+    vx = (diameter / 2) * np.cos(theta) * 2 * direction * np.pi / maneuver_time
+    vy = direction * (diameter / 4) * np.cos(2 * theta) * 4 * direction * np.pi / maneuver_time
+    vz = 0
+
+    ax = -(diameter / 2) * np.sin(theta) * 4 * direction * np.pi * np.cos(theta) / maneuver_time ** 2
+    ay = -direction * (diameter / 4) * np.sin(2 * theta) * 8 * direction * np.pi * np.cos(2 * theta) / maneuver_time ** 2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def spiral_square_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time, turns):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time * turns
+
+    r = diameter * t / maneuver_time
+    x = r * np.cos(theta)
+    y = r * np.sin(theta)
+    z = -1 * initial_alt
+
+    vx = diameter * (np.cos(theta) - t * np.sin(theta)) / maneuver_time
+    vy = diameter * (np.sin(theta) + t * np.cos(theta)) / maneuver_time
+    vz = 0
+
+    ax = -diameter * np.sin(theta) * 2 * direction * np.pi * turns / maneuver_time ** 2
+    ay = diameter * np.cos(theta) * 4 * direction * np.pi * turns ** 2 / maneuver_time ** 2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def star_shape_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time, points):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time
+
+    r = diameter * (1 - np.sin(points * theta))
+    x = r * np.cos(theta)
+    y = r * np.sin(theta)
+    z = -1 * initial_alt
+
+    vx = diameter * (np.cos(theta) - points * np.cos(points * theta)) / maneuver_time
+    vy = diameter * (np.sin(theta) - points * np.sin(points * theta)) / maneuver_time
+    vz = 0
+
+    ax = -diameter * np.sin(theta) * 4 * direction * np.pi * points * np.cos(theta) / maneuver_time ** 2
+    ay = -diameter * np.sin(2 * theta) * 8 * direction * np.pi * points * np.cos(2 * theta) / maneuver_time ** 2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def zigzag_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time, turns):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time * turns
+
+    x = diameter * t / maneuver_time
+    y = diameter * np.sin(theta)
+    z = -1 * initial_alt
+
+    vx = diameter / maneuver_time
+    vy = diameter * np.cos(theta) * 2 * direction * np.pi * turns / maneuver_time
+    vz = 0
+
+    ax = -diameter * np.sin(theta) * 2 * direction * np.pi * turns / maneuver_time ** 2
+    ay = diameter * np.cos(theta) * 4 * direction * np.pi * turns ** 2 / maneuver_time ** 2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def heart_shape_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time
+
+    radius = diameter / 2
+    scale_factor = 30 / 400  # Adjust the scale factor to match the desired ratio
+
+    x = scale_factor * radius * 16 * np.sin(theta) ** 3
+    y = radius * (13 * np.cos(theta) - 5 * np.cos(2 * theta) - 2 * np.cos(3 * theta) - np.cos(4 * theta)) / 13
+    z = -1 * initial_alt
+
+    vx = scale_factor * radius * 48 * np.pi * np.sin(theta) ** 2 * np.cos(theta) / maneuver_time
+    vy = radius * (13 * np.sin(theta) - 10 * np.sin(2 * theta) - 6 * np.sin(3 * theta) - 4 * np.sin(4 * theta)) * 2 * np.pi / (13 * maneuver_time)
+    vz = 0
+
+    ax = -scale_factor * radius * 48 * np.pi * np.sin(theta) ** 3 * np.cos(theta) / maneuver_time ** 2
+    ay = -radius * (13 * np.cos(theta) - 10 * np.cos(2 * theta) - 6 * np.cos(3 * theta) - 4 * np.cos(4 * theta)) * 4 * np.pi ** 2 / (13 * maneuver_time ** 2)
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def helix_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time, end_altitude, turns):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time * turns
+
+    x = (diameter / 2) * np.cos(theta)
+    y = (diameter / 2) * np.sin(theta)
+    z = -1 * (initial_alt + (end_altitude - initial_alt) * (t / maneuver_time))
+
+    vx = -(diameter / 2) * np.sin(theta) * 2 * direction * np.pi * turns / maneuver_time
+    vy = (diameter / 2) * np.cos(theta) * 2 * direction * np.pi * turns / maneuver_time
+    vz = -1 * (initial_alt - end_altitude) / maneuver_time
+
+    ax = -(diameter / 2) * np.cos(theta) * 4 * direction * np.pi * turns ** 2 / maneuver_time ** 2
+    ay = -(diameter / 2) * np.sin(theta) * 4 * direction * np.pi * turns ** 2 / maneuver_time ** 2
+    az = -1 * (initial_alt - end_altitude) / maneuver_time ** 2
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def eight_shape_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time
+
+    x = (diameter / 2) * np.sin(theta)
+    y = direction * (diameter / 4) * np.sin(2 * theta)
+    z = -1 * initial_alt
+
+    vx = (diameter / 2) * np.cos(theta) * 2 * direction * np.pi / maneuver_time
+    vy = direction * (diameter / 4) * np.cos(2 * theta) * 4 * direction * np.pi / maneuver_time
+    vz = 0
+
+    ax = -(diameter / 2) * np.sin(theta) * 4 * direction * np.pi **2 / maneuver_time **2
+    ay = -direction * (diameter / 4) * np.sin(2 * theta) * 8 * direction * np.pi **2 / maneuver_time **2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def circle_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time):
+    t = np.asarray(steps, dtype=float) * step_time
+    theta = 2 * direction * np.pi * t / maneuver_time
+
+    x = (diameter / 2) * np.cos(theta)
+    y = (diameter / 2) * np.sin(theta)
+    z = -1 * initial_alt
+
+    vx = -(diameter / 2) * np.sin(theta) * 2 * direction * np.pi / maneuver_time
+    vy = (diameter / 2) * np.cos(theta) * 2 * direction * np.pi / maneuver_time
+    vz = 0
+
+    ax = -(diameter / 2) * np.cos(theta) * 4 * direction * np.pi ** 2 / maneuver_time ** 2
+    ay = -(diameter / 2) * np.sin(theta) * 4 * direction * np.pi ** 2 / maneuver_time ** 2
+    az = 0
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
+
+def square_trajectory_vec(steps, maneuver_time, diameter, direction, initial_alt, step_time):
+    steps = np.asarray(steps)
+    t = steps * step_time
+    side_length = diameter / math.sqrt(2)
+    side_time = maneuver_time / 4
+    side_steps = int(maneuver_time / (4 * step_time))
+
+    current_side = steps // side_steps
+    side_progress = (steps % side_steps) / side_steps
+
+    on_side = [current_side == 0, current_side == 1, current_side == 2]
+    x = np.select(on_side, [side_length * side_progress, side_length, side_length * (1 - side_progress)], 0.0)
+    y = np.select(on_side, [0.0, side_length * side_progress, side_length], side_length * (1 - side_progress))
+
+    z = -1 * initial_alt
+
+    horizontal = (current_side == 0) | (current_side == 2)
+    vertical = (current_side == 1) | (current_side == 3)
+    vx = np.where(horizontal, side_length / side_time, 0.0)
+    vy = np.where(vertical, side_length / side_time, 0.0)
+    vz = 0
+
+    ax = np.where(horizontal, -side_length / side_time ** 2 * np.sin(2 * direction * np.pi * t / maneuver_time), 0.0)
+    ay = np.where(vertical, -side_length / side_time ** 2 * np.cos(2 * direction * np.pi * t / maneuver_time), 0.0)
+    az = 0
+
+    if direction == -1:
+        x, y = y, x
+        vx, vy = vy, vx
+
+    return _stack_trajectory(t, x, y, z, vx, vy, vz, ax, ay, az)
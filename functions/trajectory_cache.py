@@ -0,0 +1,159 @@
+"""
+Content-addressed cache of generated trajectories.
+
+`TrajectoryCache.create_active_csv` takes the same arguments as `create_active_csv`. The
+trajectory is identified by a SHA-256 hash of the generator arguments and GENERATOR_VERSION, and
+each entry is stored in the cache directory as <hash>.csv plus <hash>.trj. On a hit the cached
+files are copied to the requested output paths without running the generator; on a miss the
+trajectory is generated into the cache first.
+
+The cache is bounded by max_bytes: after a new entry is stored, least recently used entries are
+deleted until the cache fits. An entry's modification time records its last use. Temporary files
+left behind by an interrupted store are deleted by evict once they are STALE_TEMPORARY_AGE old,
+and by clear.
+
+Usage:
+------
+cache = TrajectoryCache("shapes/cache")
+cache.create_active_csv(shape_name="circle", diameter=5.0, direction=1, maneuver_time=60.0, start_x=0.0, start_y=0.0,
+                        initial_altitude=10.0, climb_rate=2.0, move_speed=2.5, hold_time=2.0, step_time=0.1,
+                        output_file="shapes/active.csv", binary_output_file="shapes/active.trj")
+trajectory = cache.load(shape_name="circle", ...)   # memory-mapped Trajectory of a cached entry, or None
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from functions.create_active_csv import GENERATOR_VERSION, plan_mission, write_mission, CsvSink, BinarySink
+from functions.trajectory_io import read_trajectory_binary
+
+GENERATOR_ARGUMENTS = ["shape_name", "diameter", "direction", "maneuver_time", "start_x", "start_y", "initial_altitude",
+                       "climb_rate", "move_speed", "hold_time", "step_time"]
+
+# Seconds after which a *.tmp file in the cache is taken to be left over from an interrupted store
+# rather than being written by a store running in another process
+STALE_TEMPORARY_AGE = 600.0
+
+
+def cache_key(**arguments):
+    """Hash of the generator arguments (numbers compared by value, so 2 and 2.0 are the same) and version."""
+    missing = [name for name in GENERATOR_ARGUMENTS if name not in arguments]
+    if missing:
+        raise TypeError(f"Missing generator arguments: {missing}")
+    values = {name: arguments[name] if isinstance(arguments[name], str) else float(arguments[name]) for name in GENERATOR_ARGUMENTS}
+    content = json.dumps({"generator": "create_active_csv", "version": GENERATOR_VERSION, "arguments": values}, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class TrajectoryCache:
+
+    def __init__(self, directory="shapes/cache", max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".csv", base + ".trj"
+
+    def lookup(self, **arguments):
+        """(csv_path, binary_path) of a cached entry, or None; a hit marks the entry as recently used."""
+        csv_path, binary_path = self.paths(cache_key(**arguments))
+        if not (os.path.exists(csv_path) and os.path.exists(binary_path)):
+            return None
+        now = time.time()
+        for path in (csv_path, binary_path):
+            os.utime(path, (now, now))
+        return csv_path, binary_path
+
+    def load(self, **arguments):
+        """Memory-mapped Trajectory of a cached entry, or None if it is not cached."""
+        entry = self.lookup(**arguments)
+        if entry is None:
+            return None
+        return read_trajectory_binary(entry[1])
+
+    def store(self, **arguments):
+        """Generate a trajectory into the cache (unless it is there already) and return its paths."""
+        entry = self.lookup(**arguments)
+        if entry is not None:
+            return entry
+        os.makedirs(self.directory, exist_ok=True)
+        csv_path, binary_path = self.paths(cache_key(**arguments))
+
+        # Write to temporary names first so an interrupted run never leaves half an entry behind
+        temporary_csv, temporary_binary = csv_path + ".tmp", binary_path + ".tmp"
+        try:
+            plan = plan_mission(*(arguments[name] for name in GENERATOR_ARGUMENTS))
+            write_mission(plan, [CsvSink(temporary_csv), BinarySink(temporary_binary)])
+            os.replace(temporary_csv, csv_path)
+            os.replace(temporary_binary, binary_path)
+        except BaseException:
+            for path in (temporary_csv, temporary_binary):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        self.evict(keep=(csv_path, binary_path))
+        return csv_path, binary_path
+
+    def create_active_csv(self, output_file="active.csv", binary_output_file=None, **arguments):
+        """Same as create_active_csv, but served from the cache when these arguments were generated before."""
+        entry = self.lookup(**arguments)
+        if entry is None:
+            self.misses += 1
+            entry = self.store(**arguments)
+        else:
+            self.hits += 1
+            print(f"Using cached {arguments['shape_name']} trajectory {os.path.basename(entry[0])}")
+
+        # The CSV first, so the binary file is never older than the CSV next to it (see load_trajectory)
+        shutil.copyfile(entry[0], output_file)
+        print(f"Created {output_file} with the {arguments['shape_name']}.")
+        if binary_output_file is not None:
+            shutil.copyfile(entry[1], binary_output_file)
+            print(f"Created {binary_output_file} with the {arguments['shape_name']}.")
+        return entry
+
+    def size(self):
+        return sum(os.path.getsize(path) for path in self._files())
+
+    def evict(self, keep=()):
+        """Delete stale temporary files, then least recently used entries until the cache is at most max_bytes."""
+        now = time.time()
+        for path in self._temporary_files():
+            if now - os.path.getmtime(path) > STALE_TEMPORARY_AGE:
+                os.remove(path)
+
+        entries = {}
+        for path in self._files():
+            key = os.path.splitext(os.path.basename(path))[0]
+            size, last_used = entries.get(key, (0, 0.0))
+            entries[key] = (size + os.path.getsize(path), max(last_used, os.path.getmtime(path)))
+
+        total = sum(size for size, _ in entries.values())
+        keep_keys = {os.path.splitext(os.path.basename(path))[0] for path in keep}
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if key in keep_keys:
+                continue
+            for path in self.paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+    def clear(self):
+        for path in self._files() + self._temporary_files():
+            os.remove(path)
+
+    def _files(self):
+        return glob.glob(os.path.join(self.directory, "*.csv")) + glob.glob(os.path.join(self.directory, "*.trj"))
+
+    def _temporary_files(self):
+        return glob.glob(os.path.join(self.directory, "*.tmp"))
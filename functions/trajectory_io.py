@@ -0,0 +1,280 @@
+"""
+Loading and saving of drone trajectories.
+
+Two on-disk formats are supported:
+
+- The CSV file written by `create_active_csv` (see that module for the column guide).
+- A compact columnar binary file (`.trj`) that can be loaded with a single read or memory map.
+
+Binary File Structure:
+----------------------
+- 8 bytes magic: b"SWTRJ001"
+- 4 bytes little-endian uint32: length of the JSON header in bytes
+- JSON header (utf-8), padded with spaces to an 8 byte boundary. It records the schema
+  (column name, dtype and byte offset of each column), number of rows, step_time, duration
+  and the mode segments (mode code, first row, end row, start and end time).
+- Column data, one contiguous little-endian array per column, each aligned to 8 bytes.
+
+Usage:
+------
+trajectory = load_trajectory("shapes/active.csv")   # uses shapes/active.trj if it is up to date
+px = trajectory.column("px")
+t, px, py, pz, vx, vy, vz, ax, ay, az, yaw, mode_code = trajectory.row(0)
+
+# One copy of the data shared by every drone, each with its own translation
+drone_trajectory = trajectory.offset(0.0, 3.0, -0.5)
+"""
+
+import json
+import os
+import struct
+import numpy as np
+
+BINARY_MAGIC = b"SWTRJ001"
+BINARY_EXTENSION = ".trj"
+
+# Columns kept in memory and in the binary file, in row order
+TRAJECTORY_COLUMNS = ["t", "px", "py", "pz", "vx", "vy", "vz", "ax", "ay", "az", "yaw", "mode"]
+COLUMN_DTYPES = {name: "<f8" for name in TRAJECTORY_COLUMNS}
+COLUMN_DTYPES["mode"] = "<i2"
+
+
+class Trajectory:
+    """
+    Columnar trajectory: one 1-D array per column of TRAJECTORY_COLUMNS.
+
+    Playback reads whole rows every tick, so row() and block() read from a contiguous (T, 12)
+    float64 copy of the columns (`data`), built on first use and shared with every offset view:
+    one slice and one tolist() per call instead of a lookup and a conversion per column.
+    """
+
+    def __init__(self, columns, step_time=None, segments=None):
+        self.columns = columns
+        self.t = columns["t"]
+        self.mode = columns["mode"]
+        self.step_time = step_time if step_time is not None else infer_step_time(self.t)
+        self.segments = segments if segments is not None else mode_segments(self.t, self.mode)
+        self._data = None
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def duration(self):
+        return float(self.t[-1]) if len(self.t) else 0.0
+
+    @property
+    def data(self):
+        """(T, len(TRAJECTORY_COLUMNS)) float64 array of the rows, mode included as a float."""
+        if self._data is None:
+            self._data = np.column_stack([np.asarray(self.columns[name], dtype=np.float64) for name in TRAJECTORY_COLUMNS])
+        return self._data
+
+    def column(self, name):
+        return self.columns[name]
+
+    def row(self, index):
+        return _as_row(self.data[index].tolist())
+
+    def block(self, start, stop):
+        """Rows start..stop - 1 as a (n, 12) float64 array; read-only, it may be a view of data."""
+        return self.data[start:stop]
+
+    def offset(self, dx, dy, dz):
+        """Return a view of this trajectory translated by (dx, dy, dz), sharing its data."""
+        return OffsetTrajectory(self, (dx, dy, dz))
+
+    @classmethod
+    def from_array(cls, data, step_time=None):
+        """Build a trajectory from a (T, len(TRAJECTORY_COLUMNS)) array."""
+        data = np.asarray(data)
+        columns = {name: np.ascontiguousarray(data[:, i], dtype=COLUMN_DTYPES[name]) for i, name in enumerate(TRAJECTORY_COLUMNS)}
+        return cls(columns, step_time=step_time)
+
+
+class OffsetTrajectory:
+    """
+    Translated view of a Trajectory. The offset is applied lazily: row() and block() shift the rows
+    they return with one vector add and column() shifts a whole position column on demand, so no
+    per-drone copy is kept in memory.
+    """
+
+    POSITION_COLUMNS = ("px", "py", "pz")
+
+    def __init__(self, base, translation):
+        self.base = base
+        self.translation = translation
+        self.t = base.t
+        self.mode = base.mode
+        self.step_time = base.step_time
+        self.segments = base.segments
+        self._shift = np.zeros(len(TRAJECTORY_COLUMNS))
+        for name, value in zip(self.POSITION_COLUMNS, translation):
+            self._shift[TRAJECTORY_COLUMNS.index(name)] = value
+
+    def __len__(self):
+        return len(self.base)
+
+    @property
+    def duration(self):
+        return self.base.duration
+
+    def column(self, name):
+        if name in self.POSITION_COLUMNS:
+            return self.base.column(name) + self.translation[self.POSITION_COLUMNS.index(name)]
+        return self.base.column(name)
+
+    def row(self, index):
+        return _as_row((self.base.data[index] + self._shift).tolist())
+
+    def block(self, start, stop):
+        return self.base.data[start:stop] + self._shift
+
+    def offset(self, dx, dy, dz):
+        x, y, z = self.translation
+        return OffsetTrajectory(self.base, (x + dx, y + dy, z + dz))
+
+
+def _as_row(values):
+    # The mode code is stored as a float in Trajectory.data
+    values[-1] = int(values[-1])
+    return tuple(values)
+
+
+def infer_step_time(t):
+    if len(t) < 2:
+        return None
+    return float(np.median(np.diff(t)))
+
+
+def mode_segments(t, mode):
+    """Return [mode, first_row, end_row, t_start, t_end] for each run of equal mode codes."""
+    if len(mode) == 0:
+        return []
+    starts = np.flatnonzero(np.diff(mode)) + 1
+    starts = np.concatenate(([0], starts))
+    ends = np.concatenate((starts[1:], [len(mode)]))
+    return [[int(mode[s]), int(s), int(e), float(t[s]), float(t[e - 1])] for s, e in zip(starts, ends)]
+
+
+def read_trajectory_csv(path):
+    with open(path, newline="") as csvfile:
+        header = csvfile.readline().strip().split(",")
+    usecols = [header.index(name) for name in TRAJECTORY_COLUMNS]
+    data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=usecols, ndmin=2)
+    return Trajectory.from_array(data)
+
+
+def write_trajectory_binary(path, trajectory, step_time=None):
+    step_time = step_time if step_time is not None else trajectory.step_time
+    with TrajectoryBinaryWriter(path, len(trajectory), step_time, trajectory.duration, trajectory.segments) as writer:
+        writer.write_columns({name: trajectory.column(name) for name in TRAJECTORY_COLUMNS})
+
+
+class TrajectoryBinaryWriter:
+    """
+    Write a binary trajectory file block by block, without holding the whole trajectory in memory.
+    The number of rows, duration and mode segments go into the header and must be known up front;
+    each block is written to its place in every column.
+    """
+
+    def __init__(self, path, rows, step_time, duration, segments):
+        self.rows = rows
+        self.written = 0
+        self.schema = []
+        offset = 0
+        for name in TRAJECTORY_COLUMNS:
+            dtype = np.dtype(COLUMN_DTYPES[name])
+            self.schema.append({"name": name, "dtype": dtype.str, "offset": offset})
+            offset += _align(rows * dtype.itemsize)
+
+        header = {
+            "version": 1,
+            "rows": rows,
+            "step_time": step_time,
+            "duration": duration,
+            "schema": self.schema,
+            "segments": segments,
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        prefix_length = len(BINARY_MAGIC) + 4
+        header_bytes += b" " * (_align(prefix_length + len(header_bytes)) - prefix_length - len(header_bytes))
+
+        self.file = open(path, "wb")
+        self.file.write(BINARY_MAGIC)
+        self.file.write(struct.pack("<I", len(header_bytes)))
+        self.file.write(header_bytes)
+        self.data_start = self.file.tell()
+        # Reserve the (zero padded) space of every column
+        self.file.truncate(self.data_start + offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, block):
+        """Write the next rows, given as an (n, len(TRAJECTORY_COLUMNS)) array in column order."""
+        self.write_columns({name: block[:, i] for i, name in enumerate(TRAJECTORY_COLUMNS)})
+
+    def write_columns(self, columns):
+        """Write the next rows, given as a dict of equally long columns."""
+        count = len(columns[TRAJECTORY_COLUMNS[0]])
+        if self.written + count > self.rows:
+            raise ValueError(f"Writing {self.written + count} rows to a trajectory file of {self.rows} rows")
+        for column in self.schema:
+            dtype = np.dtype(column["dtype"])
+            self.file.seek(self.data_start + column["offset"] + self.written * dtype.itemsize)
+            self.file.write(np.ascontiguousarray(columns[column["name"]], dtype=dtype).tobytes())
+        self.written += count
+
+    def close(self):
+        self.file.close()
+
+
+def read_trajectory_binary(path, mmap=True):
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        with open(path, "rb") as file:
+            buffer = np.frombuffer(file.read(), dtype=np.uint8)
+
+    if bytes(buffer[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise ValueError(f"Not a trajectory file: {path}")
+    header_start = len(BINARY_MAGIC) + 4
+    (header_length,) = struct.unpack("<I", bytes(buffer[len(BINARY_MAGIC):header_start]))
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]).decode("utf-8"))
+    data_start = header_start + header_length
+
+    rows = header["rows"]
+    columns = {}
+    for column in header["schema"]:
+        dtype = np.dtype(column["dtype"])
+        start = data_start + column["offset"]
+        columns[column["name"]] = buffer[start:start + rows * dtype.itemsize].view(dtype)
+
+    return Trajectory(columns, step_time=header["step_time"], segments=header["segments"])
+
+
+def binary_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + BINARY_EXTENSION
+
+
+def load_trajectory(path, mmap=True):
+    """
+    Load a trajectory from a binary or CSV file. For a CSV path, the binary file next to it
+    is used instead when it exists and is not older than the CSV; otherwise the CSV is parsed.
+    """
+    if path.endswith(BINARY_EXTENSION):
+        return read_trajectory_binary(path, mmap=mmap)
+
+    binary_path = binary_path_for(path)
+    if os.path.exists(binary_path) and (not os.path.exists(path) or os.path.getmtime(binary_path) >= os.path.getmtime(path)):
+        return read_trajectory_binary(binary_path, mmap=mmap)
+
+    return read_trajectory_csv(path)
+
+
+def _align(size, alignment=8):
+    return (size + alignment - 1) // alignment * alignment
@@ -20,10 +20,13 @@ Inputs:
 -------
 The offboard_from_csv.py script expects the following inputs:
 - CSV file: The trajectory data in CSV format should be located at "shapes/active.csv" relative to the script's location.
+  If "shapes/active.trj" (the binary format written by create_active_csv) exists and is up to date, it is loaded instead.
 
 Outputs:
 --------
 The script controls the drone to follow the trajectory defined in the CSV file. The drone performs the desired trajectory and returns to its home position to land.
+Every commanded setpoint is recorded together with the drone's local position telemetry in "logs/offboard_log.bin", exported to "logs/offboard_log.csv" and plotted to "logs/flight_path.png".
+With instrument_latency = True, latency histograms of the setpoint loop are saved to "logs/latency.json" (also on demand with kill -USR1 <pid>).
 
 Example Usage:
 --------------
@@ -38,7 +41,10 @@ Additional Information:
 Note:
 -----
 - Make sure that the drone is properly configured for offboard control before running this script.
-- Adjust the time resolution (0.1 seconds) in the script if needed for your application.
+- Set simulate = True to fly an in-process point-mass drone instead of PX4 SITL (no PX4, Gazebo or mavsdk_server needed).
+  With virtual_time = True as well, the simulated mission runs on a virtual clock as fast as the CPU allows, with the same
+  setpoints on every run.
+- Adjust setpoint_rate (20 Hz, interpolated between the 0.1 second trajectory rows) in the script if needed for your application.
 - Uncomment the lines to change the flight mode or include additional functionality as required.
 """
 
@@ -46,17 +52,33 @@ Note:
 
 
 import asyncio
-import csv
-import os
 
 from mavsdk import System
 from mavsdk.offboard import PositionNedYaw, VelocityNedYaw, AccelerationNed , OffboardError
 from mavsdk.telemetry import LandedState
-import subprocess
-import signal
+from functions.mavsdk_server_pool import MavsdkServerPool
+from functions.sim_drone import SimWorld
+from functions.clock import run as run_mission
+from functions.trajectory_io import load_trajectory
+from functions.playback import TrajectoryPlayer, HERMITE
+from functions.scheduler import TickScheduler
+from functions.telemetry import DroneTelemetry
+from functions.flight_recorder import FlightRecorder, export_flight_log_csv, plot_flight_log
+from functions.tracking_metrics import TrackingMetrics
+from functions.instrumentation import TickInstrumentation, SETPOINT_LATENCY, LATENESS, ITERATION
 
+# Fly a simulated drone (functions/sim_drone.py) instead of connecting to PX4 SITL
+simulate = False
 
-async def run():
+# Run the simulated mission on a virtual clock, as fast as the CPU allows (only with simulate = True)
+virtual_time = False
+
+# Latency histograms of the setpoint loop (setpoint call latency, tick lateness, iteration time),
+# summarized every 10 s, saved to logs/latency.json and on SIGUSR1
+instrument_latency = True
+
+
+async def run(drone, recorder):
     
     # Define a dictionary to map mode codes to their descriptions
     mode_descriptions = {
@@ -72,8 +94,6 @@ async def run():
     90: "Returning to home coordinate",
     100: "Landing"
     }
-    grpc_port = 50040
-    drone = System(mavsdk_server_address="127.0.0.1", port=grpc_port)
     await drone.connect(system_address="udp://:14540")
 
     print("Waiting for drone to connect...")
@@ -82,6 +102,10 @@ async def run():
             print("-- Connected to drone!")
             break
 
+    # Keep position, velocity, attitude and battery telemetry streaming into ring buffers
+    telemetry = DroneTelemetry(drone)
+    telemetry.start()
+
     print("Waiting for drone to have a global position estimate...")
     async for health in drone.telemetry.health():
         if health.is_global_position_ok and health.is_home_position_ok:
@@ -103,53 +127,48 @@ async def run():
         await drone.action.disarm()
         return
 
-    waypoints = []
-
-    # Read data from the CSV file
-    with open("shapes/active.csv", newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            t = float(row["t"])
-            px = float(row["px"])
-            py = float(row["py"])
-            pz = float(row["pz"])
-            vx = float(row["vx"])
-            vy = float(row["vy"])
-            vz = float(row["vz"])
-            ax = float(row["ax"])
-            ay = float(row["ay"])
-            az = float(row["az"])
-            yaw = float(row["yaw"])
-            mode_code = int(row["mode"])  # Assuming the mode code is in a column named "mode"
-        
-        
-            waypoints.append((t, px, py, pz, vx, vy, vz,ax,ay,az,mode_code))
+    # Load the trajectory (binary file next to the CSV if available, CSV otherwise)
+    trajectory = load_trajectory("shapes/active.csv")
+    player = TrajectoryPlayer(trajectory)
 
     print("-- Performing trajectory")
-    total_duration = waypoints[-1][0]  # Total duration is the time of the last waypoint
-    t = 0  # Time variable
+    total_duration = trajectory.duration  # Total duration is the time of the last waypoint
+    # Setpoints are streamed at setpoint_rate and interpolated between the 0.1 s trajectory rows
+    setpoint_rate = 20.0  # Hz
+    interpolation = HERMITE  # STEP streams the stored rows unchanged
+    scheduler = TickScheduler(period=1 / setpoint_rate)
+    tracking = TrackingMetrics()
+    instrumentation = TickInstrumentation() if instrument_latency else None
+    if instrumentation is not None:
+        instrumentation.dump_on_signal("logs/latency.json")
     last_mode = 0
-    while t <= total_duration:
-        # Find the current waypoint based on time
-        current_waypoint = None
-        for waypoint in waypoints:
-            if t <= waypoint[0]:
-                current_waypoint = waypoint
-                break
-
-        if current_waypoint is None:
+    while True:
+        # Wait for the next tick deadline; the time variable follows the integer tick index
+        tick = await scheduler.next_tick()
+        t = tick * scheduler.period
+        if instrumentation is not None:
+            woke = scheduler.clock()
+            instrumentation.record(0, LATENESS, woke - scheduler.deadline(tick))
+        if t > total_duration:
+            break
+
+        # Find (or interpolate) the current setpoint based on time
+        setpoint = player.setpoint_at(t, interpolation)
+
+        if setpoint is None:
             # Reached the end of the trajectory
             break
 
-        position = current_waypoint[1:4]  # Extract position (px, py, pz)
-        velocity = current_waypoint[4:7]  # Extract velocity (vx, vy, vz)
-        acceleration = current_waypoint[7:10]  # Extract velocity (ax, ay, az)
-        mode_code = current_waypoint[-1]
+        position, velocity, acceleration, yaw, mode_code = setpoint
+        actual = telemetry.latest("position_velocity_ned")
+        recorder.record(0, t, setpoint, actual)
+        tracking.update(0, setpoint, actual)
         if last_mode != mode_code:
                 # Print the mode number and its description
                 print(f" Mode number: {mode_code}, Description: {mode_descriptions[mode_code]}")
                 last_mode = mode_code
                 
+        sent = scheduler.clock() if instrumentation is not None else None
         await drone.offboard.set_position_velocity_acceleration_ned(
             PositionNedYaw(*position, yaw),
             VelocityNedYaw(*velocity, yaw),
@@ -159,11 +178,17 @@ async def run():
         #     PositionNedYaw(*position, yaw),
         #     VelocityNedYaw(*velocity, yaw),
         # )
-
-        await asyncio.sleep(0.1)  # Time resolution of 0.1 seconds
-        t += 0.1
+        if instrumentation is not None:
+            now = scheduler.clock()
+            instrumentation.record(0, SETPOINT_LATENCY, now - sent)
+            instrumentation.record(0, ITERATION, now - woke)
+            instrumentation.tick()
 
     print("-- Shape completed")
+    print(tracking.report())
+    if instrumentation is not None:
+        print(instrumentation.report())
+        instrumentation.dump("logs/latency.json")
 
     # print("-- Returning to home")
     # await drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, -10.0, 0.0))
@@ -184,6 +209,8 @@ async def run():
 
     print("-- Disarming")
     await drone.action.disarm()
+    await telemetry.stop()
+    await telemetry.hub.stop()
 
     # print("-- Changing flight mode")
     # await drone.action.set_flight_mode("MANUAL")
@@ -192,20 +219,32 @@ async def main():
 
     udp_port = 14540 
 
-    # Start mavsdk_server 
-    grpc_port = 50040 
-    mavsdk_server = subprocess.Popen(["./mavsdk_server", "-p", str(grpc_port), f"udp://:{udp_port}"])
-    # await asyncio.sleep(1)
-
-    tasks = []
-    tasks.append(asyncio.create_task(run()))
-
-    await asyncio.gather(*tasks)
-
-    # Kill  mavsdk_server 
-    os.kill(mavsdk_server.pid, signal.SIGTERM)
+    # Start mavsdk_server on a free gRPC port and wait until it accepts connections
+    async with MavsdkServerPool() as server_pool:
+        if simulate:
+            # In-process point-mass drone, no PX4 or mavsdk_server
+            drone = SimWorld().add_drone()
+        else:
+            servers = await server_pool.start([f"udp://:{udp_port}"])
+            drone = System(mavsdk_server_address=server_pool.host, port=servers[0].grpc_port)
+
+        # Record every commanded setpoint with the latest local position telemetry
+        recorder = FlightRecorder("logs/offboard_log.bin")
+        recorder.start()
+
+        tasks = []
+        tasks.append(asyncio.create_task(run(drone, recorder)))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Keep whatever was recorded, also when the flight is aborted
+            await recorder.close()
+            export_flight_log_csv("logs/offboard_log.bin", "logs/offboard_log.csv")
+            plot_flight_log("logs/offboard_log.bin", "logs/flight_path.png")
+            print(f"Flight log with {recorder.records_written} records saved to logs/offboard_log.csv")
 
     print("All tasks completed. Exiting program.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run_mission(main(), virtual_time=simulate and virtual_time)
\ No newline at end of file
@@ -1,147 +1,184 @@
-import os
 import asyncio
 from mavsdk import System
-import csv
-from mavsdk.offboard import PositionNedYaw, VelocityNedYaw, AccelerationNed, OffboardError
+from mavsdk.offboard import PositionNedYaw
 from mavsdk.telemetry import LandedState
 from mavsdk.action import ActionError
 from mavsdk.telemetry import *
-import subprocess
-import signal
-global_position_telemetry = {}
+from functions.mavsdk_server_pool import MavsdkServerPool
+from functions.sim_drone import SimWorld
+from functions.clock import run, loop_time
+from functions.trajectory_io import load_trajectory
+from functions.swarm_generator import read_swarm_container
+from functions.separation import check_separation, swarm_positions
+from functions.playback import TrajectoryPlayer, HERMITE
+from functions.swarm_ticker import SwarmTicker
+from functions.telemetry import DroneTelemetry
+from functions.telemetry_hub import TelemetryHub
+from functions.flight_recorder import FlightRecorder, export_flight_log_csv, plot_flight_log
+from functions.tracking_metrics import TrackingMetrics
+from functions.instrumentation import TickInstrumentation
+from functions.mission_start import MissionStart
+from functions.preflight import PreflightPipeline, PreflightStage, CONNECTION_STATE, HEALTH, ARM, SET_POSITION_NED, OFFBOARD_START, COMMAND_STAGES
 
+# Fly simulated drones (functions/sim_drone.py) instead of connecting to PX4 SITL
+simulate = False
+
+# Run the simulated mission on a virtual clock, as fast as the CPU allows (only with simulate = True)
+virtual_time = False
+
+# Latency histograms of the swarm tick (setpoint call latency per drone, tick lateness, iteration
+# time), summarized every 10 s, saved to logs/latency.json and on SIGUSR1
+instrument_latency = True
+
+# Telemetry ring buffers of every drone, keyed by drone id
+drone_telemetry = {}
+
+# Telemetry stream rates (Hz) requested from every drone
+telemetry_rates = {
+"position_velocity_ned": 20.0,
+"position": 5.0,
+"attitude_euler": 10.0,
+"battery": 1.0
+}
+
+
+# Define a dictionary to map mode codes to their descriptions
+mode_descriptions = {
+0: "On the ground",
+10: "Initial climbing state",
+20: "Initial holding after climb",
+30: "Moving to start point",
+40: "Holding at start point",
+50: "Moving to maneuvering start point",
+60: "Holding at maneuver start point",
+70: "Maneuvering (trajectory)",
+80: "Holding at the end of the trajectory coordinate",
+90: "Returning to home coordinate",
+100: "Landing"
+}
 
-async def get_global_position_telemetry(drone_id, drone):
-    async for global_position in drone.telemetry.position():
-        global_position_telemetry[drone_id] = global_position
-        break
-    
 
+def print_mode_change(drone_id, mode_code):
+    # Print the mode number and its description
+    print(f"Drone id: {drone_id}: Mode number: {mode_code}, Description: {mode_descriptions[mode_code]}")
 
-async def get_global_position_telemetry(drone_id, drone):
-    async for global_position in drone.telemetry.position():
-        global_position_telemetry[drone_id] = global_position
-        break
-
-async def run_drone(drone_id, trajectory_offset, udp_port, time_offset, altitude_offset):
-    grpc_port = 50040 + drone_id
-    # Define a dictionary to map mode codes to their descriptions
-    mode_descriptions = {
-    0: "On the ground",
-    10: "Initial climbing state",
-    20: "Initial holding after climb",
-    30: "Moving to start point",
-    40: "Holding at start point",
-    50: "Moving to maneuvering start point",
-    60: "Holding at maneuver start point",
-    70: "Maneuvering (trajectory)",
-    80: "Holding at the end of the trajectory coordinate",
-    90: "Returning to home coordinate",
-    100: "Landing"
-    }
-    drone = System(mavsdk_server_address="127.0.0.1", port=grpc_port)
+
+async def connect_drone(drone_id, drone, udp_port):
     await drone.connect(system_address=f"udp://:{udp_port}")
     print(f"Drone connecting with UDP: {udp_port}")
     
     
-    #ensure futuretelem data
-    asyncio.ensure_future(get_global_position_telemetry(drone_id, drone))
-    
-    
-    
-    # Add time offset before starting the maneuver
-    await asyncio.sleep(time_offset)
+    # Keep position, velocity, attitude and battery telemetry streaming into ring buffers.
+    # Every telemetry stream is opened once per drone and shared through its hub.
+    hub = TelemetryHub(drone, rates=telemetry_rates)
+    telemetry = DroneTelemetry(drone, hub=hub)
+    telemetry.start()
+    drone_telemetry[drone_id] = telemetry
+
+
+async def wait_for_connection(drone_id, drone):
     # Check if the drone is connected
     async for state in drone.core.connection_state():
         if state.is_connected:
-            print(f"Drone id {drone_id} connected on Port: {udp_port} and grpc Port: {grpc_port}")
+            print(f"Drone id {drone_id} connected")
             break
+    try:
+        await drone_telemetry[drone_id].hub.apply_rates()
+    except Exception as error:
+        print(f"Setting telemetry rates of {drone_id} failed with error: {error}")
+
+
+async def wait_for_health(drone_id, drone):
     # Wait for the drone to have a global position estimate
-    async for health in drone.telemetry.health():
-        if health.is_global_position_ok:
-            print(f"Global position estimate ok {drone_id}")
-            break
-    global_position_telemetry[drone_id] = global_position_telemetry[drone_id]
-    print(f"Home Position of {drone_id} set to: {global_position_telemetry[drone_id]}")
+    telemetry = drone_telemetry[drone_id]
+    await telemetry.hub.first("health", lambda health: health.is_global_position_ok)
+    print(f"Global position estimate ok {drone_id}")
+    _, latitude_deg, longitude_deg, absolute_altitude_m, _ = await telemetry.wait_for("position")
+    print(f"Home Position of {drone_id} set to: lat {latitude_deg:.7f}, lon {longitude_deg:.7f}, alt {absolute_altitude_m:.2f} m")
+
+
+async def arm_drone(drone_id, drone):
     print(f"-- Arming {drone_id}")
     await drone.action.arm()
-    print(f"-- Setting initial setpoint {drone_id}")
+
+
+async def set_initial_setpoint(drone_id, drone):
+    # PX4 only accepts offboard.start() once it has a setpoint
     await drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, 0.0, 0.0))
-    
 
+
+async def start_offboard(drone_id, drone):
     print(f"-- Starting offboard {drone_id}")
-    try:
-        await drone.offboard.start()
-    except OffboardError as error:
-        # print(f"Starting offboard mode {drone_id} failed with error code: {error._result.result}")
+    await drone.offboard.start()
+
+
+async def abort_drone(drone_id, drone, stage):
+    # Clean up after a failed pre-flight stage; the drone stays on the ground
+    telemetry = drone_telemetry[drone_id]
+    if stage in COMMAND_STAGES:
+        # A failed or timed out arm may still have armed the drone
         print(f"-- Disarming {drone_id}")
-        await drone.action.disarm()
-        return
-
-    waypoints = []
-
-    # Read data from the CSV file
-    with open("shapes/active.csv", newline="") as csvfile:
-        
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            t = float(row["t"])
-            px = float(row["px"]) + trajectory_offset[0]
-            py = float(row["py"]) + trajectory_offset[1]
-            pz = float(row["pz"]) + trajectory_offset[2] -  altitude_offset
-            vx = float(row["vx"])
-            vy = float(row["vy"])
-            vz = float(row["vz"])
-            ax = float(row["ax"])
-            ay = float(row["ay"])
-            az = float(row["az"])
-            yaw = float(row["yaw"])
-            mode_code = int(row["mode"])  # Assuming the mode code is in a column named "mode"
-            
-        
-            waypoints.append((t, px, py, pz, vx, vy, vz,ax,ay,az,mode_code))
-
-    print(f"-- Performing trajectory {drone_id}")
-    total_duration = waypoints[-1][0]  # Total duration is the time of the last waypoint
-    t = 0  # Time variable
-    last_mode = 0
-    while t <= total_duration:
-        
-                
-        # Find the current waypoint based on time
-        current_waypoint = None
-        for waypoint in waypoints:
-            if t <= waypoint[0]:
-                current_waypoint = waypoint
-                break
-
-        if current_waypoint is None:
-            # Reached the end of the trajectory
-            break
+        try:
+            await drone.action.disarm()
+        except Exception as error:
+            print(f"Disarming {drone_id} failed with error: {error}")
+    await telemetry.stop()
+    await telemetry.hub.stop()
+
+
+# Pre-flight stages of every drone, with their timeouts (s) and retries. All drones go through them
+# concurrently, at most preflight_concurrency command stages at a time; a drone failing a stage is
+# left out of the mission instead of holding up the swarm.
+preflight_stages = [
+    PreflightStage(CONNECTION_STATE, wait_for_connection, timeout=30.0, bounded=False),
+    PreflightStage(HEALTH, wait_for_health, timeout=60.0, bounded=False),
+    PreflightStage(ARM, arm_drone, timeout=5.0, retries=2),
+    PreflightStage(SET_POSITION_NED, set_initial_setpoint, timeout=2.0, retries=2),
+    PreflightStage(OFFBOARD_START, start_offboard, timeout=5.0, retries=2),
+]
+preflight_concurrency = 32
+
+
+def disarmed_since(drone_id, since):
+    # Whether a telemetry sample received after since reports the drone disarmed; older samples may predate arm()
+    armed = drone_telemetry[drone_id].latest("armed")
+    return armed is not None and armed[0] > since and armed[1] < 0.5
 
-        position = current_waypoint[1:4]  # Extract position (px, py, pz)
-        velocity = current_waypoint[4:7]  # Extract velocity (vx, vy, vz)
-        acceleration = current_waypoint[7:10]  # Extract acceleration (ax, ay, az)
-        mode_code = current_waypoint[-1]
-        if last_mode != mode_code:
-                # Print the mode number and its description
-                print(f"Drone id: {drone_id}: Mode number: {mode_code}, Description: {mode_descriptions[mode_code]}")
-                last_mode = mode_code
-                
-        # await drone.offboard.set_position_velocity_acceleration_ned(
-        #     PositionNedYaw(*position, yaw),
-        #     VelocityNedYaw(*velocity, yaw),
-        #     AccelerationNed(*acceleration)
-        # )
-
-        await drone.offboard.set_position_velocity_ned(
-            PositionNedYaw(*position, yaw),
-            VelocityNedYaw(*velocity, yaw)
-        )
-
-        await asyncio.sleep(0.1)  # Time resolution of 0.1 seconds
-        t += 0.1
 
+async def start_drone(drone_id, drone, udp_port, preflight, mission_start):
+    """Bring a drone up to offboard, then hold its initial setpoint at the mission start barrier."""
+    try:
+        await connect_drone(drone_id, drone, udp_port)
+        readiness = await preflight.run_drone(drone_id, drone)
+    except Exception as error:
+        print(f"Bring-up of {drone_id} failed with error: {error}")
+        mission_start.fail(drone_id)
+        return None
+    if not readiness.ready:
+        mission_start.fail(drone_id)
+        return None
+
+    offboard_started = loop_time()
+    async def hold():
+        # PX4 may disarm a drone waiting on the ground (auto-disarm, failsafe); it then leaves the barrier
+        if disarmed_since(drone_id, offboard_started):
+            raise RuntimeError("disarmed while waiting for the mission epoch")
+        await drone.offboard.set_position_ned(PositionNedYaw(0.0, 0.0, 0.0, 0.0))
+
+    print(f"-- Drone {drone_id} ready in offboard, waiting for the mission epoch")
+    try:
+        await mission_start.ready(drone_id, keep_alive=hold)
+        if disarmed_since(drone_id, offboard_started):
+            raise RuntimeError("disarmed at the mission epoch")
+    except Exception as error:
+        print(f"Drone {drone_id} left out of the mission: {error}")
+        mission_start.fail(drone_id)
+        await abort_drone(drone_id, drone, OFFBOARD_START)
+        return None
+    return drone
+
+
+async def land_drone(drone_id, drone):
     print(f"-- Shape completed {drone_id}")
 
     # print(f"-- Returning to home {drone_id}")
@@ -151,9 +188,8 @@ async def run_drone(drone_id, trajectory_offset, udp_port, time_offset, altitude
     print(f"-- Landing {drone_id}")
     await drone.action.land()
 
-    async for state in drone.telemetry.landed_state():
-        if state == LandedState.ON_GROUND:
-            break
+    telemetry = drone_telemetry[drone_id]
+    await telemetry.hub.first("landed_state", lambda state: state == LandedState.ON_GROUND)
 
     print(f"-- Stopping offboard {drone_id}")
     try:
@@ -163,6 +199,9 @@ async def run_drone(drone_id, trajectory_offset, udp_port, time_offset, altitude
 
     print(f"-- Disarming {drone_id}")
     await drone.action.disarm()
+    print(f"Telemetry {drone_id}: {telemetry.hub.report()}")
+    await telemetry.stop()
+    await telemetry.hub.stop()
 
 async def main():
     num_drones = 5 + 1
@@ -177,25 +216,111 @@ async def main():
     traejctory_offset = [(0, 0, 0) for i in range(num_drones)]
     udp_ports = [14540 + i for i in range(num_drones)]
 
-    # Start mavsdk_server instances for each drone
-    mavsdk_servers = []
-    for i in range(num_drones):
-        port = 50040 + i
-        mavsdk_server = subprocess.Popen(["./mavsdk_server", "-p", str(port), f"udp://:{udp_ports[i]}"])
-        mavsdk_servers.append(mavsdk_server)
-        # await asyncio.sleep(1)
+    # Load the trajectory once (binary file next to the CSV if available, CSV otherwise);
+    # every drone flies an offset view of the same data
+    trajectory = load_trajectory("shapes/active.csv")
+
+    # Alternatively fly a swarm container written by swarmCreator.py: every drone gets its own
+    # generated mission, with the time shifts already part of the trajectories
+    swarm_file = None  # e.g. "shapes/swarm.swm"
+    swarm = read_swarm_container(swarm_file) if swarm_file is not None else None
+
+    # Pre-flight deconfliction: minimum separation of the whole swarm over the flight, with the
+    # offending pairs, with every drone's local trajectory translated by its home position
+    min_separation = 1.5  # m
+    if swarm is not None:
+        planned = [swarm.drone(i) for i in range(num_drones)]
+        planned_offsets = [0.0] * num_drones
+    else:
+        planned = [trajectory.offset(traejctory_offset[i][0], traejctory_offset[i][1], traejctory_offset[i][2] - altitude_offsets[i]) for i in range(num_drones)]
+        planned_offsets = [i*time_offset for i in range(num_drones)]
+    times, positions = swarm_positions(planned, home_positions, planned_offsets, step_time=0.1)
+    separation = check_separation(times, positions, min_separation=min_separation)
+    print(separation.summary())
+    if not separation.ok:
+        print(f"WARNING: drones come closer than {min_separation} m, check the offsets before flying")
+
+    # Start mavsdk_server instances for each drone on free gRPC ports, concurrently,
+    # and wait until every one of them accepts connections
+    async with MavsdkServerPool() as server_pool:
+        if simulate:
+            # In-process point-mass drones standing at their home positions, no PX4 or mavsdk_server
+            sim_world = SimWorld()
+            systems = [sim_world.add_drone(home=home_positions[i]) for i in range(num_drones)]
+        else:
+            servers = await server_pool.start([f"udp://:{udp_port}" for udp_port in udp_ports])
+            systems = [System(mavsdk_server_address=server_pool.host, port=servers[i].grpc_port) for i in range(num_drones)]
+
+        # Every drone is brought up concurrently and waits in offboard until the whole swarm is ready;
+        # playback then starts from one shared mission epoch, each drone shifted by its own time offset
+        preflight = PreflightPipeline(preflight_stages, concurrency=preflight_concurrency, on_failure=abort_drone)
+        # The first drone ready waits at most mission_start_timeout s for the others (PX4 disarms
+        # drones left armed on the ground for 10 s by default); later drones are left out
+        mission_start_timeout = 8.0  # s
+        mission_start = MissionStart(expected=range(num_drones), timeout=mission_start_timeout)
+        tasks = []
+        for i in range(num_drones):
+            tasks.append(asyncio.create_task(start_drone(i, systems[i], udp_ports[i], preflight, mission_start)))
+
+        epoch = await mission_start.epoch()
+        # Drones still in their bring-up at the epoch are left out and clean up on their own
+        drones = [None] * num_drones
+        for i in list(mission_start.ready_ids):
+            drones[i] = await tasks[i]
+        print(preflight.report().summary())
+
+        # Setpoints are streamed at setpoint_rate and interpolated between the 0.1 s trajectory rows,
+        # for the whole swarm from a single tick loop
+        setpoint_rate = 20.0  # Hz
+        interpolation = HERMITE  # STEP streams the stored rows unchanged
+        # Each drone lands as soon as its own trajectory is completed
+        landings = []
+        def start_landing(drone_id, drone):
+            landings.append(asyncio.create_task(land_drone(drone_id, drone)))
+
+        # Record every commanded setpoint with the latest local position telemetry of its drone
+        recorder = FlightRecorder("logs/offboard_log.bin")
+        tracking = TrackingMetrics()
+        def record_setpoint(drone_id, t, setpoint):
+            actual = drone_telemetry[drone_id].latest("position_velocity_ned")
+            recorder.record(drone_id, t, setpoint, actual)
+            tracking.update(drone_id, setpoint, actual)
+
+        instrumentation = TickInstrumentation() if instrument_latency else None
+        if instrumentation is not None:
+            instrumentation.dump_on_signal("logs/latency.json")
+
+        ticker = SwarmTicker(period=1 / setpoint_rate, interpolation=interpolation, on_mode_change=print_mode_change, on_complete=start_landing, on_setpoint=record_setpoint, instrumentation=instrumentation)
 
-    tasks = []
-    for i in range(num_drones):
-        tasks.append(asyncio.create_task(run_drone(i, traejctory_offset[i], udp_ports[i], i*time_offset, altitude_offsets[i])))
+        ready = [i for i in range(num_drones) if drones[i] is not None]
+        for i in ready:
+            if swarm is not None:
+                ticker.add(i, drones[i], TrajectoryPlayer(swarm.drone(i)))
+                continue
+            # Offset view of the shared trajectory, translated for this drone and shifted by its time offset
+            drone_trajectory = trajectory.offset(traejctory_offset[i][0], traejctory_offset[i][1], traejctory_offset[i][2] - altitude_offsets[i])
+            ticker.add(i, drones[i], TrajectoryPlayer(drone_trajectory), time_offset=i*time_offset)
 
-    await asyncio.gather(*tasks)
+        print(f"-- Performing trajectory with drones {ready}")
+        recorder.start()
+        try:
+            await ticker.run(epoch=epoch)
+            print(ticker.report())
+            if instrumentation is not None:
+                print(instrumentation.report())
+                instrumentation.dump("logs/latency.json")
+            print(tracking.report())
 
-    # Kill all mavsdk_server processes
-    for mavsdk_server in mavsdk_servers:
-        os.kill(mavsdk_server.pid, signal.SIGTERM)
+            await asyncio.gather(*landings)
+            await asyncio.gather(*tasks)
+        finally:
+            # Keep whatever was recorded, also when the flight is aborted
+            await recorder.close()
+            export_flight_log_csv("logs/offboard_log.bin", "logs/offboard_log.csv")
+            plot_flight_log("logs/offboard_log.bin", "logs/flight_path.png")
+            print(f"Flight log with {recorder.records_written} records saved to logs/offboard_log.csv")
 
     print("All tasks completed. Exiting program.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(main(), virtual_time=simulate and virtual_time)
\ No newline at end of file
@@ -0,0 +1,23 @@
+import sys
+from functions.scenario_runner import scenario_grid, run_scenarios, summarize, write_scenario_results
+
+# Fly every shape over a grid of parameters against simulated drones on a virtual clock, on all
+# CPU cores (see functions/scenario_runner.py). Exits with 1 if any scenario failed.
+shapes = None  # every shape of map_shape_to_code
+diameters = [10.0, 30.0]
+directions = [1, -1]
+maneuver_times = [30.0, 60.0]
+swarm_sizes = [1, 4]
+max_position_rms = 1.0  # m
+max_position_error = 3.0  # m
+processes = None  # all cores
+results_file = "logs/scenarios.json"
+
+if __name__ == "__main__":
+    scenarios = scenario_grid(shapes=shapes, diameters=diameters, directions=directions, maneuver_times=maneuver_times, swarm_sizes=swarm_sizes)
+    print(f"Running {len(scenarios)} scenarios...")
+    results = run_scenarios(scenarios, processes=processes, max_position_rms=max_position_rms, max_position_error=max_position_error)
+    print(summarize(results))
+    write_scenario_results(results_file, results)
+    print(f"Scenario results saved to {results_file}")
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
@@ -0,0 +1,51 @@
+import numpy as np
+from functions.swarm_generator import generate_swarm, write_swarm_container, write_swarm_files
+from functions.separation import check_separation, swarm_tensor_positions
+from functions.export_and_plot_shape import render_trajectories, render_plots
+
+# Example usage: six drones spread along one circle, each at its own altitude
+num_drones = 6
+shape_name = "circle"
+diameter = 30.0
+direction = 1
+phase = np.arange(num_drones) / num_drones  # fraction of the maneuver at which each drone enters the shape
+start_x = 0
+start_y = 0
+initial_altitude = 15 + 0.5 * np.arange(num_drones)
+time_shift = 1.0 * np.arange(num_drones)  # s, drone i climbs i seconds after drone 0
+maneuver_time = 90.0
+climb_rate = 1.0
+move_speed = 2.0  # m/s
+hold_time = 4.0 #s
+step_time = 0.1 #s
+home_positions = [(0, 3*i, 0) for i in range(num_drones)]  # local origin of every drone, relative to drone 0
+min_separation = 1.5  # m
+
+swarm = generate_swarm(
+    shape_name=shape_name,
+    diameter=diameter,
+    phase=phase,
+    start_x=start_x,
+    start_y=start_y,
+    initial_altitude=initial_altitude,
+    time_shift=time_shift,
+    direction=direction,
+    maneuver_time=maneuver_time,
+    climb_rate=climb_rate,
+    move_speed=move_speed,
+    hold_time=hold_time,
+    step_time=step_time,
+)
+
+# Check that the drones keep their distance during the whole mission
+times, positions = swarm_tensor_positions(swarm, home_positions)
+print(check_separation(times, positions, min_separation=min_separation).summary())
+
+# One container for the whole swarm (used by offboard_multiple_from_csv.py) and one CSV file per drone
+write_swarm_container("shapes/swarm.swm", swarm)
+write_swarm_files("shapes/swarm", swarm)
+print(f"Created shapes/swarm.swm and shapes/swarm/ with {len(swarm)} drones, {swarm.rows} rows each")
+
+# One plot of the whole swarm in the common frame, plus one plot per drone rendered in parallel
+render_trajectories("shapes/swarm.swm", "shapes/swarm_plot.png", home_positions=home_positions)
+render_plots([(f"shapes/swarm/drone_{i}.csv", f"shapes/swarm/drone_{i}.png") for i in range(num_drones)])
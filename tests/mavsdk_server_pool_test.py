@@ -0,0 +1,123 @@
+import asyncio
+import socket
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from functions.mavsdk_server_pool import MavsdkServerPool, MavsdkServerError
+
+# Stand-in for mavsdk_server: accepts (and drops) TCP connections on the port given after "-p";
+# exits at once for a system address containing "fail"
+STAND_IN_SERVER = """
+import socket, sys
+if "fail" in sys.argv[-1]:
+    sys.exit(3)
+port = int(sys.argv[sys.argv.index("-p") + 1])
+sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+sock.bind(("127.0.0.1", port))
+sock.listen()
+while True:
+    connection, _ = sock.accept()
+    connection.close()
+"""
+
+
+def stand_in_server(directory):
+    """Write the stand-in server as an executable script and return its path."""
+    path = Path(directory) / "mavsdk_server"
+    path.write_text(f"#!{sys.executable}\n{STAND_IN_SERVER}")
+    path.chmod(0o755)
+    return str(path)
+
+
+def accepts_connections(port, host="127.0.0.1"):
+    try:
+        with socket.create_connection((host, port), timeout=1.0):
+            return True
+    except OSError:
+        return False
+
+
+def test_pool_starts_every_server_on_its_own_port(tmp_path):
+    async def scenario():
+        async with MavsdkServerPool(server_binary=stand_in_server(tmp_path), ready_timeout=10.0) as pool:
+            servers = await pool.start([f"udp://:{14540 + i}" for i in range(4)])
+            more = await pool.start(["udp://:14544"])
+            ports = [server.grpc_port for server in servers + more]
+            assert len(set(ports)) == 5
+            assert all(server.running for server in servers + more)
+            assert all(accepts_connections(port) for port in ports)
+            assert [server.index for server in pool.servers] == [0, 1, 2, 3, 4]
+
+    asyncio.run(scenario())
+
+
+def test_pool_restarts_a_killed_server_on_the_same_port(tmp_path):
+    async def scenario():
+        async with MavsdkServerPool(server_binary=stand_in_server(tmp_path), ready_timeout=10.0) as pool:
+            server, = await pool.start(["udp://:14540"])
+            killed = server.process
+            killed.kill()
+            deadline = time.monotonic() + 10.0
+            while not (server.restarts == 1 and server.process is not killed and server.running and accepts_connections(server.grpc_port)):
+                assert time.monotonic() < deadline, "server not restarted"
+                await asyncio.sleep(0.05)
+            assert killed.returncode is not None
+
+    asyncio.run(scenario())
+
+
+def test_pool_raises_for_a_missing_binary(tmp_path):
+    async def scenario():
+        pool = MavsdkServerPool(server_binary=str(tmp_path / "missing"))
+        with pytest.raises(OSError):
+            await pool.start(["udp://:14540"])
+        assert pool.servers == []
+
+    asyncio.run(scenario())
+
+
+class RecordingPool(MavsdkServerPool):
+    """Pool that keeps every server it launched, also the ones it dropped again."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.launched = []
+
+    def server_command(self, server):
+        self.launched.append(server)
+        return super().server_command(server)
+
+
+def test_failed_start_keeps_the_servers_of_earlier_batches(tmp_path):
+    async def scenario():
+        async with RecordingPool(server_binary=stand_in_server(tmp_path), ready_timeout=10.0) as pool:
+            first = await pool.start(["udp://:14540", "udp://:14541"])
+            with pytest.raises(MavsdkServerError):
+                await pool.start(["udp://:14542", "udp://:fail"])
+            assert pool.servers == first
+            assert all(server.running and accepts_connections(server.grpc_port) for server in first)
+            assert all(server.process.returncode is not None for server in pool.launched[2:])
+            third, = await pool.start(["udp://:14542"])
+            assert third.grpc_port not in [server.grpc_port for server in first]
+
+    asyncio.run(scenario())
+
+
+def test_pool_stop_terminates_every_server(tmp_path):
+    async def scenario():
+        pool = MavsdkServerPool(server_binary=stand_in_server(tmp_path), ready_timeout=10.0, stop_timeout=5.0)
+        servers = await pool.start([f"udp://:{14540 + i}" for i in range(3)])
+        processes = [server.process for server in servers]
+        await pool.stop()
+        assert pool.servers == []
+        assert all(process.returncode is not None for process in processes)
+        assert not any(accepts_connections(server.grpc_port) for server in servers)
+        assert all(server.restarts == 0 for server in servers)
+
+    asyncio.run(scenario())
@@ -2,9 +2,12 @@ import os
 import sys
 import time
 import signal
+import socket
+import struct
 import subprocess
 import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 logging.basicConfig(
@@ -13,44 +16,177 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# MAVLink framing: v1 and v2 start bytes, and the HEARTBEAT message (id 0) with its CRC extra
+MAVLINK_V1_START = 0xFE
+MAVLINK_V2_START = 0xFD
+MAVLINK_HEARTBEAT_ID = 0
+MAVLINK_HEARTBEAT_CRC_EXTRA = 50
+
+# Ports of SITL instance 0; instance i uses these plus i (PX4 multi-vehicle convention)
+MAVLINK_BASE_PORT = 14540
+SIMULATOR_BASE_PORT = 4560
+
+
+def mavlink_heartbeat_source(datagram):
+    """(system_id, component_id) of the first MAVLink HEARTBEAT frame in a UDP datagram, or None."""
+    offset = 0
+    while offset < len(datagram):
+        start = datagram[offset]
+        if start == MAVLINK_V2_START and offset + 10 <= len(datagram):
+            length, incompat_flags = datagram[offset + 1], datagram[offset + 2]
+            system_id, component_id = datagram[offset + 5], datagram[offset + 6]
+            message_id = int.from_bytes(datagram[offset + 7:offset + 10], "little")
+            frame_length = 10 + length + 2 + (13 if incompat_flags & 0x01 else 0)
+        elif start == MAVLINK_V1_START and offset + 6 <= len(datagram):
+            length = datagram[offset + 1]
+            system_id, component_id, message_id = datagram[offset + 3], datagram[offset + 4], datagram[offset + 5]
+            frame_length = 6 + length + 2
+        else:
+            return None
+        if offset + frame_length > len(datagram):
+            return None
+        if message_id == MAVLINK_HEARTBEAT_ID:
+            return system_id, component_id
+        offset += frame_length
+    return None
+
+
+def wait_for_heartbeat(port, timeout=60, host="0.0.0.0"):
+    """Listen on a UDP port until a MAVLink HEARTBEAT arrives; its (system_id, component_id), or None on timeout."""
+    deadline = time.monotonic() + timeout
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            try:
+                datagram, _ = sock.recvfrom(65535)
+            except socket.timeout:
+                return None
+            source = mavlink_heartbeat_source(datagram)
+            if source is not None:
+                return source
+
+
+def _x25_crc(data, crc=0xFFFF):
+    for byte in data:
+        tmp = byte ^ (crc & 0xFF)
+        tmp = (tmp ^ (tmp << 4)) & 0xFF
+        crc = ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+    return crc
+
+
+def mavlink_heartbeat_frame(sequence=0, system_id=1, component_id=1):
+    """A MAVLink v2 HEARTBEAT frame of a PX4 quadrotor."""
+    # custom_mode, type (quadrotor), autopilot (PX4), base_mode, system_status (standby), mavlink_version
+    payload = struct.pack("<IBBBBB", 0, 2, 12, 0, 3, 3)
+    header = bytes([MAVLINK_V2_START, len(payload), 0, 0, sequence & 0xFF, system_id, component_id]) + MAVLINK_HEARTBEAT_ID.to_bytes(3, "little")
+    crc = _x25_crc(bytes([MAVLINK_HEARTBEAT_CRC_EXTRA]), _x25_crc(header[1:] + payload))
+    return header + payload + struct.pack("<H", crc)
+
+
+class HeartbeatStandIn:
+    """Stand-in for a SITL instance: sends MAVLink heartbeats to a local UDP port from a thread, after an optional delay."""
+
+    def __init__(self, port, delay=0.0, interval=0.1, system_id=1):
+        self.port = port
+        self.delay = delay
+        self.interval = interval
+        self.system_id = system_id
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._send, daemon=True)
+        self.thread.start()
+        return self
+
+    def _send(self):
+        if self.stopped.wait(self.delay):
+            return
+        sequence = 0
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            while not self.stopped.is_set():
+                sock.sendto(mavlink_heartbeat_frame(sequence, self.system_id), ("127.0.0.1", self.port))
+                sequence += 1
+                self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
 class PX4OffboardTest:
-    def __init__(self):
+    def __init__(self, instance=0, working_directory=".", stand_in=False, kill_simulator=True):
         self.px4_process = None
         self.offboard_process = None
+        self.heartbeat_stand_in = None
         self.test_passed = False
         
         self.px4_binary = "./build/px4_sitl_default/bin/px4"
-        self.sitl_script = "./Tools/sitl_run.sh"
         self.offboard_app = "./your_offboard_app"
-        self.model = "iris"
-        self.world = "none"
-        self.simulator = "gazebo"
+        self.model = "gz_x500"
+        self.autostart = "4001"
+        self.world = "default"
 
         self.latitude = "47.397742"
         self.longitude = "8.545594"
         self.altitude = "488"
 
-        self.mavlink_url = "udp://:14540"
+        # Every instance gets its own ports and working directory, so several can run side by side.
+        # PX4 takes the instance from "px4 -i <instance>" and offsets its ports by it (see mavlink_port)
+        self.instance = instance
+        self.working_directory = working_directory
+
+        # Send heartbeats from a local stand-in instead of starting PX4 (to test the harness itself)
+        self.stand_in = stand_in
+        self.stand_in_delay = 0.5
+        # Kill every gzserver/gazebo process on cleanup; off when several instances share the machine
+        self.kill_simulator = kill_simulator
+
+    @property
+    def mavlink_port(self):
+        # UDP port PX4 instance i sends its offboard MAVLink stream to
+        return MAVLINK_BASE_PORT + self.instance
+
+    @property
+    def simulator_port(self):
+        # TCP port PX4 instance i expects the simulator on
+        return SIMULATOR_BASE_PORT + self.instance
+
+    @property
+    def mavlink_url(self):
+        return f"udp://:{self.mavlink_port}"
         
     def start_px4(self):
-        logger.info("Starting PX4 SITL with Gazebo...")
+        if self.stand_in:
+            logger.info(f"Starting heartbeat stand-in for instance {self.instance} on UDP port {self.mavlink_port}...")
+            self.heartbeat_stand_in = HeartbeatStandIn(self.mavlink_port, delay=self.stand_in_delay).start()
+            return True
+
+        logger.info(f"Starting PX4 SITL with Gazebo (instance {self.instance})...")
 
         env = os.environ.copy()
         env.update({
             'PX4_HOME_LAT': self.latitude,
             'PX4_HOME_LON': self.longitude,
             'PX4_HOME_ALT': self.altitude,
+            'PX4_SYS_AUTOSTART': self.autostart,
+            'PX4_SIM_MODEL': self.model,
+            'PX4_GZ_WORLD': self.world,
+            # Own Gazebo partition per instance: every scenario flies in its own world
+            'GZ_PARTITION': f"px4_{self.instance}",
         })
         
+        # -i sets the instance (ports, MAVLink system id, rootfs/<instance>); -d runs without the interactive shell
         cmd = [
-            self.sitl_script,
             self.px4_binary,
-            self.model,
-            self.world,
-            self.simulator,
-            self.latitude,
-            self.longitude,
-            self.altitude
+            "-i", str(self.instance),
+            "-d",
         ]
         
         logger.info(f"Running command: {' '.join(cmd)}")
@@ -88,45 +224,36 @@ class PX4OffboardTest:
             logger.debug(f"Error capturing {name} output: {e}")
     
     def wait_for_px4_ready(self, timeout=60):
-        """Wait for PX4 to be ready"""
-        logger.info(f"Waiting for PX4 to be ready (timeout: {timeout}s)...")
+        """Wait for PX4 to be ready: the first MAVLink heartbeat on the instance's UDP port"""
+        logger.info(f"Waiting for a MAVLink heartbeat on UDP port {self.mavlink_port} (timeout: {timeout}s)...")
         
         start_time = time.time()
-        check_interval = 2
+        try:
+            source = wait_for_heartbeat(self.mavlink_port, timeout=timeout)
+        except OSError as e:
+            logger.error(f"Cannot listen on UDP port {self.mavlink_port}: {e}")
+            return False
         
-        while time.time() - start_time < timeout:
-            
-            # Check for specific log patterns indicating PX4 is ready
-            # You might want to check for MAVLink connection readiness
-            logger.info(f"Waiting... ({int(time.time() - start_time)}s)")
-            time.sleep(check_interval)
-            
-            # Additional check: see if Gazebo is running
-            try:
-                gz_process = subprocess.run(
-                    ["pgrep", "-f", "gzserver"],
-                    capture_output=True,
-                    text=True
-                )
-                if gz_process.returncode == 0:
-                    logger.info("Gazebo is running!")
-            except:
-                pass
+        if source is None:
+            logger.error(f"No heartbeat from PX4 within {timeout}s")
+            return False
         
-        logger.info("PX4 should be ready now")
+        logger.info(f"PX4 is ready: heartbeat from system {source[0]}, component {source[1]} after {time.time() - start_time:.1f}s")
         return True
     
     def run_offboard_test(self, timeout=120):
         """Run the offboard control test"""
         logger.info("Starting offboard control test...")
 
-        cmd = [self.offboard_app, "--url", self.mavlink_url]
+        app = list(self.offboard_app) if isinstance(self.offboard_app, (list, tuple)) else [self.offboard_app]
+        cmd = app + ["--url", self.mavlink_url]
         
         logger.info(f"Running offboard command: {' '.join(cmd)}")
         
         try:
             self.offboard_process = subprocess.Popen(
                 cmd,
+                cwd=self.working_directory,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True
@@ -172,7 +299,7 @@ class PX4OffboardTest:
         ]
         
         for file in expected_files:
-            if Path(file).exists():
+            if Path(self.working_directory, file).exists():
                 logger.info(f"✓ Found expected file: {file}")
             else:
                 logger.warning(f"✗ Missing expected file: {file}")
@@ -182,7 +309,7 @@ class PX4OffboardTest:
         error_patterns = ["ERROR", "FAILED", "Exception", "Crash"]
         
         try:
-            with open("logs/offboard_log.txt", "r") as f:
+            with open(Path(self.working_directory, "logs/offboard_log.txt"), "r") as f:
                 log_content = f.read()
                 for pattern in error_patterns:
                     if pattern in log_content:
@@ -204,6 +331,9 @@ class PX4OffboardTest:
             except subprocess.TimeoutExpired:
                 self.offboard_process.kill()
         
+        if self.heartbeat_stand_in is not None:
+            self.heartbeat_stand_in.stop()
+        
         if self.px4_process and self.px4_process.poll() is None:
             logger.info("Terminating PX4 process...")
 
@@ -213,22 +343,24 @@ class PX4OffboardTest:
             except subprocess.TimeoutExpired:
                 os.killpg(os.getpgid(self.px4_process.pid), signal.SIGKILL)
         
-        subprocess.run(["pkill", "-f", "gzserver"], capture_output=True)
-        subprocess.run(["pkill", "-f", "gazebo"], capture_output=True)
+        if self.kill_simulator and not self.stand_in:
+            subprocess.run(["pkill", "-f", "gz sim"], capture_output=True)
+            subprocess.run(["pkill", "-f", "gzserver"], capture_output=True)
+            subprocess.run(["pkill", "-f", "gazebo"], capture_output=True)
         
         logger.info("Cleanup completed")
     
-    def run(self):
+    def run(self, ready_timeout=30, test_timeout=60):
         """Main test runner"""
         try:
             if not self.start_px4():
                 return False
             
-            if not self.wait_for_px4_ready(timeout=30):
+            if not self.wait_for_px4_ready(timeout=ready_timeout):
                 self.cleanup()
                 return False
             
-            test_result = self.run_offboard_test(timeout=60)
+            test_result = self.run_offboard_test(timeout=test_timeout)
             
             validation_result = self.validate_test_results()
             
@@ -254,6 +386,111 @@ class PX4OffboardTest:
         finally:
             self.cleanup()
 
+class ParallelScenarioRunner:
+    """
+    Run offboard scenarios concurrently, each against its own SITL instance (distinct ports and
+    working directory), so the wall time follows the slowest scenario instead of the sum.
+    A scenario is a dict of PX4OffboardTest attributes to set, e.g. {"name": "circle", "model": "iris"}.
+    """
+
+    def __init__(self, scenarios, max_parallel=4, base_instance=0, working_root="test_runs", stand_in=False,
+                 ready_timeout=30, test_timeout=60):
+        self.scenarios = scenarios
+        self.max_parallel = max_parallel
+        self.base_instance = base_instance
+        self.working_root = working_root
+        self.stand_in = stand_in
+        self.ready_timeout = ready_timeout
+        self.test_timeout = test_timeout
+        self.results = []
+
+    def _run_scenario(self, index, scenario):
+        instance = self.base_instance + index
+        settings = dict(scenario)
+        name = settings.pop("name", f"scenario_{index}")
+        working_directory = os.path.join(self.working_root, f"instance_{instance}")
+        os.makedirs(working_directory, exist_ok=True)
+
+        # Only this instance's PX4 (and the simulator it started) is stopped on cleanup
+        test_runner = PX4OffboardTest(instance=instance, working_directory=working_directory, stand_in=self.stand_in,
+                                      kill_simulator=False)
+        for attribute, value in settings.items():
+            setattr(test_runner, attribute, value)
+
+        start_time = time.time()
+        passed = test_runner.run(ready_timeout=self.ready_timeout, test_timeout=self.test_timeout)
+        duration = time.time() - start_time
+        logger.info(f"Scenario {name} (instance {instance}) {'PASSED' if passed else 'FAILED'} in {duration:.1f}s")
+        return {"name": name, "instance": instance, "mavlink_port": test_runner.mavlink_port, "passed": passed, "duration": duration}
+
+    def run(self):
+        """Run every scenario; returns True if all passed. Per-scenario results are in self.results."""
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            self.results = list(executor.map(self._run_scenario, range(len(self.scenarios)), self.scenarios))
+        passed = sum(result["passed"] for result in self.results)
+        logger.info(f"{passed}/{len(self.results)} scenarios passed in {time.time() - start_time:.1f}s "
+                    f"(longest scenario {max((result['duration'] for result in self.results), default=0.0):.1f}s)")
+        return passed == len(self.results)
+
+
+def _stand_in_offboard_app(seconds):
+    """Offboard app for stand-in runs: sleeps, then writes the files validate_test_results expects."""
+    code = ("import os, sys, time; time.sleep(float(sys.argv[1])); os.makedirs('logs', exist_ok=True); "
+            "open('logs/offboard_log.csv', 'w').close(); open('logs/flight_path.png', 'w').close()")
+    return [sys.executable, "-c", code, str(seconds)]
+
+
+def test_wait_for_px4_ready_returns_on_first_heartbeat():
+    test_runner = PX4OffboardTest(instance=10000, stand_in=True)
+    test_runner.stand_in_delay = 0.2
+    test_runner.start_px4()
+    try:
+        start_time = time.time()
+        assert test_runner.wait_for_px4_ready(timeout=10)
+        assert time.time() - start_time < 2
+    finally:
+        test_runner.cleanup()
+
+
+def test_wait_for_px4_ready_times_out_without_heartbeat():
+    test_runner = PX4OffboardTest(instance=10009)
+    assert not test_runner.wait_for_px4_ready(timeout=0.5)
+
+
+def test_px4_instance_is_passed_to_the_px4_binary(tmp_path):
+    # Stand-in px4 binary: sends heartbeats to the offboard port of the instance given with -i
+    px4 = tmp_path / "px4"
+    px4.write_text(f"#!{sys.executable}\n"
+                   "import socket, sys, time\n"
+                   f"port = {MAVLINK_BASE_PORT} + int(sys.argv[sys.argv.index('-i') + 1])\n"
+                   f"frame = bytes.fromhex('{mavlink_heartbeat_frame().hex()}')\n"
+                   "sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)\n"
+                   "while True:\n"
+                   "    sock.sendto(frame, ('127.0.0.1', port))\n"
+                   "    time.sleep(0.1)\n")
+    px4.chmod(0o755)
+    test_runner = PX4OffboardTest(instance=10003, kill_simulator=False)
+    test_runner.px4_binary = str(px4)
+    assert test_runner.mavlink_port == 24543
+    assert test_runner.start_px4()
+    try:
+        assert test_runner.wait_for_px4_ready(timeout=10)
+    finally:
+        test_runner.cleanup()
+    assert test_runner.px4_process.poll() is not None
+
+
+def test_parallel_scenarios_take_the_time_of_the_slowest(tmp_path):
+    scenarios = [{"name": f"stand_in_{i}", "offboard_app": _stand_in_offboard_app(1.0)} for i in range(4)]
+    runner = ParallelScenarioRunner(scenarios, max_parallel=4, base_instance=10000, working_root=str(tmp_path), stand_in=True,
+                                    ready_timeout=10, test_timeout=10)
+    start_time = time.time()
+    assert runner.run()
+    assert time.time() - start_time < 4
+    assert sorted(result["mavlink_port"] for result in runner.results) == [24540, 24541, 24542, 24543]
+
+
 def main():
     
     test_runner = PX4OffboardTest()
@@ -261,20 +498,32 @@ def main():
     import argparse
     parser = argparse.ArgumentParser(description="PX4 Offboard Control Test")
     parser.add_argument("--offboard-app", help="Path to offboard application")
-    parser.add_argument("--model", default="iris", help="PX4 model")
+    parser.add_argument("--model", default="gz_x500", help="PX4 simulation model (PX4_SIM_MODEL)")
     parser.add_argument("--timeout", type=int, default=60, help="Test timeout in seconds")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    parser.add_argument("--instances", type=int, default=1, help="Number of SITL instances to run the scenario on in parallel")
+    parser.add_argument("--stand-in", action="store_true", help="Use local heartbeat stand-ins instead of PX4 SITL")
     
     args = parser.parse_args()
     
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    
+    if args.instances > 1:
+        scenario = {"model": args.model}
+        if args.offboard_app:
+            scenario["offboard_app"] = args.offboard_app
+        scenarios = [dict(scenario, name=f"{args.model}_{i}") for i in range(args.instances)]
+        runner = ParallelScenarioRunner(scenarios, max_parallel=args.instances, stand_in=args.stand_in, test_timeout=args.timeout)
+        sys.exit(0 if runner.run() else 1)
+    
+    test_runner.stand_in = args.stand_in
     if args.offboard_app:
         test_runner.offboard_app = args.offboard_app
     if args.model:
         test_runner.model = args.model
-    if args.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
     
-    success = test_runner.run()
+    success = test_runner.run(test_timeout=args.timeout)
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,116 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from functions.playback import TrajectoryPlayer, STEP, LINEAR, HERMITE, MAX_CURSOR_WALK
+from functions.trajectory_io import Trajectory
+
+
+def cubic_trajectory(times, modes=None):
+    """px = t^3, py = 2t, pz = -t^2 with matching velocities; ax..yaw linear in t."""
+    times = np.asarray(times, dtype=float)
+    data = np.zeros((len(times), 12))
+    data[:, 0] = times
+    data[:, 1], data[:, 2], data[:, 3] = times ** 3, 2 * times, -times ** 2
+    data[:, 4], data[:, 5], data[:, 6] = 3 * times ** 2, 2.0, -2 * times
+    data[:, 7], data[:, 8], data[:, 9], data[:, 10] = times, -times, 0.5 * times, 10 * times
+    data[:, 11] = 70 if modes is None else modes
+    return Trajectory.from_array(data)
+
+
+def flatten(setpoint):
+    position, velocity, acceleration, yaw, mode_code = setpoint
+    return [*position, *velocity, *acceleration, yaw, mode_code]
+
+
+@pytest.mark.parametrize("interpolation", [STEP, LINEAR, HERMITE])
+def test_row_times_return_the_rows_unchanged(interpolation):
+    trajectory = cubic_trajectory(np.arange(11) * 0.1)
+    player = TrajectoryPlayer(trajectory)
+    for index in range(len(trajectory)):
+        row = trajectory.row(index)
+        assert flatten(player.setpoint_at(index * 0.1, interpolation)) == pytest.approx(list(row[1:]))
+
+
+def test_step_returns_the_next_row():
+    trajectory = cubic_trajectory(np.arange(11) * 0.1)
+    player = TrajectoryPlayer(trajectory)
+    assert flatten(player.setpoint_at(0.25, STEP)) == pytest.approx(list(trajectory.row(3)[1:]))
+
+
+def test_linear_blends_every_column():
+    trajectory = cubic_trajectory(np.arange(11) * 0.1)
+    player = TrajectoryPlayer(trajectory)
+    previous, row = np.array(trajectory.row(2)), np.array(trajectory.row(3))
+    expected = previous + (row - previous) * 0.25
+    assert flatten(player.setpoint_at(0.225, LINEAR))[:-1] == pytest.approx(list(expected[1:-1]))
+    assert player.setpoint_at(0.225, LINEAR)[-1] == 70
+
+
+def test_hermite_follows_the_cubic_between_rows():
+    # Hermite interpolation of positions with their exact velocities reproduces a cubic exactly
+    trajectory = cubic_trajectory(np.arange(11) * 0.1)
+    player = TrajectoryPlayer(trajectory)
+    for t in (0.03, 0.37, 0.55, 0.91):
+        position, velocity, acceleration, yaw, mode_code = player.setpoint_at(t, HERMITE)
+        assert position == pytest.approx((t ** 3, 2 * t, -t ** 2))
+        assert velocity == pytest.approx((3 * t ** 2, 2.0, -2 * t))
+        assert acceleration == pytest.approx((t, -t, 0.5 * t))
+        assert yaw == pytest.approx(10 * t)
+        assert mode_code == 70
+
+
+def test_hermite_is_linear_across_a_mode_change():
+    trajectory = cubic_trajectory(np.arange(11) * 0.1, modes=[60] * 5 + [70] * 6)
+    player = TrajectoryPlayer(trajectory)
+    t = 0.45
+    expected = (np.array(trajectory.row(4)) + np.array(trajectory.row(5))) / 2
+    assert flatten(player.setpoint_at(t, HERMITE))[:-1] == pytest.approx(list(expected[1:-1]))
+    assert player.setpoint_at(t, HERMITE)[-1] == 70
+
+
+@pytest.mark.parametrize("interpolation", [STEP, LINEAR, HERMITE])
+def test_end_of_trajectory(interpolation):
+    trajectory = cubic_trajectory(np.arange(11) * 0.1)
+    player = TrajectoryPlayer(trajectory)
+    assert flatten(player.setpoint_at(1.0, interpolation)) == pytest.approx(list(trajectory.row(10)[1:]))
+    assert player.setpoint_at(1.0 + 1e-3, interpolation) is None
+
+
+def test_offset_trajectory_is_shifted():
+    trajectory = cubic_trajectory(np.arange(11) * 0.1)
+    player = TrajectoryPlayer(trajectory.offset(1.0, -2.0, 0.5))
+    position, velocity, _, _, _ = player.setpoint_at(0.37, HERMITE)
+    assert position == pytest.approx((0.37 ** 3 + 1.0, 2 * 0.37 - 2.0, -0.37 ** 2 + 0.5))
+    assert velocity == pytest.approx((3 * 0.37 ** 2, 2.0, -2 * 0.37))
+
+
+def test_non_uniform_index_matches_binary_search():
+    rng = np.random.default_rng(7)
+    times = np.cumsum(rng.uniform(0.02, 0.2, 200))
+    player = TrajectoryPlayer(cubic_trajectory(times))
+    assert not player.uniform
+    # Small steps walk the cursor, big jumps and going back in time fall back to binary search
+    queries = np.concatenate([
+        np.linspace(0.0, times[40], 300),
+        [times[40] + 0.001, times[40 + 5 * MAX_CURSOR_WALK], times[60], times[10] - 0.01, times[10], times[-1]],
+        np.sort(rng.uniform(times[10], times[-1], 200)),
+    ])
+    for t in queries:
+        expected = int(np.searchsorted(times, t - 1e-9, side="left"))
+        assert player.index_at(float(t)) == expected
+    assert player.index_at(float(times[-1]) + 1e-3) is None
+
+
+def test_non_uniform_hermite_between_rows():
+    times = [0.0, 0.05, 0.2, 0.23, 0.4, 0.7, 0.71, 1.0]
+    player = TrajectoryPlayer(cubic_trajectory(times))
+    assert not player.uniform
+    for t in (0.1, 0.22, 0.5, 0.705, 0.9):
+        position, velocity, _, _, _ = player.setpoint_at(t, HERMITE)
+        assert position == pytest.approx((t ** 3, 2 * t, -t ** 2))
+        assert velocity == pytest.approx((3 * t ** 2, 2.0, -2 * t))
@@ -0,0 +1,64 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from functions.clock import loop_time, run
+from functions.scheduler import TickScheduler, SKIP, CATCH_UP
+
+
+def run_ticks(policy, max_catch_up=None, count=8, slow_tick=2, slow_time=0.33):
+    """Run a 10 Hz scheduler on virtual time, with tick slow_tick taking slow_time s; returns it and the (tick, time) pairs."""
+    async def scenario():
+        scheduler = TickScheduler(period=0.1, policy=policy, max_catch_up=max_catch_up)
+        scheduler.start()
+        ticks = []
+        while len(ticks) < count:
+            tick = await scheduler.next_tick()
+            ticks.append((tick, loop_time() - scheduler.epoch))
+            if tick == slow_tick:
+                await asyncio.sleep(slow_time)
+        return scheduler, ticks
+
+    return run(scenario(), virtual_time=True)
+
+
+def test_on_time_ticks_run_at_their_deadlines():
+    scheduler, ticks = run_ticks(SKIP, slow_time=0.0)
+    assert [tick for tick, _ in ticks] == list(range(8))
+    assert [time for _, time in ticks] == pytest.approx([tick * 0.1 for tick in range(8)])
+    assert scheduler.late_ticks == 0
+    assert scheduler.skipped_ticks == 0
+
+
+def test_skip_jumps_to_the_most_recent_tick():
+    # Tick 2 ends at 0.53 s: ticks 3 and 4 are dropped, tick 5 runs late, tick 6 on time again
+    scheduler, ticks = run_ticks(SKIP)
+    assert [tick for tick, _ in ticks] == [0, 1, 2, 5, 6, 7, 8, 9]
+    assert [time for _, time in ticks] == pytest.approx([0.0, 0.1, 0.2, 0.53, 0.6, 0.7, 0.8, 0.9])
+    assert scheduler.late_ticks == 1
+    assert scheduler.skipped_ticks == 2
+
+
+def test_catch_up_runs_every_missed_tick_back_to_back():
+    scheduler, ticks = run_ticks(CATCH_UP)
+    assert [tick for tick, _ in ticks] == [0, 1, 2, 3, 4, 5, 6, 7]
+    assert [time for _, time in ticks] == pytest.approx([0.0, 0.1, 0.2, 0.53, 0.53, 0.53, 0.6, 0.7])
+    assert scheduler.late_ticks == 2
+    assert scheduler.skipped_ticks == 0
+
+
+def test_catch_up_skips_the_backlog_beyond_max_catch_up():
+    scheduler, ticks = run_ticks(CATCH_UP, max_catch_up=1)
+    assert [tick for tick, _ in ticks] == [0, 1, 2, 4, 5, 6, 7, 8]
+    assert [time for _, time in ticks] == pytest.approx([0.0, 0.1, 0.2, 0.53, 0.53, 0.6, 0.7, 0.8])
+    assert scheduler.late_ticks == 1
+    assert scheduler.skipped_ticks == 1
+
+
+def test_invalid_policy_is_rejected():
+    with pytest.raises(ValueError):
+        TickScheduler(policy="drop")
@@ -0,0 +1,66 @@
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from functions.separation import check_separation
+
+
+def brute_force(positions, min_separation, search_radius):
+    """Every (slice, drone_a, drone_b, distance) closer than min_separation and the per-slice minimum, from all N² pairs."""
+    violations = []
+    minimum = np.full(len(positions), np.inf)
+    for index, points in enumerate(positions):
+        for a, b in itertools.combinations(range(len(points)), 2):
+            if np.isnan(points[a]).any() or np.isnan(points[b]).any():
+                continue
+            distance = np.linalg.norm(points[a] - points[b])
+            if distance < search_radius:
+                minimum[index] = min(minimum[index], distance)
+            if distance < min_separation:
+                violations.append((index, a, b, distance))
+    return violations, minimum
+
+
+def grid_positions(rng, slices, drones, cell):
+    """Random positions with many coordinates exactly on cell boundaries or just off them, some NaN."""
+    base = rng.integers(-4, 4, size=(slices, drones, 3)) * cell
+    jitter = rng.choice([0.0, 1e-9, -1e-9, 0.5 * cell, 0.999 * cell, -0.999 * cell], size=(slices, drones, 3))
+    positions = base + jitter
+    positions[rng.random((slices, drones)) < 0.05] = np.nan
+    return positions
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_grid_search_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    min_separation, search_radius = 1.0, 2.0
+    positions = grid_positions(rng, 20, 30, search_radius)
+    # Pairs exactly one cell apart along an axis and on a cell diagonal
+    positions[0, 0], positions[0, 1] = (2.0, 0.0, 0.0), (4.0, 0.0, 0.0)
+    positions[0, 2], positions[0, 3] = (-2.0, -2.0, 2.0), (-2.0 + 1e-12, -2.0 - 1e-12, 2.0 + 0.5)
+    times = np.arange(len(positions)) * 0.1
+
+    report = check_separation(times, positions, min_separation=min_separation, search_radius=search_radius)
+    expected, minimum = brute_force(positions, min_separation, search_radius)
+
+    found = sorted((int(round(time / 0.1)), int(a), int(b)) for time, a, b, _ in report.violations.tolist())
+    assert found == sorted((index, a, b) for index, a, b, _ in expected)
+    distances = {(int(round(time / 0.1)), int(a), int(b)): distance for time, a, b, distance in report.violations.tolist()}
+    for index, a, b, distance in expected:
+        assert distances[(index, a, b)] == pytest.approx(distance)
+    np.testing.assert_allclose(report.min_separation, minimum)
+    assert (0, 2, 3) in distances
+
+
+def test_uniform_random_positions_match_brute_force():
+    rng = np.random.default_rng(11)
+    positions = rng.uniform(-10.0, 10.0, size=(10, 60, 3))
+    report = check_separation(np.arange(10.0), positions, min_separation=1.5)
+    expected, minimum = brute_force(positions, 1.5, 3.0)
+    assert len(report.violations) == len(expected)
+    np.testing.assert_allclose(report.min_separation, minimum)
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from functions.create_active_csv import create_active_csv
+from functions.swarm_generator import generate_swarm
+from functions.trajectory_io import TRAJECTORY_COLUMNS, read_trajectory_binary
+
+
+def test_swarm_drone_matches_create_active_csv(tmp_path):
+    # circle starts off the start point, so the mission has a move to the maneuver start (mode 50);
+    # move_speed is not 2.0 m/s to catch a different duration of that move
+    mission = dict(shape_name="circle", diameter=10.0, direction=-1, maneuver_time=30.0, start_x=3.0, start_y=4.0,
+                   initial_altitude=10.0, climb_rate=2.0, move_speed=2.5, hold_time=2.0, step_time=0.1)
+    create_active_csv(**mission, output_file=str(tmp_path / "active.csv"), binary_output_file=str(tmp_path / "active.trj"))
+    expected = read_trajectory_binary(str(tmp_path / "active.trj"), mmap=False)
+
+    drone = generate_swarm(phase=[0.0, 0.5], time_shift=[0.0, 3.0], **mission).drone(0)
+
+    assert len(drone) == len(expected)
+    assert 50 in expected.column("mode")
+    # t is the common time grid of the swarm; every other column has to be the same
+    for name in TRAJECTORY_COLUMNS[1:]:
+        np.testing.assert_allclose(drone.column(name), expected.column(name), atol=1e-9, err_msg=name)
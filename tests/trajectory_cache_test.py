@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import functions.trajectory_cache as trajectory_cache
+from functions.trajectory_cache import TrajectoryCache, cache_key, STALE_TEMPORARY_AGE
+
+
+def mission(**changes):
+    arguments = dict(shape_name="circle", diameter=4.0, direction=1, maneuver_time=5.0, start_x=0.0, start_y=0.0,
+                     initial_altitude=5.0, climb_rate=2.0, move_speed=2.0, hold_time=1.0, step_time=0.1)
+    arguments.update(changes)
+    return arguments
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    """Counts the trajectories the cache generates."""
+    calls = []
+    plan_mission = trajectory_cache.plan_mission
+
+    def counting_plan_mission(*arguments):
+        calls.append(arguments)
+        return plan_mission(*arguments)
+
+    monkeypatch.setattr(trajectory_cache, "plan_mission", counting_plan_mission)
+    return calls
+
+
+def age(paths, seconds_ago):
+    """Set the last use of the given files to seconds_ago."""
+    then = time.time() - seconds_ago
+    for path in paths:
+        os.utime(path, (then, then))
+
+
+def test_hit_copies_the_cached_entry_without_generating(tmp_path, plans):
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    first = cache.create_active_csv(output_file=str(tmp_path / "a.csv"), binary_output_file=str(tmp_path / "a.trj"), **mission())
+    second = cache.create_active_csv(output_file=str(tmp_path / "b.csv"), binary_output_file=str(tmp_path / "b.trj"), **mission())
+    assert first == second
+    assert len(plans) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (tmp_path / "a.csv").read_bytes() == (tmp_path / "b.csv").read_bytes()
+    assert (tmp_path / "a.trj").read_bytes() == (tmp_path / "b.trj").read_bytes()
+    assert len(cache.load(**mission())) > 0
+
+
+def test_int_and_float_arguments_share_an_entry(tmp_path, plans):
+    assert cache_key(**mission(diameter=2, climb_rate=2)) == cache_key(**mission(diameter=2.0, climb_rate=2.0))
+    assert cache_key(**mission(diameter=2)) != cache_key(**mission(diameter=2.5))
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    cache.store(**mission(diameter=2))
+    assert cache.lookup(**mission(diameter=2.0)) is not None
+    cache.store(**mission(diameter=2.0))
+    assert len(plans) == 1
+
+
+def test_eviction_drops_the_least_recently_used_entry(tmp_path):
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    oldest, used = cache.store(**mission(diameter=3.0)), cache.store(**mission(diameter=4.0))
+    entry_bytes = cache.size() // 2
+    age(oldest + used, 100.0)
+    age(oldest, 200.0)
+    cache.lookup(**mission(diameter=4.0))
+
+    # CSV text lengths differ a little between entries: room for two of them, not three
+    cache.max_bytes = 5 * entry_bytes // 2
+    newest = cache.store(**mission(diameter=5.0))
+    assert not any(os.path.exists(path) for path in oldest)
+    assert all(os.path.exists(path) for path in used + newest)
+    assert cache.size() <= cache.max_bytes
+
+
+def test_eviction_keeps_the_new_entry_even_if_it_is_over_the_limit(tmp_path):
+    cache = TrajectoryCache(str(tmp_path / "cache"), max_bytes=0)
+    older = cache.store(**mission(diameter=3.0))
+    newest = cache.store(**mission(diameter=4.0))
+    assert not any(os.path.exists(path) for path in older)
+    assert all(os.path.exists(path) for path in newest)
+
+
+def test_stale_temporary_files_are_deleted(tmp_path):
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    cache.store(**mission(diameter=3.0))
+    stale, fresh = tmp_path / "cache" / "stale.trj.tmp", tmp_path / "cache" / "fresh.trj.tmp"
+    stale.write_bytes(b"interrupted")
+    fresh.write_bytes(b"being written")
+    age([stale], STALE_TEMPORARY_AGE + 1.0)
+
+    cache.store(**mission(diameter=4.0))
+    assert not stale.exists()
+    assert fresh.exists()
+    cache.clear()
+    assert os.listdir(tmp_path / "cache") == []
+
+
+def test_interrupted_store_leaves_no_temporary_files(tmp_path, monkeypatch):
+    def interrupted(plan, sinks):
+        for sink in sinks:
+            Path(sink.path).write_bytes(b"partial")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(trajectory_cache, "write_mission", interrupted)
+    cache = TrajectoryCache(str(tmp_path / "cache"))
+    with pytest.raises(KeyboardInterrupt):
+        cache.store(**mission())
+    assert os.listdir(tmp_path / "cache") == []